@@ -3,8 +3,14 @@ import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime, UTC
 import math
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from styles import apply_styles
+from src.buscador import coincidencias
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -89,10 +95,9 @@ with filter_container:
 
 filtered_df = df.copy()
 
-if isin_input:
-    mask_isin = filtered_df["isin"].str.contains(isin_input, case=False, na=False)
-    mask_nombre = filtered_df["nombreEtf"].str.contains(isin_input, case=False, na=False)
-    filtered_df = filtered_df[mask_isin | mask_nombre]
+isins_busqueda = coincidencias(db, "etfs", isin_input)
+if isins_busqueda is not None:
+    filtered_df = filtered_df[filtered_df["isin"].isin(isins_busqueda)]
 
 if tipo_filter != "Todos":
     filtered_df = filtered_df[filtered_df["tipoEtf"] == tipo_filter]
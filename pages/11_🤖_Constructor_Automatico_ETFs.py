@@ -3,9 +3,21 @@ import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime, UTC
 import math
+import numpy as np
 import plotly.graph_objects as go
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from styles import apply_styles
+from src.servicio_curvas import obtener_curva, obtener_movimiento_tipos
+from src.motor_rentabilidad import codificar_tramos, metricas_dataframe, rentabilidad_activos
+from src.optimizador import optimizar_cartera
+from src.covarianzas import matriz_covarianzas
+from src.clasificacion_region import filtro_region
+from src.simulacion_tipos import simular_cartera
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -29,7 +41,6 @@ def get_db():
 
 db = get_db()
 etfs_collection = db["etfs"]
-curvas_collection = db["curvas_tipos"]
 carteras_etf_collection = db["carteras_etf"]
 
 # ==========================================================
@@ -64,13 +75,13 @@ if "reset_counter_etfs" not in st.session_state:
 
 def reset_todo_etfs():
     st.session_state.reset_counter_etfs += 1
-    keys_to_clear = ["cartera_auto_etfs", "params_auto_etfs", "movs_auto_etfs", "pesos_auto_etfs"]
+    keys_to_clear = ["cartera_auto_etfs", "params_auto_etfs", "movs_auto_etfs", "pesos_auto_etfs", "optim_auto_etfs", "sim_auto_etfs"]
     for k in keys_to_clear:
         if k in st.session_state:
             del st.session_state[k]
 
 def borrar_propuesta_etfs():
-    keys_to_clear = ["cartera_auto_etfs", "params_auto_etfs", "movs_auto_etfs", "pesos_auto_etfs"]
+    keys_to_clear = ["cartera_auto_etfs", "params_auto_etfs", "movs_auto_etfs", "pesos_auto_etfs", "optim_auto_etfs", "sim_auto_etfs"]
     for k in keys_to_clear:
         if k in st.session_state:
             del st.session_state[k]
@@ -100,33 +111,6 @@ PESOS_DEFAULT = {
     "Moderado": {"very_short": 20, "short": 30, "intermediate": 40, "long": 10}
 }
 
-def get_latest_curve(pais_code="EUR"):
-    ultimo = curvas_collection.find_one(sort=[("_id", -1)])
-    if not ultimo: return None
-    
-    if pais_code == "GLOBAL":
-        all_paises = ultimo.get("paises", [])
-        if not all_paises: return None
-        global_curve = {"codigo": "GLOBAL", "nombre": "Global", "emoji": "🌐", "plazos": []}
-        plazos_data = {}
-        for p in all_paises:
-            for pl in p.get("plazos", []):
-                pl_cod = pl["plazo"]
-                if pl_cod not in plazos_data: plazos_data[pl_cod] = {"actuals": [], "prevs": {}}
-                plazos_data[pl_cod]["actuals"].append(pl["rendimiento_actual"])
-                for yr, val in pl.get("previsiones", {}).items():
-                    if yr not in plazos_data[pl_cod]["prevs"]: plazos_data[pl_cod]["prevs"][yr] = []
-                    plazos_data[pl_cod]["prevs"][yr].append(val)
-        for pl_cod, data in plazos_data.items():
-            avg_actual = sum(data["actuals"]) / len(data["actuals"])
-            avg_prevs = {yr: sum(vals)/len(vals) for yr, vals in data["prevs"].items()}
-            global_curve["plazos"].append({"plazo": pl_cod, "rendimiento_actual": avg_actual, "previsiones": avg_prevs})
-        return global_curve
-
-    for p in ultimo.get("paises", []):
-        if p["codigo"] == pais_code: return p
-    return None
-
 def predecir_movimiento_tipos(curve, horizon_years=3):
     if not curve: return {}
     ahora_anno = datetime.now().year
@@ -219,7 +203,7 @@ with st.container():
         # Calcular defaults según perfil
         if perfil == "Atrevido":
             # Para atrevido necesitamos los movimientos para el default dinámico
-            curva_temp = get_latest_curve(region)
+            curva_temp = obtener_curva(db, region)
             movs_temp = predecir_movimiento_tipos(curva_temp, horizonte)
             defaults = get_dynamic_atrevido_weights(movs_temp)
         else:
@@ -244,13 +228,22 @@ with st.container():
             "long": p_l / 100
         }
 
+    # --- SECCIÓN: RESTRICCIONES DEL OPTIMIZADOR ---
+    with st.expander("🎯 Restricciones del Optimizador (Opcional)", expanded=False):
+        st.info("El optimizador maximiza la rentabilidad esperada ajustada por riesgo sobre todos los ETFs filtrados. 0 = sin límite.")
+        cr1, cr2, cr3, cr4 = st.columns(4)
+        with cr1: vol_max = st.number_input("Volatilidad Máx. (%)", 0.0, 20.0, 0.0, 0.5, key=f"vol_max_etfs{suffix}", on_change=borrar_propuesta_etfs)
+        with cr2: dur_min = st.number_input("Duración Mín. (años)", 0.0, 20.0, 0.0, 0.5, key=f"dur_min_etfs{suffix}", on_change=borrar_propuesta_etfs)
+        with cr3: dur_max = st.number_input("Duración Máx. (años)", 0.0, 20.0, 0.0, 0.5, key=f"dur_max_etfs{suffix}", on_change=borrar_propuesta_etfs)
+        with cr4: peso_max = st.number_input("Peso Máx. por ETF (%)", 5, 100, 35, 5, key=f"peso_max_etfs{suffix}", on_change=borrar_propuesta_etfs)
+
 if generar:
     if total_p != 100:
         st.error("No se puede generar la propuesta: Los pesos deben sumar 100%.")
         st.stop()
 
     with st.spinner("🤖 El algoritmo está analizando el mercado de ETFs..."):
-        curva = get_latest_curve(region)
+        curva = obtener_curva(db, region)
         if not curva:
             st.error(f"No hay curvas para {region}.")
             st.stop()
@@ -260,48 +253,65 @@ if generar:
         pesos = pesos_ajustados
         
         # Filtro geográfico
-        query = {"tipoEtf": {"$in": ["Mercado Monetario", "Renta Fija"]}}
-        if region != "GLOBAL":
-            query["nombreEtf"] = {"$regex": region, "$options": "i"} if region != "EUR" else {"$regex": "EUR|Euro", "$options": "i"}
-            if region == "US": query["nombreEtf"] = {"$regex": "USD|U.S.|USA", "$options": "i"}
+        query = {"tipoEtf": {"$in": ["Mercado Monetario", "Renta Fija"]}, **filtro_region(region)}
 
         etfs_raw = list(etfs_collection.find(query, {"_id":0}))
         if not etfs_raw:
             etfs_raw = list(etfs_collection.find({"tipoEtf": {"$in": ["Mercado Monetario", "Renta Fija"]}}, {"_id":0}))
 
-        data = []
-        for e in etfs_raw:
-            tramo = clasificar_etf_tramo(e)
-            if tramo in pesos and pesos[tramo] > 0:
-                ytm = clean_num(e.get("yield_to_maturity"))
-                vol = clean_num(e.get("volatility_3y"))
-                rent1y = clean_num(e.get("yield_1y"))
-                dur = clean_num(e.get("duracion_efectiva"))
-                
-                rent_target = ytm if "Proyectada" in criterio_base else rent1y
-                eficiencia = rent_target / (vol if vol > 0.05 else 0.05)
-                
-                data.append({
-                    "isin": e["isin"], "nombre": e["nombreEtf"], "tramo": tramo,
-                    "ytm": ytm, "vol": vol, "rent1y": rent1y, "duracion": dur,
-                    "eficiencia": eficiencia, "ter": e.get("ter", "N/A")
-                })
-        
-        df_all = pd.DataFrame(data)
+        df_all = pd.DataFrame(etfs_raw)
+        df_all["tramo"] = [clasificar_etf_tramo(e) for e in etfs_raw]
+        df_all = df_all[df_all["tramo"].map(lambda t: pesos.get(t, 0) > 0)].copy()
         if df_all.empty:
             st.warning("No se encontraron ETFs para los criterios.")
             st.stop()
-            
-        seleccionados = []
-        for t in df_all["tramo"].unique():
-            subset = df_all[df_all["tramo"] == t].sort_values("eficiencia", ascending=False).head(m_etfs)
-            if not subset.empty:
-                subset["peso"] = pesos[t] / len(subset)
-                seleccionados.append(subset)
-        
-        df_final = pd.concat(seleccionados).head(n_etfs)
-        df_final["peso"] = df_final["peso"] / df_final["peso"].sum()
-        
+
+        df_all = df_all.rename(columns={"nombreEtf": "nombre"})
+        for col, origen in [("ytm", "yield_to_maturity"), ("vol", "volatility_3y"),
+                            ("rent1y", "yield_1y"), ("duracion", "duracion_efectiva")]:
+            df_all[col] = df_all[origen].map(clean_num) if origen in df_all.columns else 0.0
+        df_all["ter"] = df_all["ter"].fillna("N/A") if "ter" in df_all.columns else "N/A"
+        df_all = df_all[["isin", "nombre", "tramo", "ytm", "vol", "rent1y", "duracion", "ter"]].reset_index(drop=True)
+
+        # Movimiento esperado de tipos a la duración de cada ETF (curva interpolada)
+        df_all["delta_tipos"] = obtener_movimiento_tipos(db, region, df_all["duracion"].to_numpy(), horizonte)
+
+        # Covarianzas con los NAV guardados (correlaciones reales entre ETFs)
+        cov = matriz_covarianzas(db, df_all["isin"].tolist(), vol_respaldo=df_all["vol"].to_numpy())
+        covarianza = cov["covarianza"] if cov["con_historico"].any() else None
+
+        # Optimización sobre todo el universo filtrado
+        if "Proyectada" in criterio_base:
+            rent_esperada = rentabilidad_activos(df_all["ytm"], df_all["duracion"], df_all["delta_tipos"], horizonte)
+        else:
+            rent_esperada = df_all["rent1y"].to_numpy()
+
+        try:
+            resultado = optimizar_cartera(
+                rent_esperada, df_all["vol"], df_all["duracion"],
+                codificar_tramos(df_all["tramo"]), pesos,
+                max_activos=n_etfs, max_por_tramo=m_etfs,
+                vol_max=vol_max or None, dur_min=dur_min or None, dur_max=dur_max or None,
+                peso_max=peso_max / 100, covarianza=covarianza,
+            )
+        except ValueError as e:
+            st.error(f"No se pudo construir la selección: {e}")
+            st.stop()
+
+        df_final = df_all.iloc[resultado["indices"]].copy()
+        df_final["peso"] = resultado["pesos"][resultado["indices"]]
+        df_final["orden_tramo"] = codificar_tramos(df_final["tramo"])
+        df_final = df_final.sort_values(by=["orden_tramo", "peso"], ascending=[True, False]).drop(columns="orden_tramo")
+
+        st.session_state.optim_auto_etfs = {
+            "covarianza": covarianza[np.ix_(df_final.index, df_final.index)] if covarianza is not None else None,
+            "con_historico": int(cov["con_historico"].sum()),
+            "semanas": cov["semanas"],
+            "contraccion": cov["contraccion"],
+            "n_candidatos": resultado["n_candidatos"],
+            "tiempos_ms": resultado["tiempos_ms"],
+            "violaciones": resultado["violaciones"],
+        }
         st.session_state.cartera_auto_etfs = df_final
         st.session_state.movs_auto_etfs = movs
         st.session_state.pesos_auto_etfs = pesos
@@ -313,6 +323,17 @@ if "cartera_auto_etfs" in st.session_state:
     
     st.divider()
     st.subheader("📋 Propuesta de Cartera ETFs")
+    optim = st.session_state.get("optim_auto_etfs")
+    if optim:
+        st.caption(f"⚙️ Optimizador: {optim['n_candidatos']} ETFs candidatos, "
+                   f"{optim['tiempos_ms']['total']:.0f} ms "
+                   f"(relajado {optim['tiempos_ms']['relajado']:.0f} ms, cardinalidad {optim['tiempos_ms']['cardinalidad']:.0f} ms)")
+        if optim["covarianza"] is not None:
+            st.caption(f"🔗 Volatilidad con correlaciones: {optim['con_historico']}/{optim['n_candidatos']} ETFs con histórico NAV, "
+                       f"{optim['semanas']} semanas, contracción Ledoit-Wolf {optim['contraccion']:.2f}")
+        incumplidas = [k for k, v in optim["violaciones"].items() if v > 0.01]
+        if incumplidas:
+            st.warning(f"⚠️ No se pudieron cumplir del todo las restricciones: {', '.join(incumplidas)}")
     
     for tramo_db in df_final["tramo"].unique():
         peso_tramo = df_final[df_final["tramo"] == tramo_db]["peso"].sum()
@@ -325,23 +346,62 @@ if "cartera_auto_etfs" in st.session_state:
 
     # Métricas Consolidadas
     st.subheader("📊 Métricas de Cartera")
-    total_ytm = (df_final["ytm"] * df_final["peso"]).sum()
-    total_vol = (df_final["vol"] * df_final["peso"]).sum()
-    total_dur = (df_final["duracion"] * df_final["peso"]).sum()
+    cov_final = (st.session_state.get("optim_auto_etfs") or {}).get("covarianza")
+    metricas = metricas_dataframe(df_final, horizonte, covarianza=cov_final)
+    total_ytm, total_vol, total_dur = metricas["ytm"], metricas["vol"], metricas["dur"]
+    rent_proyectada = metricas["rent"]
     
-    c1, c2, c3, c4 = st.columns(4)
-    with c1: st.markdown(f'<div class="metric-card"><h4>YTM Medio</h4><h2>{total_ytm:.2f}%</h2></div>', unsafe_allow_html=True)
-    with c2: st.markdown(f'<div class="metric-card"><h4>Volatilidad Media</h4><h2>{total_vol:.2f}%</h2></div>', unsafe_allow_html=True)
-    with c3: st.markdown(f'<div class="metric-card"><h4>Duración Media</h4><h2>{total_dur:.2f} yr</h2></div>', unsafe_allow_html=True)
-    with c4:
-        be = total_ytm / total_dur if total_dur >0.1 else 9.9
-        st.markdown(f'<div class="metric-card"><h4>Soporte Tipos</h4><h2>{be:.2f}%</h2></div>', unsafe_allow_html=True)
+    c1, c2, c3, c4, c5 = st.columns(5)
+    with c1: st.markdown(f'<div class="metric-card"><h4>Rent. Esperada</h4><h2>{rent_proyectada:.2f}%</h2></div>', unsafe_allow_html=True)
+    with c2: st.markdown(f'<div class="metric-card"><h4>YTM Medio</h4><h2>{total_ytm:.2f}%</h2></div>', unsafe_allow_html=True)
+    with c3: st.markdown(f'<div class="metric-card"><h4>{"Volatilidad Cartera" if cov_final is not None else "Volatilidad Media"}</h4><h2>{total_vol:.2f}%</h2></div>', unsafe_allow_html=True)
+    with c4: st.markdown(f'<div class="metric-card"><h4>Duración Media</h4><h2>{total_dur:.2f} yr</h2></div>', unsafe_allow_html=True)
+    with c5:
+        st.markdown(f'<div class="metric-card"><h4>Soporte Tipos</h4><h2>{metricas["break_even"]:.2f}%</h2></div>', unsafe_allow_html=True)
 
     # Pie Chart
     fig = go.Figure(data=[go.Pie(labels=df_final["nombre"], values=df_final["peso"], hole=.3)])
     fig.update_layout(title="Distribución de Activos", height=400)
     st.plotly_chart(fig, use_container_width=True)
 
+    # Simulación Monte Carlo
+    with st.expander("🎲 Simulación Monte Carlo de Tipos", expanded="sim_auto_etfs" in st.session_state):
+        st.caption("Simula caminos correlacionados de la curva (factores PCA con reversión a la media hacia las previsiones) y revaloriza cada ETF por duración y convexidad.")
+        cs1, cs2 = st.columns([3, 1])
+        with cs1: n_caminos = st.select_slider("Nº de caminos", [1000, 2000, 5000, 10000, 20000], value=5000, key=f"caminos_auto_etfs{suffix}")
+        with cs2:
+            st.write("")
+            if st.button("▶️ Simular", use_container_width=True, key="btn_sim_auto_etfs"):
+                st.session_state.sim_auto_etfs = simular_cartera(
+                    db, region, df_final["peso"], df_final["ytm"], df_final["duracion"], horizonte, n_caminos=n_caminos,
+                )
+
+        sim = st.session_state.get("sim_auto_etfs")
+        if sim:
+            origen = f"{sim['modelo']['semanas']} semanas de histórico" if sim["modelo"]["origen"] == "historico" else "estructura por defecto (histórico insuficiente)"
+            st.caption(f"⏱️ {sim['n_caminos']} caminos en {sim['tiempo_ms']:.0f} ms · {sim['modelo']['factores']} factores, {origen}")
+            s1, s2, s3, s4 = st.columns(4)
+            with s1: st.markdown(f'<div class="metric-card"><h4>Rent. Media Anual</h4><h2>{sim["media"]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s2: st.markdown(f'<div class="metric-card"><h4>Percentil 5 Anual</h4><h2>{sim["percentiles"][5]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s3: st.markdown(f'<div class="metric-card"><h4>VaR {sim["nivel_var"]:.0%} ({horizonte}A)</h4><h2>{sim["var"]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s4: st.markdown(f'<div class="metric-card"><h4>Prob. Pérdida</h4><h2>{sim["prob_perdida"]*100:.1f}%</h2></div>', unsafe_allow_html=True)
+
+            fig_h = go.Figure(go.Histogram(x=sim["rent_anual"], nbinsx=60, marker_color="#4e79a7"))
+            fig_h.add_vline(x=rent_proyectada, line_dash="dash", annotation_text="Proyección")
+            fig_h.add_vline(x=sim["percentiles"][5], line_dash="dot", line_color="red", annotation_text="P5")
+            fig_h.update_layout(title_text="Distribución de la rentabilidad anualizada", xaxis_title="Rentabilidad anual (%)", height=350, showlegend=False)
+            st.plotly_chart(fig_h, use_container_width=True)
+
+            abanico = sim["abanico"]
+            fig_a = go.Figure()
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[95], line=dict(width=0), showlegend=False))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[5], fill="tonexty", line=dict(width=0), name="P5–P95"))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[75], line=dict(width=0), showlegend=False))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[25], fill="tonexty", line=dict(width=0), name="P25–P75"))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[50], name="Mediana"))
+            fig_a.update_layout(title_text="Rentabilidad acumulada a lo largo del horizonte", xaxis_title="Años", yaxis_title="Acumulada (%)", height=350)
+            st.plotly_chart(fig_a, use_container_width=True)
+
     st.divider()
     col_c1, col_c2, col_c3 = st.columns([4,2,4])
     with col_c2:
@@ -356,8 +416,8 @@ if "cartera_auto_etfs" in st.session_state:
                 "fecha_creacion": datetime.now(UTC),
                 "origen": "A",
                 "tipo": "ETF",
-                "metas": {"perfil": perfil, "region": region},
-                "metricas": {"ytm": total_ytm, "vol": total_vol, "dur": total_dur},
+                "metas": {"perfil": perfil, "region": region, "horizonte": horizonte},
+                "metricas": {"rent": rent_proyectada, "ytm": total_ytm, "vol": total_vol, "vol_media": metricas["vol_media"], "dur": total_dur},
                 "etfs": etfs_lista
             }
             try:
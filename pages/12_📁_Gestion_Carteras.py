@@ -1,8 +1,16 @@
 import streamlit as st
-import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import buscar
+from src.resumen_carteras import cargar_cartera, obtener_pagina_carteras
+from src.metricas_cartera import resolver_metricas, totales_cartera
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -128,47 +136,11 @@ def save_portfolio(type_p, doc_id, assets):
             
     col.update_one({"_id": doc_id}, {"$set": {field: assets}})
 
-def get_asset_metrics(isin, type_p):
-    """Obtiene métricas de un activo desde su colección correspondiente."""
-    col = fondos_collection if type_p == "Fondos" else etfs_collection
-    doc = col.find_one({"isin": isin})
-    if not doc:
-        return {"ytm": 0.0, "vol": 0.0, "dur": 0.0, "tramo": "N/A"}
-    
-    if type_p == "Fondos":
-        return {
-            "ytm": doc.get("duration", {}).get("yield_to_maturity", 0.0) or 0.0,
-            "vol": doc.get("riesgo", {}).get("for3Year", {}).get("volatility", 0.0) or doc.get("riesgo", {}).get("for1Year", {}).get("volatility", 0.0) or 0.0,
-            "dur": doc.get("duration", {}).get("avg_effective_duration", 0.0) or 0.0,
-            "tramo": doc.get("tramo_rf", "N/A")
-        }
-    else: # ETFs
-        return {
-            "ytm": doc.get("yield_to_maturity", 0.0) or 0.0,
-            "vol": doc.get("volatility_3y", 0.0) or 0.0,
-            "dur": doc.get("duracion_efectiva", 0.0) or 0.0,
-            "tramo": doc.get("tipoEtf", "N/A")
-        }
-
-def calculate_portfolio_totals(assets, type_p):
-    """Calcula métricas ponderadas para una lista de activos."""
-    total_ytm = 0.0
-    total_vol = 0.0
-    total_dur = 0.0
-    total_weight = sum(a.get("peso", 0) for a in assets)
-    
-    if total_weight == 0:
-        return {"ytm": 0, "vol": 0, "dur": 0}
-        
-    for a in assets:
-        m = get_asset_metrics(a["isin"], type_p)
-        # Normalizamos peso si no suma 1 en el borrador
-        p_rel = a.get("peso", 0) / total_weight
-        total_ytm += m["ytm"] * p_rel
-        total_vol += m["vol"] * p_rel
-        total_dur += m["dur"] * p_rel
-        
-    return {"ytm": total_ytm, "vol": total_vol, "dur": total_dur}
+def get_edit_metrics(edit_state, *asset_lists):
+    """Métricas de los activos en edición (una consulta $in por ISIN nuevo, en caché en la sesión de edición)."""
+    isins = [a["isin"] for assets in asset_lists for a in assets]
+    edit_state["metricas"] = resolver_metricas(db, edit_state["type"], isins, edit_state.get("metricas"))
+    return edit_state["metricas"]
 
 # ==========================================================
 # INTERFAZ
@@ -195,124 +167,91 @@ def start_editing(type_p, doc):
 def cancel_editing():
     st.session_state.editing_portfolio = None
 
+# ==========================================================
+# LISTADOS DE CARTERAS (resumen paginado en Mongo)
+# ==========================================================
+ROWS_PER_PAGE_CARTERAS = 20
+
+def render_portfolio_list(type_p, sfx, titulo, vacio):
+    """Tabla paginada de carteras; los activos completos se cargan solo al editar."""
+    page_key = f"page_carteras_{sfx}"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+
+    pagina = obtener_pagina_carteras(db, type_p, st.session_state[page_key], ROWS_PER_PAGE_CARTERAS)
+    st.session_state[page_key] = current_page = pagina["pagina"]
+    if pagina["total"] == 0:
+        st.info(vacio)
+        return
+
+    st.subheader(f"📋 {titulo} ({pagina['total']})")
+
+    # Cabecera
+    h_cols = st.columns([2.5, 2.5, 3, 1.5, 2, 1, 1])
+    with h_cols[0]: st.markdown('<div class="table-header">ID Cartera</div>', unsafe_allow_html=True)
+    with h_cols[1]: st.markdown('<div class="table-header" style="border-left:none">Fecha</div>', unsafe_allow_html=True)
+    with h_cols[2]: st.markdown('<div class="table-header" style="border-left:none">Perfil / Región</div>', unsafe_allow_html=True)
+    with h_cols[3]: st.markdown('<div class="table-header" style="border-left:none">Activos</div>', unsafe_allow_html=True)
+    with h_cols[4]: st.markdown('<div class="table-header" style="border-left:none">YTM / Vol</div>', unsafe_allow_html=True)
+    with h_cols[5]: st.markdown('<div class="table-header" style="border-left:none; border-right:none">Edit</div>', unsafe_allow_html=True)
+    with h_cols[6]: st.markdown('<div class="table-header" style="border-left:none">Del</div>', unsafe_allow_html=True)
+
+    for idx, d in enumerate(pagina["filas"], start=(current_page - 1) * ROWS_PER_PAGE_CARTERAS):
+        # Perfil y región (Auto vs Manual; ya resueltos desde 'metas' en la agregación)
+        p = d.get("perfil")
+        r = d.get("region")
+        if d.get("origen") == "M" and not p:
+            info_perf = "Manual"
+        else:
+            p_text = p if p else "N/A"
+            r_text = f" ({r})" if r else ""
+            info_perf = f"{p_text}{r_text}"
+
+        m = d.get("metricas") or {}
+        info_metricas = f"{m['ytm']:.2f}% / {m['vol']:.2f}%" if m.get("ytm") is not None and m.get("vol") is not None else "—"
+        info_activos = f"{d['n_activos']}" if abs((d.get("peso_total") or 0) - 1) < 0.005 else f"{d['n_activos']} ({(d.get('peso_total') or 0):.0%})"
+
+        cols = st.columns([2.5, 2.5, 3, 1.5, 2, 1, 1], gap="small")
+
+        with cols[0]: st.markdown(f'<div class="vertical-line"><strong>{d.get("cartera_id", "N/A")}</strong></div>', unsafe_allow_html=True)
+        with cols[1]: st.markdown(f'<div class="vertical-line" style="border-left:none">{format_date(d.get("fecha_creacion"))}</div>', unsafe_allow_html=True)
+        with cols[2]: st.markdown(f'<div class="vertical-line" style="border-left:none">{info_perf}</div>', unsafe_allow_html=True)
+        with cols[3]: st.markdown(f'<div class="vertical-line" style="border-left:none">{info_activos}</div>', unsafe_allow_html=True)
+        with cols[4]: st.markdown(f'<div class="vertical-line" style="border-left:none">{info_metricas}</div>', unsafe_allow_html=True)
+
+        with cols[5]:
+            if st.button("✏️", key=f"edit_{sfx}_{idx}", help="Editar", use_container_width=True):
+                doc = cargar_cartera(db, type_p, d["_id"])
+                if doc:
+                    start_editing(type_p, doc)
+
+        with cols[6]:
+            if st.button("🗑️", key=f"del_{sfx}_{idx}", help="Borrar", use_container_width=True):
+                (carteras_fondos if type_p == "Fondos" else carteras_etf).delete_one({"_id": d["_id"]})
+                st.rerun()
+
+    # Paginación
+    if pagina["paginas"] > 1:
+        pc1, pc2, pc3 = st.columns([1, 3, 1])
+        if pc1.button("◀", disabled=(current_page == 1), key=f"prev_{page_key}"):
+            st.session_state[page_key] -= 1
+            st.rerun()
+        pc2.markdown(f"<div style='text-align:center'>Página {current_page} de {pagina['paginas']}</div>", unsafe_allow_html=True)
+        if pc3.button("▶", disabled=(current_page == pagina["paginas"]), key=f"next_{page_key}"):
+            st.session_state[page_key] += 1
+            st.rerun()
+
 # ==========================================================
 # TAB: FONDOS
 # ==========================================================
 with tab_f:
-    docs = list(carteras_fondos.find().sort("fecha_creacion", -1))
-    if not docs:
-        st.info("No hay carteras de fondos guardadas.")
-    else:
-        # Tabla de carteras
-        data = []
-        for d in docs:
-            # Obtener perfil y región de varias posibles fuentes (Auto vs Manual)
-            p = d.get("perfil") or d.get("metas", {}).get("perfil")
-            r = d.get("region") or d.get("metas", {}).get("region")
-            
-            # Si es manual y no tiene estos campos, ponemos Manual
-            if d.get("origen") == "M" and not p:
-                info_perf = "Manual"
-            else:
-                p_text = p if p else "N/A"
-                r_text = f" ({r})" if r else ""
-                info_perf = f"{p_text}{r_text}"
-
-            data.append({
-                "ID": d.get("cartera_id", "N/A"),
-                "Fecha": format_date(d.get("fecha_creacion")),
-                "PerfReg": info_perf,
-                "Origen": "Auto" if d.get("origen") == "A" else "Manual",
-                "Activos": len(d.get("fondos", [])),
-                "obj": d
-            })
-        
-        df_list = pd.DataFrame(data)
-        st.subheader("📋 Listado de Carteras de Fondos")
-        
-        # Cabecera
-        h_cols = st.columns([2.5, 2.5, 3, 1.5, 1, 1])
-        with h_cols[0]: st.markdown('<div class="table-header">ID Cartera</div>', unsafe_allow_html=True)
-        with h_cols[1]: st.markdown('<div class="table-header" style="border-left:none">Fecha</div>', unsafe_allow_html=True)
-        with h_cols[2]: st.markdown('<div class="table-header" style="border-left:none">Perfil / Región</div>', unsafe_allow_html=True)
-        with h_cols[3]: st.markdown('<div class="table-header" style="border-left:none">Activos</div>', unsafe_allow_html=True)
-        with h_cols[4]: st.markdown('<div class="table-header" style="border-left:none; border-right:none">Edit</div>', unsafe_allow_html=True)
-        with h_cols[5]: st.markdown('<div class="table-header" style="border-left:none">Del</div>', unsafe_allow_html=True)
-
-        for idx, row in df_list.iterrows():
-            cols = st.columns([2.5, 2.5, 3, 1.5, 1, 1], gap="small")
-            
-            with cols[0]: st.markdown(f'<div class="vertical-line"><strong>{row["ID"]}</strong></div>', unsafe_allow_html=True)
-            with cols[1]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["Fecha"]}</div>', unsafe_allow_html=True)
-            with cols[2]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["PerfReg"]}</div>', unsafe_allow_html=True)
-            with cols[3]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["Activos"]}</div>', unsafe_allow_html=True)
-            
-            with cols[4]:
-                if st.button("✏️", key=f"edit_f_{idx}", help="Editar", use_container_width=True):
-                    start_editing("Fondos", row['obj'])
-
-            with cols[5]:
-                if st.button("🗑️", key=f"del_f_{idx}", help="Borrar", use_container_width=True):
-                    carteras_fondos.delete_one({"_id": row['obj']["_id"]})
-                    st.rerun()
+    render_portfolio_list("Fondos", "f", "Listado de Carteras de Fondos", "No hay carteras de fondos guardadas.")
 
 # ==========================================================
 # TAB: ETFs
 # ==========================================================
 with tab_e:
-    docs_e = list(carteras_etf.find().sort("fecha_creacion", -1))
-    if not docs_e:
-        st.info("No hay carteras de ETFs guardadas.")
-    else:
-        data_e = []
-        for d in docs_e:
-            p_e = d.get("perfil") or d.get("metas", {}).get("perfil")
-            r_e = d.get("region") or d.get("metas", {}).get("region")
-            
-            if d.get("origen") == "M" and not p_e:
-                info_perf_e = "Manual"
-            else:
-                p_text_e = p_e if p_e else "N/A"
-                r_text_e = f" ({r_e})" if r_e else ""
-                info_perf_e = f"{p_text_e}{r_text_e}"
-
-            data_e.append({
-                "ID": d.get("cartera_id", "N/A"),
-                "Fecha": format_date(d.get("fecha_creacion")),
-                "PerfReg": info_perf_e,
-                "Origen": "Auto" if d.get("origen") == "A" else "Manual",
-                "Activos": len(d.get("etfs", [])),
-                "obj": d
-            })
-        
-        df_list_e = pd.DataFrame(data_e)
-        st.subheader("📋 Listado de Carteras de ETFs")
-        
-        # Cabecera
-        he_cols = st.columns([2.5, 2.5, 3, 1.5, 1, 1])
-        with he_cols[0]: st.markdown('<div class="table-header">ID Cartera</div>', unsafe_allow_html=True)
-        with he_cols[1]: st.markdown('<div class="table-header" style="border-left:none">Fecha</div>', unsafe_allow_html=True)
-        with he_cols[2]: st.markdown('<div class="table-header" style="border-left:none">Perfil / Región</div>', unsafe_allow_html=True)
-        with he_cols[3]: st.markdown('<div class="table-header" style="border-left:none">Activos</div>', unsafe_allow_html=True)
-        with he_cols[4]: st.markdown('<div class="table-header" style="border-left:none; border-right:none">Edit</div>', unsafe_allow_html=True)
-        with he_cols[5]: st.markdown('<div class="table-header" style="border-left:none">Del</div>', unsafe_allow_html=True)
-
-        for idx, row in df_list_e.iterrows():
-            cols_e = st.columns([2.5, 2.5, 3, 1.5, 1, 1], gap="small")
-            
-            with cols_e[0]: st.markdown(f'<div class="vertical-line"><strong>{row["ID"]}</strong></div>', unsafe_allow_html=True)
-            with cols_e[1]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["Fecha"]}</div>', unsafe_allow_html=True)
-            with cols_e[2]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["PerfReg"]}</div>', unsafe_allow_html=True)
-            with cols_e[3]: st.markdown(f'<div class="vertical-line" style="border-left:none">{row["Activos"]}</div>', unsafe_allow_html=True)
-            
-            with cols_e[4]:
-                if st.button("✏️", key=f"edit_e_{idx}", help="Editar", use_container_width=True):
-                    start_editing("ETFs", row['obj'])
-
-            with cols_e[5]:
-                if st.button("🗑️", key=f"del_e_{idx}", help="Borrar", use_container_width=True):
-                    carteras_etf.delete_one({"_id": row['obj']["_id"]})
-                    st.rerun()
+    render_portfolio_list("ETFs", "e", "Listado de Carteras de ETFs", "No hay carteras de ETFs guardadas.")
 
 # ==========================================================
 # FORMULARIO DE EDICIÓN (MODAL-LIKE)
@@ -344,6 +283,8 @@ if st.session_state.editing_portfolio:
     st.subheader(f"🛠️ Editando Cartera: {edit_state['original_doc'].get('cartera_id')}")
     
     assets = edit_state["assets"]
+    original_assets = edit_state["original_doc"].get("fondos" if type_p == "Fondos" else "etfs", [])
+    metricas = get_edit_metrics(edit_state, original_assets, assets)
     to_delete = []
     
     st.write("##### Selección de activos a modificar/eliminar:")
@@ -376,8 +317,7 @@ if st.session_state.editing_portfolio:
         # Recuperar tramo si es N/A o no existe
         disp_tramo = asset.get('tramo')
         if not disp_tramo or disp_tramo == "N/A":
-            m_info = get_asset_metrics(asset['isin'], type_p)
-            disp_tramo = m_info["tramo"]
+            disp_tramo = metricas.at[asset['isin'], "tramo"]
             asset['tramo'] = disp_tramo
 
         with c4:
@@ -391,14 +331,15 @@ if st.session_state.editing_portfolio:
     st.write("##### ➕ Añadir nuevo activo")
     col_add1, col_add2 = st.columns([4, 1])
     
-    # Selector de búsqueda
-    search_col = fondos_collection if type_p == "Fondos" else etfs_collection
+    # Selector de búsqueda (índice de nombres e ISIN de todo el universo)
+    search_corpus = "fondos" if type_p == "Fondos" else "etfs"
     search_name_key = "nombre" if type_p == "Fondos" else "nombreEtf"
     
-    all_available = list(search_col.find({}, {search_name_key: 1, "isin": 1, "tramo_rf": 1, "tipoEtf": 1}).limit(500))
-    options = {f"{a.get(search_name_key)} ({a.get('isin')})": a for a in all_available}
+    search_text = col_add1.text_input("Buscar activo para añadir:", placeholder="Escriba ISIN o nombre...", key=f"search_new_{search_corpus}")
+    results = buscar(db, search_corpus, search_text, k=20)
+    options = {f"{a.get(search_name_key)} ({a.get('isin')})": a for a in results}
     
-    selected_new = col_add1.selectbox("Buscar activo para añadir:", ["---"] + list(options.keys()))
+    selected_new = col_add1.selectbox("Resultados:", ["---"] + list(options.keys()))
     if col_add2.button("Añadir"):
         if selected_new != "---":
             base_data = options[selected_new]
@@ -420,8 +361,8 @@ if st.session_state.editing_portfolio:
     
     # Calculamos métricas
     with st.spinner("Calculando impacto..."):
-        m_before = calculate_portfolio_totals(edit_state["original_doc"].get("fondos" if type_p == "Fondos" else "etfs", []), type_p)
-        m_after = calculate_portfolio_totals(final_assets, type_p)
+        m_before = totales_cartera(metricas, original_assets)
+        m_after = totales_cartera(metricas, final_assets)
     
     # Mostrar métricas en columnas
     mc1, mc2, mc3 = st.columns(3)
@@ -1,20 +1,16 @@
 import streamlit as st
 import pandas as pd
-import requests
-import re
-from bs4 import BeautifulSoup
-from datetime import datetime
+import sys
+import os
 from pymongo import MongoClient
 import plotly.graph_objects as go
 from styles import apply_styles
 
-# ==========================================
-# CONFIG
-# ==========================================
-FRED_KEY  = "d1b8ad24807ab32d1786cbcd3501a337"
-FRED_BASE = "https://api.stlouisfed.org/fred/series/observations"
-ECB_BASE  = "https://data.ecb.europa.eu/api/data"
-WB_BASE   = "https://api.worldbank.org/v2/country"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from src.cache_figuras import figura, resumen_figuras
+from src.perfilado_arranque import inicio, marca
+
+inicio("Datos_Macro")
 
 st.set_page_config(layout="wide")
 apply_styles()
@@ -34,257 +30,14 @@ def get_db():
 db         = get_db()
 col_macro  = db["datos_macro"]
 
-# ==========================================
-# FRED HELPERS
-# ==========================================
-def fred_fetch(series_id, n=14):
-    """Returns (latest, prev, dataframe_sorted_desc)"""
-    params = {
-        "series_id": series_id,
-        "api_key": FRED_KEY,
-        "file_type": "json",
-        "sort_order": "desc",
-        "limit": n,
-    }
-    try:
-        r = requests.get(FRED_BASE, params=params, timeout=10)
-        r.raise_for_status()
-        obs = r.json().get("observations", [])
-        df  = pd.DataFrame(obs)
-        if df.empty:
-            return None, None, pd.DataFrame()
-        df["value"] = pd.to_numeric(df["value"], errors="coerce")
-        df["date"]  = pd.to_datetime(df["date"])
-        df = df.dropna(subset=["value"]).sort_values("date", ascending=False).reset_index(drop=True)
-        latest = round(float(df.iloc[0]["value"]), 2)
-        prev   = round(float(df.iloc[1]["value"]), 2) if len(df) > 1 else None
-        return latest, prev, df
-    except Exception as e:
-        return None, None, pd.DataFrame()
-
-
-def fred_yoy(series_id):
-    """Calcula variación interanual para series de nivel (CPI, etc.)"""
-    _, _, df = fred_fetch(series_id, n=15)
-    if df.empty or len(df) < 13:
-        return None, None
-    df = df.sort_values("date", ascending=False).reset_index(drop=True)
-    cur   = df.iloc[0]["value"]
-    ya    = df.iloc[12]["value"]
-    prev  = df.iloc[1]["value"]
-    ya_p  = df.iloc[13]["value"] if len(df) > 13 else ya
-    yoy      = round((cur  - ya)   / ya   * 100, 2)
-    yoy_prev = round((prev - ya_p) / ya_p * 100, 2)
-    return yoy, yoy_prev
-
-# ==========================================
-# ECB HELPERS
-# ==========================================
-def ecb_fetch(flow, key_str, n=3):
-    """Returns (latest, prev) from ECB SDW JSON API"""
-    url    = f"{ECB_BASE}/{flow},{key_str}"
-    params = {"lastNObservations": n, "format": "jsondata", "detail": "dataonly"}
-    try:
-        r = requests.get(url, params=params, timeout=12)
-        r.raise_for_status()
-        data    = r.json()
-        datasets = data.get("dataSets", [])
-        if not datasets:
-            return None, None
-        series_dict = datasets[0].get("series", {})
-        if not series_dict:
-            return None, None
-        for _, s in series_dict.items():
-            obs    = s.get("observations", {})
-            sorted_keys = sorted(obs.keys(), key=lambda x: int(x))
-            values = [obs[k][0] for k in sorted_keys if obs[k][0] is not None]
-            if not values:
-                return None, None
-            return round(float(values[-1]), 2), (round(float(values[-2]), 2) if len(values) > 1 else None)
-        return None, None
-    except Exception:
-        return None, None
-
-# ==========================================
-# WORLD BANK: CPI YoY anual (China, Japón)
-# ==========================================
-def wb_cpi(country_code):
-    """Inflación anual % (World Bank FP.CPI.TOTL.ZG) — gratis, sin clave"""
-    url = f"{WB_BASE}/{country_code}/indicator/FP.CPI.TOTL.ZG"
-    params = {"format": "json", "mrv": 3, "per_page": 3}
-    try:
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        if len(data) < 2 or not data[1]:
-            return None, None
-        obs = [x for x in data[1] if x.get("value") is not None]
-        obs.sort(key=lambda x: x["date"], reverse=True)
-        if not obs:
-            return None, None
-        latest = round(float(obs[0]["value"]), 2)
-        prev   = round(float(obs[1]["value"]), 2) if len(obs) > 1 else None
-        return latest, prev
-    except Exception:
-        return None, None
-
-# ==========================================
-# TRADING ECONOMICS SCRAPER (China PMI, BOJ, etc.)
-# Misma técnica que worldgovernmentbonds.com
-# ==========================================
-SCRAPER_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/120.0.0.0 Safari/537.36"
-    ),
-    "Accept-Language": "en-US,en;q=0.9",
-    "Accept": "text/html,application/xhtml+xml",
-    "Referer": "https://www.google.com/",
-}
-
-def scrape_te(slug):
-    """Scrapea el valor actual de un indicador en Trading Economics.
-    Slug ej: 'china/manufacturing-pmi', 'japan/unemployment-rate'
-    Devuelve (valor_actual, None).
-    """
-    url = f"https://tradingeconomics.com/{slug}"
-    try:
-        r = requests.get(url, headers=SCRAPER_HEADERS, timeout=15)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "lxml")
-
-        # Método 1: span#p (elemento principal de valor en TE)
-        el = soup.find(id="p")
-        if el:
-            txt = el.get_text(strip=True).replace(",", ".")
-            m = re.search(r"(-?[\d]+\.?[\d]*)", txt)
-            if m:
-                return round(float(m.group(1)), 2), None
-
-        # Método 2: buscar lastValue en scripts
-        for script in soup.find_all("script"):
-            if script.string and "lastValue" in (script.string or ""):
-                m = re.search(r'"lastValue"\s*:\s*([\d.\-]+)', script.string)
-                if m:
-                    return round(float(m.group(1)), 2), None
-
-        # Método 3: buscar el valor en el primer elemento con clase 'price'
-        el = soup.find(class_=re.compile(r"price", re.I))
-        if el:
-            m = re.search(r"(-?[\d]+\.?[\d]*)", el.get_text())
-            if m:
-                return round(float(m.group(1)), 2), None
-
-    except Exception:
-        pass
-    return None, None
-
-# ==========================================
-# WORLD BANK HELPER
-# ==========================================
-def wb_gdp(country_code):
-    """PIB real YoY growth % — World Bank (gratuito, sin clave)"""
-    url = f"{WB_BASE}/{country_code}/indicator/NY.GDP.MKTP.KD.ZG"
-    params = {"format": "json", "mrv": 3, "per_page": 3}
-    try:
-        r = requests.get(url, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        if len(data) < 2 or not data[1]:
-            return None, None
-        obs = [x for x in data[1] if x.get("value") is not None]
-        obs.sort(key=lambda x: x["date"], reverse=True)
-        if not obs:
-            return None, None
-        latest = round(float(obs[0]["value"]), 2)
-        prev   = round(float(obs[1]["value"]), 2) if len(obs) > 1 else None
-        return latest, prev
-    except Exception:
-        return None, None
-
 # ==========================================
 # RECOPILAR TODOS LOS DATOS
 # ==========================================
 def recopilar_datos():
-    datos   = {}
-    errores = []
-
+    from src import datos_macro   # trae requests y bs4: solo al pulsar recopilar
     progress = st.progress(0, text="Iniciando recopilación...")
-
-    # --- Fed Funds Rate ---
-    progress.progress(10, "🇺🇸 Obteniendo tipo Fed...")
-    v, p, _ = fred_fetch("DFF", n=5)
-    datos["fed_rate"] = v;  datos["fed_rate_prev"] = p
-
-    # --- US CPI YoY ---
-    progress.progress(22, "🇺🇸 Obteniendo CPI US...")
-    datos["us_cpi"], datos["us_cpi_prev"] = fred_yoy("CPIAUCSL")
-
-    # --- US Core CPI YoY ---
-    progress.progress(34, "🇺🇸 Obteniendo Core CPI US...")
-    datos["us_core_cpi"], datos["us_core_cpi_prev"] = fred_yoy("CPILFESL")
-
-    # --- US Unemployment ---
-    progress.progress(44, "🇺🇸 Obteniendo desempleo US...")
-    v, p, _ = fred_fetch("UNRATE", n=3)
-    datos["us_unemployment"] = v;  datos["us_unemployment_prev"] = p
-
-    # --- ISM Manufacturing PMI ---
-    progress.progress(54, "🇺🇸 Obteniendo ISM PMI...")
-    v, p, _ = fred_fetch("NAPM", n=3)
-    datos["ism_pmi"] = v;  datos["ism_pmi_prev"] = p
-
-    # --- US GDP real (QoQ anualizado) ---
-    progress.progress(62, "🇺🇸 Obteniendo PIB US...")
-    v, p, _ = fred_fetch("A191RL1Q225SBEA", n=3)
-    datos["us_gdp"] = v;  datos["us_gdp_prev"] = p
-
-    # --- US Treasuries 10Y / 2Y ---
-    progress.progress(70, "🇺🇸 Obteniendo curva de tipos US...")
-    y10, y10p, _ = fred_fetch("GS10", n=5)
-    y2,  y2p,  _ = fred_fetch("GS2",  n=5)
-    datos["us_10y"] = y10;  datos["us_10y_prev"] = y10p
-    datos["us_2y"]  = y2;   datos["us_2y_prev"]  = y2p
-    if y10 is not None and y2 is not None:
-        datos["yield_spread"]      = round(y10 - y2, 2)
-        datos["yield_spread_prev"] = round(y10p - y2p, 2) if (y10p and y2p) else None
-
-    # --- ECB Deposit Facility Rate ---
-    progress.progress(82, "🇪🇺 Obteniendo tipo BCE...")
-    v, p = ecb_fetch("FM", "B.U2.EUR.4F.KR.DFR.LEV")
-    datos["ecb_rate"] = v;  datos["ecb_rate_prev"] = p
-
-    # --- EU HICP (general y subyacente) ---
-    progress.progress(90, "🇪🇺 Obteniendo inflación EU...")
-    v, p = ecb_fetch("ICP", "M.U2.N.000000.4.ANR")
-    datos["eu_cpi"] = v;  datos["eu_cpi_prev"] = p
-    v, p = ecb_fetch("ICP", "M.U2.N.XEF000.4.ANR")
-    datos["eu_core_cpi"] = v;  datos["eu_core_cpi_prev"] = p
-
-    # --- CHINA ---
-    progress.progress(92, "🇨🇳 Obteniendo datos China (World Bank + Trading Economics)...")
-    datos["cn_cpi"], datos["cn_cpi_prev"]   = wb_cpi("CN")        # World Bank
-    datos["cn_gdp"], datos["cn_gdp_prev"]   = wb_gdp("CN")        # World Bank
-    v, _ = scrape_te("china/manufacturing-pmi")                    # Trading Economics
-    datos["cn_pmi"]      = v
-    datos["cn_pmi_prev"] = None
-
-    # --- JAPÓN ---
-    progress.progress(96, "🇯🇵 Obteniendo datos Japón (World Bank + Trading Economics)...")
-    datos["jp_cpi"], datos["jp_cpi_prev"]         = wb_cpi("JP")   # World Bank
-    datos["jp_gdp"], datos["jp_gdp_prev"]         = wb_gdp("JP")   # World Bank
-    v, _ = scrape_te("japan/unemployment-rate")                    # Trading Economics
-    datos["jp_unemployment"]      = v
-    datos["jp_unemployment_prev"] = None
-    v, _ = scrape_te("japan/interest-rate")                        # Trading Economics
-    datos["boj_rate"]      = v
-    datos["boj_rate_prev"] = None
-
-    progress.progress(100, "✅ Completado")
+    datos = datos_macro.recopilar_datos(progreso=lambda pct, texto: progress.progress(pct, texto))
     progress.empty()
-
-    datos["fecha_actualizacion"] = datetime.now()
     return datos
 
 # ==========================================
@@ -351,10 +104,8 @@ def calcular_semaforo(datos):
 # MONGODB
 # ==========================================
 def guardar_snapshot(datos, notas=""):
-    doc        = {k: v for k, v in datos.items()}
-    doc["notas"] = notas
-    doc["mes"]   = datetime.now().strftime("%Y-%m")
-    col_macro.update_one({"mes": doc["mes"]}, {"$set": doc}, upsert=True)
+    from src import datos_macro
+    datos_macro.guardar_snapshot(db, datos, notas)
 
 def cargar_historial(n=12):
     return list(col_macro.find({}, {"_id": 0}).sort("fecha_actualizacion", -1).limit(n))
@@ -386,6 +137,8 @@ def gauge(title, val, rng, steps, threshold=None):
     fig.update_layout(height=230, margin=dict(l=15, r=15, t=45, b=10), paper_bgcolor="rgba(0,0,0,0)")
     return fig
 
+marca("Datos_Macro", "configuración")
+
 # ==========================================
 # UI PRINCIPAL
 # ==========================================
@@ -422,6 +175,8 @@ else:
 if not D:
     st.stop()
 
+marca("Datos_Macro", "snapshot")
+
 # ==========================================
 # SEMÁFORO
 # ==========================================
@@ -587,6 +342,8 @@ with c4:
               delta=delta_str(v, D.get("jp_gdp_prev")),
               help="Crecimiento PIB real anual (World Bank)")
 
+marca("Datos_Macro", "indicadores")
+
 # ==========================================
 # GAUGES VISUALES
 # ==========================================
@@ -595,7 +352,8 @@ st.subheader("🎯 Panel Visual")
 cg1, cg2, cg3 = st.columns(3)
 
 with cg1:
-    st.plotly_chart(gauge(
+    st.plotly_chart(figura(
+        "Datos_Macro", gauge,
         "Inflación US (CPI %)", D.get("us_cpi"), [0, 8],
         [{"range": [0, 2.5],  "color": "#dcfce7"},
          {"range": [2.5, 3.5],"color": "#fef9c3"},
@@ -603,7 +361,8 @@ with cg1:
     ), use_container_width=True)
 
 with cg2:
-    st.plotly_chart(gauge(
+    st.plotly_chart(figura(
+        "Datos_Macro", gauge,
         "ISM PMI Manufacturing", D.get("ism_pmi"), [40, 65],
         [{"range": [40, 48], "color": "#fee2e2"},
          {"range": [48, 50], "color": "#fef9c3"},
@@ -611,13 +370,18 @@ with cg2:
     ), use_container_width=True)
 
 with cg3:
-    st.plotly_chart(gauge(
+    st.plotly_chart(figura(
+        "Datos_Macro", gauge,
         "Desempleo US (%)", D.get("us_unemployment"), [0, 10],
         [{"range": [0, 4],  "color": "#dcfce7"},
          {"range": [4, 5],  "color": "#fef9c3"},
          {"range": [5, 10], "color": "#fee2e2"}], threshold=5
     ), use_container_width=True)
 
+st.caption(resumen_figuras("Datos_Macro"))
+
+marca("Datos_Macro", "gauges")
+
 # ==========================================
 # GUARDAR SNAPSHOT
 # ==========================================
@@ -676,3 +440,5 @@ if historial:
     st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
 else:
     st.info("Aún no hay snapshots guardados. Actualiza los datos y guarda el primero.")
+
+marca("Datos_Macro", "historial")
@@ -1,9 +1,19 @@
 import streamlit as st
 import pandas as pd
 from pymongo import MongoClient
-import math
 import plotly.graph_objects as go
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import coincidencias
+from src.cache_figuras import figura, resumen_figuras
+from src.detalle_activos import obtener_detalle
+from src.percentiles_categoria import texto_percentiles
+from src.consultas_listado import TODOS, construir_consulta, obtener_pagina, opciones_filtro
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -34,31 +44,6 @@ def get_db():
 db = get_db()
 fondos_collection = db["fondos"]
 
-# ==========================================================
-# CARGA DATOS (Resumen para listado)
-# ==========================================================
-fondos_cursor = fondos_collection.find({}, {
-    "_id": 0,
-    "isin": 1,
-    "nombre": 1,
-    "tipo_rf": 1,
-    "tramo_rf": 1,
-    "duration.avg_effective_duration": 1,
-    "sensibilidad_tipos.nivel": 1
-})
-
-df = pd.json_normalize(list(fondos_cursor))
-
-if df.empty:
-    st.warning("No hay fondos disponibles en la base de datos.")
-    st.stop()
-
-# Renombrar columnas
-df.rename(columns={
-    "duration.avg_effective_duration": "duration",
-    "sensibilidad_tipos.nivel": "sensibilidad"
-}, inplace=True)
-
 # ==========================================================
 # SECCIÓN 1: FILTROS (Encima de la Tabla)
 # ==========================================================
@@ -67,37 +52,22 @@ with filter_container:
     col_f1, col_f2, col_f3, col_f4 = st.columns(4)
     
     with col_f1:
-        isin_input = st.text_input("🔍 Buscar por ISIN", placeholder="Escriba ISIN...").strip()
+        isin_input = st.text_input("🔍 Buscar por ISIN o Nombre", placeholder="Escriba ISIN o nombre...").strip()
     
     with col_f2:
-        tipo_options = ["Todos"] + sorted(df["tipo_rf"].dropna().unique().tolist())
+        tipo_options = [TODOS] + opciones_filtro(db, "fondos", "tipo")
         tipo_filter = st.selectbox("📊 Tipo RF", tipo_options)
     
     with col_f3:
-        tramo_options = ["Todos"] + sorted(df["tramo_rf"].dropna().unique().tolist())
+        tramo_options = [TODOS] + opciones_filtro(db, "fondos", "tramo")
         tramo_filter = st.selectbox("⏳ Tramo RF", tramo_options)
     
     with col_f4:
-        sensibilidad_options = ["Todos"] + sorted(df["sensibilidad"].dropna().unique().tolist())
+        sensibilidad_options = [TODOS] + opciones_filtro(db, "fondos", "sensibilidad")
         sensibilidad_filter = st.selectbox("⚖️ Sensibilidad", sensibilidad_options)
 
-# Aplicar Filtros
-filtered_df = df.copy()
-
-if isin_input:
-    filtered_df = filtered_df[filtered_df["isin"].str.contains(isin_input, case=False, na=False)]
-
-if tipo_filter != "Todos":
-    filtered_df = filtered_df[filtered_df["tipo_rf"] == tipo_filter]
-
-if tramo_filter != "Todos":
-    filtered_df = filtered_df[filtered_df["tramo_rf"] == tramo_filter]
-
-if sensibilidad_filter != "Todos":
-    filtered_df = filtered_df[filtered_df["sensibilidad"] == sensibilidad_filter]
-
-st.markdown(f"### 📋 Listado de Fondos ({len(filtered_df)} encontrados)")
-
+# Consulta en servidor (solo viajan las filas de la página)
+consulta = construir_consulta("fondos", coincidencias(db, "fondos", isin_input), tipo=tipo_filter, tramo=tramo_filter, sensibilidad=sensibilidad_filter)
 
 # ==========================================================
 # GESTIÓN DE PAGINACIÓN Y SELECCIÓN (ÚNICA)
@@ -112,17 +82,18 @@ if "rows_per_page_listado" not in st.session_state:
     st.session_state.rows_per_page_listado = 10
 
 rows_per_page = st.session_state.rows_per_page_listado
-total_rows = len(filtered_df)
-total_pages = max(1, math.ceil(total_rows / rows_per_page))
+pagina = obtener_pagina(db, "fondos", consulta, st.session_state.page_number_listado, rows_per_page)
+total_rows = pagina["total"]
+total_pages = pagina["paginas"]
+st.session_state.page_number_listado = current_page = pagina["pagina"]
 
-if st.session_state.page_number_listado > total_pages:
-    st.session_state.page_number_listado = 1
+st.markdown(f"### 📋 Listado de Fondos ({total_rows} encontrados)")
 
-current_page = st.session_state.page_number_listado
-start_idx = (current_page - 1) * rows_per_page
-end_idx = start_idx + rows_per_page
+if total_rows == 0 and consulta == {}:
+    st.warning("No hay fondos disponibles en la base de datos.")
+    st.stop()
 
-page_df = filtered_df.iloc[start_idx:end_idx].copy()
+page_df = pagina["df"]
 page_df.insert(0, "Seleccionar", page_df["isin"] == st.session_state.selected_fund_isin)
 
 
@@ -268,12 +239,29 @@ st.markdown(
 st.markdown("---")
 
 
+# ==========================================================
+# GRÁFICOS (figuras cacheadas por valores de entrada)
+# ==========================================================
+def gauge_figure(value, axis_max, bar_color, steps):
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = value,
+        gauge = {
+            'axis': {'range': [None, axis_max]}, 
+            'bar': {'color': bar_color},
+            'steps': [{'range': [lo, hi], 'color': color} for lo, hi, color in steps]
+        }
+    ))
+    fig.update_layout(height=200, margin=dict(l=20, r=20, t=10, b=10))
+    return fig
+
+
 # ==========================================================
 # SECCIÓN 3: DETALLE DETALLADO
 # ==========================================================
 if st.session_state.selected_fund_isin:
     isin_detail = st.session_state.selected_fund_isin
-    fondo_doc = fondos_collection.find_one({"isin": isin_detail}, {"_id": 0})
+    fondo_doc = obtener_detalle(db, "fondos", isin_detail)
     
     if fondo_doc:
         st.markdown(f"## 🔎 {fondo_doc.get('nombre', 'Sin Nombre')}")
@@ -319,6 +307,10 @@ if st.session_state.selected_fund_isin:
                 val = dur_data.get('avg_credit_quality')
                 st.metric("Calidad Crediticia", str(val) if val else "N/A", help="Solvencia media.")
 
+            peer_txt = texto_percentiles(fondo_doc, "fondos")
+            if peer_txt:
+                st.caption(f"🏅 Frente a su categoría ({fondo_doc.get('categoria', 'N/A')}): {peer_txt}")
+
             st.info("💡 **YTM (Yield)** es el mejor predictor de retorno a largo plazo en Renta Fija.", icon="ℹ️")
 
         # ------------------------------------------------------
@@ -353,41 +345,19 @@ if st.session_state.selected_fund_isin:
             with col_g1:
                 st.caption(f"**Nivel de Sensibilidad (Duración)**: {dur_val} años")
                 if dur_val is not None:
-                    fig_dur = go.Figure(go.Indicator(
-                        mode = "gauge+number",
-                        value = dur_val,
-                        gauge = {
-                            'axis': {'range': [None, 10]}, 
-                            'bar': {'color': "#4a6fa5"},
-                            'steps': [
-                                {'range': [0, 2], 'color': "#e6f3ff"},
-                                {'range': [2, 5], 'color': "#b3d9ff"},
-                                {'range': [5, 10], 'color': "#80bfff"}
-                            ]
-                        }
-                    ))
-                    fig_dur.update_layout(height=200, margin=dict(l=20, r=20, t=10, b=10))
+                    fig_dur = figura("Fondos_Renta_Fija", gauge_figure, dur_val, 10, "#4a6fa5",
+                                     [(0, 2, "#e6f3ff"), (2, 5, "#b3d9ff"), (5, 10, "#80bfff")])
                     st.plotly_chart(fig_dur, use_container_width=True)
 
             with col_g2:
                 st.caption(f"**Nivel de Riesgo (Volatilidad {periodo_lbl})**: {vol_val}%")
                 if vol_val is not None:
-                    fig_vol = go.Figure(go.Indicator(
-                        mode = "gauge+number",
-                        value = vol_val,
-                        gauge = {
-                            'axis': {'range': [None, 15]}, 
-                            'bar': {'color': "#d9534f"},
-                            'steps': [
-                                {'range': [0, 3], 'color': "#d4edda"},
-                                {'range': [3, 7], 'color': "#fff3cd"},
-                                {'range': [7, 15], 'color': "#f8d7da"}
-                            ]
-                        }
-                    ))
-                    fig_vol.update_layout(height=200, margin=dict(l=20, r=20, t=10, b=10))
+                    fig_vol = figura("Fondos_Renta_Fija", gauge_figure, vol_val, 15, "#d9534f",
+                                     [(0, 3, "#d4edda"), (3, 7, "#fff3cd"), (7, 15, "#f8d7da")])
                     st.plotly_chart(fig_vol, use_container_width=True)
 
+            st.caption(resumen_figuras("Fondos_Renta_Fija"))
+
         # ------------------------------------------------------
         # TAB 3: RENTABILIDAD
         # ------------------------------------------------------
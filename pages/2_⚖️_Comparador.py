@@ -2,8 +2,23 @@ import streamlit as st
 import pandas as pd
 from pymongo import MongoClient
 import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
 import math
+import numpy as np
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import coincidencias
+from src.cache_datos import obtener_universo_fondos
+from src.cache_figuras import figura, resumen_figuras
+from src.motor_comparacion import (
+    MAX_INSTRUMENTOS, cargar_comparacion, nombres_columnas, normalizar_radar, tabla_comparacion, tabla_ranking,
+)
+from src.percentiles_categoria import percentiles
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -32,28 +47,12 @@ fondos_collection = db["fondos"]
 # ==========================================================
 # CARGA DATOS
 # ==========================================================
-fondos_cursor = fondos_collection.find({}, {
-    "_id": 0,
-    "isin": 1,
-    "nombre": 1,
-    "tipo_rf": 1,
-    "tramo_rf": 1,
-    "duration.avg_effective_duration": 1,
-    "sensibilidad_tipos.nivel": 1
-})
-
-df = pd.json_normalize(list(fondos_cursor))
+df = obtener_universo_fondos(db)
 
 if df.empty:
     st.warning("No hay fondos disponibles en la base de datos.")
     st.stop()
 
-# Renombrar columnas
-df.rename(columns={
-    "duration.avg_effective_duration": "duration",
-    "sensibilidad_tipos.nivel": "sensibilidad"
-}, inplace=True)
-
 # ==========================================================
 # SECCIÓN 1: FILTROS (Encima de la Tabla)
 # ==========================================================
@@ -79,10 +78,9 @@ with filter_container:
 # Aplicar Filtros
 filtered_df = df.copy()
 
-if isin_input:
-    mask_isin = filtered_df["isin"].str.contains(isin_input, case=False, na=False)
-    mask_nombre = filtered_df["nombre"].str.contains(isin_input, case=False, na=False)
-    filtered_df = filtered_df[mask_isin | mask_nombre]
+isins_busqueda = coincidencias(db, "fondos", isin_input)
+if isins_busqueda is not None:
+    filtered_df = filtered_df[filtered_df["isin"].isin(isins_busqueda)]
 
 if tipo_filter != "Todos":
     filtered_df = filtered_df[filtered_df["tipo_rf"] == tipo_filter]
@@ -95,7 +93,7 @@ if sensibilidad_filter != "Todos":
 
 
 # ==========================================================
-# GESTIÓN DE SELECCIÓN (Hasta 4)
+# GESTIÓN DE SELECCIÓN (Hasta MAX_INSTRUMENTOS)
 # ==========================================================
 if "compare_isins" not in st.session_state:
     st.session_state.compare_isins = []
@@ -124,7 +122,7 @@ page_df.insert(0, "Comparar", page_df["isin"].isin(st.session_state.compare_isin
 # SECCIÓN 2: TABLA SELECCIÓN
 # ==========================================================
 st.markdown(f"### 📋 Selecciona fondos ({total_rows} encontrados)")
-st.caption(f"Seleccionados: {len(st.session_state.compare_isins)} / 4 (Máximo)")
+st.caption(f"Seleccionados: {len(st.session_state.compare_isins)} / {MAX_INSTRUMENTOS} (Máximo)")
 
 edited_df = st.data_editor(
     page_df,
@@ -147,10 +145,10 @@ for idx, row in edited_df.iterrows():
     is_checked = row["Comparar"]
     
     if is_checked and isin not in st.session_state.compare_isins:
-        if len(st.session_state.compare_isins) < 4:
+        if len(st.session_state.compare_isins) < MAX_INSTRUMENTOS:
             st.session_state.compare_isins.append(isin)
         else:
-            st.toast("⚠️ Máximo 4 fondos permitidos.", icon="🛑")
+            st.toast(f"⚠️ Máximo {MAX_INSTRUMENTOS} fondos permitidos.", icon="🛑")
             st.rerun()
             
     elif not is_checked and isin in st.session_state.compare_isins:
@@ -182,102 +180,33 @@ selected_isins = st.session_state.compare_isins
 if len(selected_isins) > 0:
     st.header("⚖️ Comparativa Cara a Cara")
     
-    # Recuperar datos completos
-    fondos_data = list(fondos_collection.find({"isin": {"$in": selected_isins}}, {"_id": 0}))
+    # Matriz de métricas de los fondos seleccionados (una consulta)
+    comp = cargar_comparacion(db, "fondos", selected_isins)
+    n_funds = len(comp["isins"])
     
-    # Ordenar
-    f_map = {f['isin']: f for f in fondos_data}
-    ordered_funds = [f_map[isin] for isin in selected_isins if isin in f_map]
+    # Percentil de cada fondo dentro de su categoría Morningstar
+    posiciones = percentiles(db, "fondos", comp["categorias"], comp["valores"])
     
     # --- 1. TABLA MÉTRICAS CLAVE ---
     st.subheader("📊 Datos Fundamentales")
+    st.dataframe(tabla_comparacion(comp, posiciones), width="stretch", hide_index=True)
+    st.caption("P = percentil dentro de su categoría (% de fondos de la categoría con valor menor o igual).")
     
-    metrics_map = {
-        "Categoría": lambda x: x.get("categoria", "-"),
-        "Yield (TIR)": lambda x: f"{x.get('duration', {}).get('yield_to_maturity', '-')}%", 
-        "Duración (Años)": lambda x: x.get('duration', {}).get('avg_effective_duration', '-'),
-        "Calidad Crediticia": lambda x: x.get('duration', {}).get('avg_credit_quality', '-'),
-        "Volatilidad (3A)": lambda x: f"{x.get('riesgo', {}).get('for3Year', {}).get('volatility', '-')}%",
-        "Sharpe (3A)": lambda x: x.get('riesgo', {}).get('for3Year', {}).get('sharpe', '-'),
-        "Rentabilidad 1 Año": lambda x: f"{x.get('rentabilidad', {}).get('historica', {}).get('1 Year', '-')}%"
-    }
-
-    table_data = []
-    for m_label, m_func in metrics_map.items():
-        row = {"Métrica": m_label}
-        for f in ordered_funds:
-            name = f.get('nombre', 'Sin Nombre')[:20] + "..." 
-            try:
-                val = m_func(f)
-                if "None" in str(val) or val is None: val = "-"
-                row[name] = val
-            except:
-                row[name] = "-"
-        table_data.append(row)
-
-    st.dataframe(pd.DataFrame(table_data), width="stretch", hide_index=True)
+    if n_funds > 1:
+        st.markdown("##### 🏅 Ranking (1 = mejor)")
+        st.dataframe(tabla_ranking(comp), width="stretch")
 
     # --- 2. GESTIÓN DE DATOS VISUALES ---
     st.subheader("🕸️ Perfil Visual (Individual)")
     
-    def get_num(val):
-        if isinstance(val, (int, float)): return val
-        if isinstance(val, str):
-            try: return float(val.replace("%", "").replace(",", "."))
-            except: return 0
-        return 0
-
-    radar_labels = ["Yield (TIR)", "Duración", "Volatilidad", "Sharpe", "Retorno 1A"]
-    metric_extractors = {
-        "Yield (TIR)": lambda x: x.get('duration', {}).get('yield_to_maturity'),
-        "Duración": lambda x: x.get('duration', {}).get('avg_effective_duration'),
-        "Volatilidad": lambda x: x.get('riesgo', {}).get('for3Year', {}).get('volatility'),
-        "Sharpe": lambda x: x.get('riesgo', {}).get('for3Year', {}).get('sharpe'),
-        "Retorno 1A": lambda x: x.get('rentabilidad', {}).get('historica', {}).get('1 Year'),
-    }
-    
-    # Calcular Máximos GLOBALES para mantener escala consistente entre gráficos
-    max_vals = {m: 0.1 for m in radar_labels}
-    funds_metrics = {}
-
-    for f in ordered_funds:
-        isin = f['isin']
-        vals = {}
-        for m in radar_labels:
-            raw = metric_extractors[m](f)
-            val = get_num(raw)
-            vals[m] = val
-            if val > max_vals[m]: max_vals[m] = val
-        funds_metrics[isin] = vals
-
-    # --- 3. GRÁFICOS RADAR EN FILA HORIZONTAL ---
-    # Creamos N columnas según fondos seleccionados
-    cols = st.columns(len(ordered_funds))
-    
-    # Colores Alto Contraste (Azul, Rojo, Verde, Púrpura)
-    custom_colors = ['#1f77b4', '#d62728', '#2ca02c', '#9467bd']
-
-    for idx, f in enumerate(ordered_funds):
-        isin = f['isin']
-        name = f.get('nombre', 'Desc')[:15]
-        
-        # Datos normalizados
-        r_vals = []
-        hover_txt = []
-        for m in radar_labels:
-            limit = max_vals[m]
-            val = funds_metrics[isin][m]
-            norm = val / limit if limit > 0 else 0
-            r_vals.append(norm)
-            hover_txt.append(f"{m}: {val}")
-        
-        # Cerrar loop
-        r_vals.append(r_vals[0])
-        theta = radar_labels + [radar_labels[0]]
-        
-        # Color único para este gráfico
-        color = custom_colors[idx % len(custom_colors)]
-
+    radar_idx = [j for j, m in enumerate(comp["metricas"]) if m["radar"]]
+    radar_labels = [comp["metricas"][j]["etiqueta"] for j in radar_idx]
+    # Máximos GLOBALES para mantener escala consistente entre gráficos
+    radar_norm = normalizar_radar(comp["valores"][:, radar_idx])
+    radar_raw = comp["valores"][:, radar_idx]
+
+    # --- 3. GRÁFICOS RADAR (filas de 4) ---
+    def radar_figure(r_vals, theta, name, color, hover_txt):
         fig = go.Figure()
         fig.add_trace(go.Scatterpolar(
             r=r_vals,
@@ -286,7 +215,7 @@ if len(selected_isins) > 0:
             name=name,
             line=dict(color=color),
             hovertemplate="%{text}<extra></extra>", # Solo texto limpio
-            text=hover_txt + [hover_txt[0]]
+            text=hover_txt
         ))
         
         fig.update_layout(
@@ -298,31 +227,42 @@ if len(selected_isins) > 0:
             showlegend=False, # No hace falta leyenda, el título o columna ya lo dice
             title=dict(text=name, font=dict(size=14), x=0.5)
         )
-        
-        with cols[idx]:
-            st.plotly_chart(fig, use_container_width=True)
+        return fig
+
+    # Un color por fondo, tantos como haga falta
+    custom_colors = sample_colorscale("Turbo", [i / max(n_funds - 1, 1) for i in range(n_funds)]) if n_funds > 4 else ['#1f77b4', '#d62728', '#2ca02c', '#9467bd']
+    theta = radar_labels + [radar_labels[0]]
+    per_row = 4
+
+    for row_start in range(0, n_funds, per_row):
+        cols = st.columns(per_row)
+        for idx in range(row_start, min(row_start + per_row, n_funds)):
+            name = comp["nombres"][idx][:15]
+            r_vals = radar_norm[idx].tolist()
+            hover_txt = [f"{m}: {'-' if np.isnan(v) else round(v, 2)}" for m, v in zip(radar_labels, radar_raw[idx])]
+            
+            fig = figura("Comparador", radar_figure, r_vals + r_vals[:1], theta, name, custom_colors[idx], hover_txt + hover_txt[:1])
+            
+            with cols[idx - row_start]:
+                st.plotly_chart(fig, use_container_width=True)
 
+    st.caption(resumen_figuras("Comparador"))
 
     # --- 4. GRÁFICO BARRAS (Al final, ancho completo) ---
     st.divider()
     
-    returns_list = [funds_metrics[f['isin']]["Retorno 1A"] for f in ordered_funds]
-    has_returns = any([abs(r) > 0.01 for r in returns_list])
+    col_ret = next(j for j, m in enumerate(comp["metricas"]) if m["clave"] == "rent_1a")
+    col_ytm = next(j for j, m in enumerate(comp["metricas"]) if m["clave"] == "ytm")
+    has_returns = bool((abs(np.nan_to_num(comp["valores"][:, col_ret])) > 0.01).any())
     
-    target_metric = "Retorno 1A" if has_returns else "Yield (TIR)"
+    target_col = col_ret if has_returns else col_ytm
     title_chart = "📈 Rentabilidad 1 Año Comparada" if has_returns else "💰 Yield (TIR) Anual Esperada Comparada"
         
     st.markdown(f"##### {title_chart}")
     
-    bar_dict = {}
-    for f in ordered_funds:
-        name = f.get('nombre', 'Desc')[:20]
-        val = funds_metrics[f['isin']][target_metric]
-        bar_dict[name] = val
-        
-    if bar_dict:
-        st.bar_chart(pd.Series(bar_dict), color="#4a6fa5")
-        if target_metric == "Yield (TIR)":
+    if n_funds:
+        st.bar_chart(pd.Series(np.nan_to_num(comp["valores"][:, target_col]), index=nombres_columnas(comp)), color="#4a6fa5")
+        if not has_returns:
             st.caption("*Mostrando Yield (TIR) porque faltan datos de retorno histórico.*")
     else:
         st.info("Sin datos para comparar.")
@@ -1,10 +1,17 @@
 import streamlit as st
-import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime, UTC
 import math
 
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import coincidencias
+from src.cache_datos import obtener_universo_fondos
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -44,27 +51,12 @@ carteras_collection = db["carteras_fondos"]
 # ==========================================================
 # CARGA DATOS
 # ==========================================================
-fondos = list(fondos_collection.find({}, {
-    "_id": 0,
-    "isin": 1,
-    "nombre": 1,
-    "tipo_rf": 1,
-    "tramo_rf": 1,
-    "duration.avg_effective_duration": 1,
-    "sensibilidad_tipos.nivel": 1
-}))
-
-df = pd.json_normalize(fondos)
+df = obtener_universo_fondos(db)
 
 if df.empty:
     st.warning("No hay fondos disponibles.")
     st.stop()
 
-df.rename(columns={
-    "duration.avg_effective_duration": "duration",
-    "sensibilidad_tipos.nivel": "sensibilidad"
-}, inplace=True)
-
 # ==========================================================
 # FILTROS (Encima de la Tabla)
 # ==========================================================
@@ -73,7 +65,7 @@ with filter_container:
     col_f1, col_f2, col_f3, col_f4 = st.columns(4)
     
     with col_f1:
-        isin_input = st.text_input("🔍 Buscar por ISIN", placeholder="Escriba ISIN...").strip()
+        isin_input = st.text_input("🔍 Buscar por ISIN o Nombre", placeholder="Escriba ISIN o nombre...").strip()
     
     with col_f2:
         tipo_filter = st.selectbox(
@@ -95,8 +87,9 @@ with filter_container:
 
 filtered_df = df.copy()
 
-if isin_input:
-    filtered_df = filtered_df[filtered_df["isin"].str.contains(isin_input, case=False, na=False)]
+isins_busqueda = coincidencias(db, "fondos", isin_input)
+if isins_busqueda is not None:
+    filtered_df = filtered_df[filtered_df["isin"].isin(isins_busqueda)]
 
 if tipo_filter != "Todos":
     filtered_df = filtered_df[filtered_df["tipo_rf"] == tipo_filter]
@@ -9,12 +9,10 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from styles import apply_styles
-from src.scraper_tipos_interes import (
-    obtener_todos_los_bancos,
-    guardar_en_mongodb,
-    obtener_ultimo_registro,
-    BANCOS_CENTRALES,
-)
+from src import frescura
+from src.perfilado_arranque import inicio, marca
+
+inicio("Tipos_Interes")
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -268,6 +266,8 @@ def get_db():
 
 db = get_db()
 
+marca("Tipos_Interes", "configuración")
+
 # ==========================================================
 # TÍTULO
 # ==========================================================
@@ -277,11 +277,19 @@ st.title("🏦 Tipos de Interés – Bancos Centrales")
 if "ti_success_msg" in st.session_state:
     st.success(st.session_state.ti_success_msg)
     del st.session_state.ti_success_msg
+if "ti_toast" in st.session_state:
+    st.toast(st.session_state.pop("ti_toast"))
 
 # ==========================================================
 # INFO SUPERIOR
 # ==========================================================
-ultimo = obtener_ultimo_registro(db)
+snapshot = frescura.obtener_snapshot(db, "tipos")
+ultimo = snapshot["doc"]
+st.session_state.ti_frescura = {
+    "marca": snapshot["marca"],
+    "esperando": snapshot["obsoleto"] or snapshot["refrescando"],
+}
+
 if ultimo:
     fecha_ult = ultimo.get("fecha_consulta")
     if fecha_ult:
@@ -290,11 +298,30 @@ if ultimo:
         fecha_str = "Desconocida"
     num_bancos = ultimo.get('num_bancos', 0)
     consulta_id = ultimo.get('consulta_id', '-')
+    estado_str = " &nbsp;|&nbsp; 🔄 Actualizando en segundo plano…" if snapshot["refrescando"] else ""
     st.markdown(
-        f'<div class="info-bar">📅 Última actualización guardada: <strong>{fecha_str}</strong> &nbsp;|&nbsp; 🏦 {num_bancos} bancos registrados &nbsp;|&nbsp; 🆔 {consulta_id}</div>',
+        f'<div class="info-bar">📅 Última actualización guardada: <strong>{fecha_str}</strong> ({frescura.describir_edad(snapshot["edad"])}) &nbsp;|&nbsp; 🏦 {num_bancos} bancos registrados &nbsp;|&nbsp; 🆔 {consulta_id}{estado_str}</div>',
         unsafe_allow_html=True,
     )
 
+resultado_refresco = frescura.ultimo_resultado("tipos")
+if resultado_refresco and resultado_refresco["estado"] == "error" and not snapshot["refrescando"]:
+    st.warning(f"⚠️ La última actualización en segundo plano falló: {resultado_refresco['detalle']}")
+
+
+# Sondeo ligero: recarga la página cuando termina un refresco
+@st.fragment(run_every=frescura.INTERVALO_SONDEO_S)
+def vigilar_frescura():
+    estado = st.session_state.get("ti_frescura")
+    if estado and frescura.hay_datos_nuevos(db, "tipos", estado["marca"], estado["esperando"]):
+        st.session_state.ti_success_msg = "✅ Datos de bancos centrales actualizados"
+        st.rerun()
+
+
+vigilar_frescura()
+
+marca("Tipos_Interes", "snapshot")
+
 # ==========================================================
 # BOTÓN ACTUALIZAR
 # ==========================================================
@@ -303,41 +330,24 @@ with col_btn:
     actualizar = st.button("🔄 Obtener datos actualizados", type="primary")
 
 if actualizar:
-    with st.spinner("Consultando bancos centrales..."):
-        datos = obtener_todos_los_bancos()
-
-    if datos:
-        # Guardar en MongoDB
-        try:
-            resultado = guardar_en_mongodb(db, datos)
-            st.session_state.ti_success_msg = (
-                f"✅ Datos guardados correctamente\n\n"
-                f"🆔 Consulta: {resultado['consulta_id']}\n"
-                f"🏦 Bancos: {resultado['num_bancos']}\n"
-                f"📂 ID Mongo: {resultado['inserted_id']}"
-            )
-            st.session_state.datos_actuales = datos
-            st.rerun()
-        except Exception as e:
-            st.error(f"Error al guardar en MongoDB: {e}")
+    # No bloquea la sesión: el refresco corre en segundo plano y la página
+    # se recarga sola cuando los datos nuevos están en MongoDB
+    if frescura.refrescar_en_segundo_plano(db, "tipos"):
+        st.session_state.ti_toast = "🔄 Consultando bancos centrales en segundo plano…"
     else:
-        st.error("No se pudieron obtener datos.")
+        st.session_state.ti_toast = "⏳ Ya hay una actualización en curso"
+    st.rerun()
 
 # ==========================================================
 # CARGAR DATOS PARA VISUALIZACIÓN
 # ==========================================================
-datos_mostrar = None
-
-if "datos_actuales" in st.session_state:
-    datos_mostrar = st.session_state.datos_actuales
-elif ultimo and "bancos" in ultimo:
-    datos_mostrar = ultimo["bancos"]
+datos_mostrar = ultimo.get("bancos") if ultimo else None
 
 if not datos_mostrar:
     st.markdown("---")
     st.info(
-        "👆 Pulsa **'Obtener datos actualizados'** para consultar "
-        "los tipos de interés de los bancos centrales y guardarlos en la base de datos."
+        "⏳ Todavía no hay datos guardados. Se están consultando los tipos de interés "
+        "de los bancos centrales en segundo plano; la página se actualizará sola."
     )
     st.stop()
 
@@ -410,6 +420,8 @@ for i, banco in enumerate(datos_mostrar):
     )
     target_col.markdown(card_html, unsafe_allow_html=True)
 
+marca("Tipos_Interes", "tarjetas")
+
 # ==========================================================
 # TABLA COMPARATIVA
 # ==========================================================
@@ -450,6 +462,8 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+marca("Tipos_Interes", "comparativa")
+
 # ==========================================================
 # HISTORIAL DE CONSULTAS
 # ==========================================================
@@ -471,3 +485,5 @@ if historial:
     st.dataframe(df_hist, width="stretch", hide_index=True)
 else:
     st.info("No hay consultas guardadas todavía.")
+
+marca("Tipos_Interes", "historial")
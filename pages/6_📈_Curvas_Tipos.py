@@ -10,12 +10,11 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from styles import apply_styles
-from src.scraper_curvas_tipos import (
-    obtener_todas_las_curvas,
-    guardar_curvas_en_mongodb,
-    obtener_ultimo_registro_curvas,
-    PAISES,
-)
+from src.servicio_curvas import obtener_historial_curvas
+from src import frescura
+from src.perfilado_arranque import inicio, marca
+
+inicio("Curvas_Tipos")
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -246,6 +245,8 @@ def get_db():
 
 db = get_db()
 
+marca("Curvas_Tipos", "configuración")
+
 # ==========================================================
 # TÍTULO
 # ==========================================================
@@ -254,21 +255,48 @@ st.title("📈 Curvas de Tipos – Bonos Soberanos")
 if "ct_success_msg" in st.session_state:
     st.success(st.session_state.ct_success_msg)
     del st.session_state.ct_success_msg
+if "ct_toast" in st.session_state:
+    st.toast(st.session_state.pop("ct_toast"))
 
 # ==========================================================
 # INFO SUPERIOR
 # ==========================================================
-ultimo = obtener_ultimo_registro_curvas(db)
+snapshot = frescura.obtener_snapshot(db, "curvas")
+ultimo = snapshot["doc"]
+st.session_state.ct_frescura = {
+    "marca": snapshot["marca"],
+    "esperando": snapshot["obsoleto"] or snapshot["refrescando"],
+}
+
 if ultimo:
     fecha_ult = ultimo.get("fecha_consulta")
     fecha_str = fecha_ult.strftime("%d/%m/%Y %H:%M:%S UTC") if fecha_ult else "Desconocida"
     num_p = ultimo.get("num_paises", 0)
     cid = ultimo.get("consulta_id", "-")
+    estado_str = " &nbsp;|&nbsp; 🔄 Actualizando en segundo plano…" if snapshot["refrescando"] else ""
     st.markdown(
-        f'<div class="info-bar">📅 Última actualización: <strong>{fecha_str}</strong> &nbsp;|&nbsp; 🌍 {num_p} economías &nbsp;|&nbsp; 🆔 {cid}</div>',
+        f'<div class="info-bar">📅 Última actualización: <strong>{fecha_str}</strong> &nbsp;|&nbsp; ✔️ Verificado {frescura.describir_edad(snapshot["edad"])} &nbsp;|&nbsp; 🌍 {num_p} economías &nbsp;|&nbsp; 🆔 {cid}{estado_str}</div>',
         unsafe_allow_html=True,
     )
 
+resultado_refresco = frescura.ultimo_resultado("curvas")
+if resultado_refresco and resultado_refresco["estado"] == "error" and not snapshot["refrescando"]:
+    st.warning(f"⚠️ La última actualización en segundo plano falló: {resultado_refresco['detalle']}")
+
+
+# Sondeo ligero: recarga la página cuando termina un refresco
+@st.fragment(run_every=frescura.INTERVALO_SONDEO_S)
+def vigilar_frescura():
+    estado = st.session_state.get("ct_frescura")
+    if estado and frescura.hay_datos_nuevos(db, "curvas", estado["marca"], estado["esperando"]):
+        st.session_state.ct_success_msg = "✅ Curvas de tipos actualizadas"
+        st.rerun()
+
+
+vigilar_frescura()
+
+marca("Curvas_Tipos", "snapshot")
+
 # ==========================================================
 # BOTÓN ACTUALIZAR
 # ==========================================================
@@ -277,46 +305,31 @@ with col_btn:
     actualizar = st.button("🔄 Obtener datos actualizados", type="primary", key="btn_ct")
 
 if actualizar:
-    with st.spinner("Consultando rendimientos de bonos soberanos..."):
-        datos = obtener_todas_las_curvas()
-    if datos:
-        try:
-            resultado = guardar_curvas_en_mongodb(db, datos)
-            st.session_state.ct_success_msg = (
-                f"✅ Datos guardados correctamente\n\n"
-                f"🆔 Consulta: {resultado['consulta_id']}\n"
-                f"🌍 Países: {resultado['num_paises']}\n"
-                f"📂 ID Mongo: {resultado['inserted_id']}"
-            )
-            st.session_state.curvas_actuales = datos
-            st.rerun()
-        except Exception as e:
-            st.error(f"Error al guardar en MongoDB: {e}")
+    # No bloquea la sesión: el refresco corre en segundo plano y la página
+    # se recarga sola cuando los datos nuevos están en MongoDB
+    if frescura.refrescar_en_segundo_plano(db, "curvas"):
+        st.session_state.ct_toast = "🔄 Consultando rendimientos de bonos soberanos en segundo plano…"
     else:
-        st.error("No se pudieron obtener datos.")
+        st.session_state.ct_toast = "⏳ Ya hay una actualización en curso"
+    st.rerun()
 
 # ==========================================================
 # CARGAR DATOS
 # ==========================================================
-datos_mostrar = None
-if "curvas_actuales" in st.session_state:
-    datos_mostrar = st.session_state.curvas_actuales
-elif ultimo and "paises" in ultimo:
-    datos_mostrar = ultimo["paises"]
+datos_mostrar = ultimo.get("paises") if ultimo else None
 
 # DEBUG: mostrar cuántos años de previsión tienen los datos cargados
 if datos_mostrar:
     primer_pais = datos_mostrar[0]
     primer_plazo = primer_pais.get("plazos", [{}])[0] if primer_pais.get("plazos") else {}
     years_debug = list(primer_plazo.get("previsiones", {}).keys())
-    origen_debug = "session_state" if "curvas_actuales" in st.session_state else "MongoDB"
-    st.caption(f"🔍 Debug — Origen datos: `{origen_debug}` · Años previsión: `{sorted(years_debug)}`")
+    st.caption(f"🔍 Debug — Origen datos: `MongoDB` · Años previsión: `{sorted(years_debug)}`")
 
 if not datos_mostrar:
     st.markdown("---")
     st.info(
-        "👆 Pulsa **'Obtener datos actualizados'** para consultar "
-        "las curvas de tipos de bonos soberanos y guardarlas en la base de datos."
+        "⏳ Todavía no hay datos guardados. Se están consultando las curvas de tipos "
+        "de bonos soberanos en segundo plano; la página se actualizará sola."
     )
     st.stop()
 
@@ -536,6 +549,8 @@ for i, pais in enumerate(datos_mostrar):
     )
     target_col.markdown(footer_html, unsafe_allow_html=True)
 
+marca("Curvas_Tipos", "curvas")
+
 # ==========================================================
 # TABLA COMPARATIVA: 10 AÑOS
 # ==========================================================
@@ -573,22 +588,29 @@ if comp_rows:
         unsafe_allow_html=True,
     )
 
+marca("Curvas_Tipos", "comparativa")
+
 # ==========================================================
 # HISTORIAL
 # ==========================================================
 st.markdown('<div class="section-title">🕐 Historial de Consultas</div>', unsafe_allow_html=True)
 
-historial = list(db["curvas_tipos"].find().sort("_id", -1).limit(10))
+historial = obtener_historial_curvas(db, limite=10)
 if historial:
     hist_rows = []
     for doc in historial:
         f = doc.get("fecha_consulta")
+        fv = doc.get("fecha_ultima_verificacion")
         hist_rows.append({
             "Consulta ID": doc.get("consulta_id", "-"),
             "Fecha": f.strftime("%d/%m/%Y %H:%M") if f else "-",
+            "Última verificación": fv.strftime("%d/%m/%Y %H:%M") if fv else "-",
+            "Verificaciones": doc.get("num_verificaciones", 1),
             "Países": doc.get("num_paises", 0),
             "ID Mongo": str(doc.get("_id", "")),
         })
     st.dataframe(pd.DataFrame(hist_rows), width="stretch", hide_index=True)
 else:
     st.info("No hay consultas guardadas todavía.")
+
+marca("Curvas_Tipos", "historial")
@@ -3,9 +3,25 @@ import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime, UTC
 import math
+import numpy as np
 import plotly.graph_objects as go
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from styles import apply_styles
+from src.servicio_curvas import obtener_curva, obtener_movimiento_tipos
+from src.motor_rentabilidad import codificar_tramos, metricas_dataframe, rentabilidad_activos
+from src.optimizador import optimizar_cartera
+from src.covarianzas import matriz_covarianzas
+from src.clasificacion_region import filtro_region
+from src.simulacion_tipos import simular_cartera
+from src.escenarios import (
+    PESOS_DEFAULT, PERFILES, HORIZONTES, barrer_escenarios, cargar_universo,
+    get_dynamic_atrevido_weights, predecir_movimiento_tipos,
+)
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -29,7 +45,6 @@ def get_db():
 
 db = get_db()
 fondos_collection = db["fondos"]
-curvas_collection = db["curvas_tipos"]
 carteras_collection = db["carteras_fondos"]
 
 # ==========================================================
@@ -65,14 +80,14 @@ if "reset_counter" not in st.session_state:
 def reset_todo():
     """Limpia todo, parámetros y cartera."""
     st.session_state.reset_counter += 1
-    keys_to_clear = ["cartera_auto", "params_auto", "movs_auto", "pesos_auto"]
+    keys_to_clear = ["cartera_auto", "params_auto", "movs_auto", "pesos_auto", "optim_auto", "barrido_auto", "sim_auto"]
     for k in keys_to_clear:
         if k in st.session_state:
             del st.session_state[k]
 
 def borrar_propuesta():
     """Solo borra la cartera propuesta cuando cambian los parámetros."""
-    keys_to_clear = ["cartera_auto", "params_auto", "movs_auto", "pesos_auto"]
+    keys_to_clear = ["cartera_auto", "params_auto", "movs_auto", "pesos_auto", "optim_auto", "barrido_auto", "sim_auto"]
     for k in keys_to_clear:
         if k in st.session_state:
             del st.session_state[k]
@@ -101,75 +116,6 @@ TRAMO_MAP = {
 
 TRAMO_MAP_INV = {v: k for k, v in TRAMO_MAP.items()}
 
-PESOS_DEFAULT = {
-    "Conservador": {"very_short": 50, "short": 40, "intermediate": 10, "long": 0},
-    "Moderado": {"very_short": 20, "short": 30, "intermediate": 40, "long": 10}
-}
-
-def get_latest_curve(pais_code="EUR"):
-    ultimo = curvas_collection.find_one(sort=[("_id", -1)])
-    if not ultimo:
-        return None
-    
-    if pais_code == "GLOBAL":
-        all_paises = ultimo.get("paises", [])
-        if not all_paises:
-            return None
-        global_curve = {"codigo": "GLOBAL", "nombre": "Global", "emoji": "🌐", "plazos": []}
-        plazos_data = {}
-        for p in all_paises:
-            for pl in p.get("plazos", []):
-                pl_cod = pl["plazo"]
-                if pl_cod not in plazos_data:
-                    plazos_data[pl_cod] = {"actuals": [], "prevs": {}}
-                plazos_data[pl_cod]["actuals"].append(pl["rendimiento_actual"])
-                for yr, val in pl.get("previsiones", {}).items():
-                    if yr not in plazos_data[pl_cod]["prevs"]:
-                        plazos_data[pl_cod]["prevs"][yr] = []
-                    plazos_data[pl_cod]["prevs"][yr].append(val)
-        for pl_cod, data in plazos_data.items():
-            avg_actual = sum(data["actuals"]) / len(data["actuals"])
-            avg_prevs = {yr: sum(vals)/len(vals) for yr, vals in data["prevs"].items()}
-            global_curve["plazos"].append({"plazo": pl_cod, "rendimiento_actual": avg_actual, "previsiones": avg_prevs})
-        return global_curve
-
-    for p in ultimo.get("paises", []):
-        if p["codigo"] == pais_code:
-            return p
-    return None
-
-def predecir_movimiento_tipos(curve, horizon_years=3):
-    if not curve: return {}
-    ahora_anno = datetime.now().year
-    target_year = str(ahora_anno + min(horizon_years, 3)) 
-    movimientos = {}
-    for p in curve.get("plazos", []):
-        plazo = p["plazo"]
-        actual = p["rendimiento_actual"]
-        proyectado = p.get("previsiones", {}).get(target_year)
-        if proyectado is not None:
-            movimientos[plazo] = {"actual": actual, "proyectado": proyectado, "delta": actual - proyectado}
-    mapeo = {
-        "very_short": movimientos.get("3M") or movimientos.get("6M"),
-        "short": movimientos.get("2Y") or movimientos.get("1Y"),
-        "intermediate": movimientos.get("5Y"),
-        "long": movimientos.get("10Y") or movimientos.get("30Y")
-    }
-    return {k: v for k, v in mapeo.items() if v}
-
-def get_dynamic_atrevido_weights(movimientos):
-    duraciones_standard = {"very_short": 0.2, "short": 2.0, "intermediate": 4.0, "long": 10.0}
-    scores = {}
-    for tramo, m in movimientos.items():
-        dur = duraciones_standard.get(tramo, 1.0)
-        scores[tramo] = m["actual"] + (m["delta"] * dur)
-    sorted_tramos = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    pesos = {t: 0 for t in ["very_short", "short", "intermediate", "long"]}
-    pesos[sorted_tramos[0][0]] = 50
-    if len(sorted_tramos) > 1: pesos[sorted_tramos[1][0]] = 30
-    if len(sorted_tramos) > 2: pesos[sorted_tramos[2][0]] = 20
-    return pesos
-
 # ==========================================================
 # INTERFAZ DE USUARIO
 # ==========================================================
@@ -212,7 +158,7 @@ with st.container():
         
         # Calcular defaults según perfil
         if perfil == "Atrevido":
-            curva_temp = get_latest_curve(region)
+            curva_temp = obtener_curva(db, region)
             movs_temp = predecir_movimiento_tipos(curva_temp, horizonte)
             defaults = get_dynamic_atrevido_weights(movs_temp)
         else:
@@ -237,6 +183,15 @@ with st.container():
             "long": p_l / 100
         }
 
+    # --- SECCIÓN: RESTRICCIONES DEL OPTIMIZADOR ---
+    with st.expander("🎯 Restricciones del Optimizador (Opcional)", expanded=False):
+        st.info("El optimizador maximiza la rentabilidad esperada ajustada por riesgo sobre todos los fondos filtrados. 0 = sin límite.")
+        cr1, cr2, cr3, cr4 = st.columns(4)
+        with cr1: vol_max = st.number_input("Volatilidad Máx. (%)", 0.0, 20.0, 0.0, 0.5, key=f"vol_max_auto{suffix}", on_change=borrar_propuesta)
+        with cr2: dur_min = st.number_input("Duración Mín. (años)", 0.0, 20.0, 0.0, 0.5, key=f"dur_min_auto{suffix}", on_change=borrar_propuesta)
+        with cr3: dur_max = st.number_input("Duración Máx. (años)", 0.0, 20.0, 0.0, 0.5, key=f"dur_max_auto{suffix}", on_change=borrar_propuesta)
+        with cr4: peso_max = st.number_input("Peso Máx. por Fondo (%)", 5, 100, 25, 5, key=f"peso_max_auto{suffix}", on_change=borrar_propuesta)
+
 # --- PROCESAMIENTO ---
 if generar:
     if total_p != 100:
@@ -245,7 +200,7 @@ if generar:
 
     with st.spinner("🔍 Consultando base de datos y optimizando cartera..."):
         # 1. Obtener Curva
-        curva = get_latest_curve(region)
+        curva = obtener_curva(db, region)
         if not curva:
             st.error(f"No hay curvas para {region}.")
             st.stop()
@@ -255,16 +210,7 @@ if generar:
         
         # 2. Obtener Fondos
         tramos_interes = [t for t, p in pesos.items() if p > 0]
-        query = {"tramo_rf": {"$in": tramos_interes}}
-        
-        if region == "EUR":
-            query["categoria"] = {"$regex": "EUR|Euro", "$options": "i"}
-        elif region == "US":
-            query["categoria"] = {"$regex": "USD|U.S.|US ", "$options": "i"}
-        elif region == "JP":
-            query["categoria"] = {"$regex": "JPY|Yen|Japan", "$options": "i"}
-        elif region == "CN":
-            query["categoria"] = {"$regex": "CNY|China", "$options": "i"}
+        query = {"tramo_rf": {"$in": tramos_interes}, **filtro_region(region)}
         
         fondos_raw = list(fondos_collection.find(query, {
             "_id": 0, "isin": 1, "nombre": 1, "tramo_rf": 1,
@@ -297,33 +243,46 @@ if generar:
         df_fondos["vol"] = df_fondos["vol"].fillna(0.0)
         df_fondos["rent1y"] = df_fondos["rent1y"].fillna(0.0)
         df_fondos["duracion"] = df_fondos["duracion"].fillna(0.0)
-        
-        # 3. SELECCIÓN AUTOMÁTICA
-        seleccionados = []
-        rent_col = "ytm" if "Proyectada" in criterio_base else "rent1y"
 
-        for tramo in tramos_interes:
-            peso_tramo = pesos[tramo]
-            subset = df_fondos[df_fondos["tramo_rf"] == tramo].copy()
-            if subset.empty: continue
+        # Movimiento esperado de tipos a la duración de cada fondo (curva interpolada)
+        df_fondos["delta_tipos"] = obtener_movimiento_tipos(db, region, df_fondos["duracion"].to_numpy(), horizonte)
 
-            subset["eficiencia"] = subset[rent_col] / subset["vol"].replace(0, 0.05)
-            subset = subset.sort_values(by=["eficiencia", rent_col], ascending=[False, False])
-            
-            top_tramo = subset.head(m_fondos).copy()
-            if not top_tramo.empty:
-                top_tramo["peso"] = peso_tramo / len(top_tramo)
-                seleccionados.append(top_tramo)
-                
-        if not seleccionados:
-            st.error("No se pudo construir la selección.")
+        # Covarianzas con los NAV guardados (correlaciones reales entre fondos)
+        cov = matriz_covarianzas(db, df_fondos["isin"].tolist(), vol_respaldo=df_fondos["vol"].to_numpy())
+        covarianza = cov["covarianza"] if cov["con_historico"].any() else None
+        
+        # 3. OPTIMIZACIÓN SOBRE TODO EL UNIVERSO FILTRADO
+        if "Proyectada" in criterio_base:
+            rent_esperada = rentabilidad_activos(df_fondos["ytm"], df_fondos["duracion"], df_fondos["delta_tipos"], horizonte)
+        else:
+            rent_esperada = df_fondos["rent1y"].to_numpy()
+
+        try:
+            resultado = optimizar_cartera(
+                rent_esperada, df_fondos["vol"], df_fondos["duracion"],
+                codificar_tramos(df_fondos["tramo_rf"]), pesos,
+                max_activos=n_fondos, max_por_tramo=m_fondos,
+                vol_max=vol_max or None, dur_min=dur_min or None, dur_max=dur_max or None,
+                peso_max=peso_max / 100, covarianza=covarianza,
+            )
+        except ValueError as e:
+            st.error(f"No se pudo construir la selección: {e}")
             st.stop()
-            
-        df_final = pd.concat(seleccionados)
-        if len(df_final) > n_fondos:
-            df_final = df_final.head(n_fondos)
-            df_final["peso"] = df_final["peso"] / df_final["peso"].sum()
-            
+
+        df_final = df_fondos.iloc[resultado["indices"]].copy()
+        df_final["peso"] = resultado["pesos"][resultado["indices"]]
+        df_final["orden_tramo"] = codificar_tramos(df_final["tramo_rf"])
+        df_final = df_final.sort_values(by=["orden_tramo", "peso"], ascending=[True, False]).drop(columns="orden_tramo")
+
+        st.session_state.optim_auto = {
+            "covarianza": covarianza[np.ix_(df_final.index, df_final.index)] if covarianza is not None else None,
+            "con_historico": int(cov["con_historico"].sum()),
+            "semanas": cov["semanas"],
+            "contraccion": cov["contraccion"],
+            "n_candidatos": resultado["n_candidatos"],
+            "tiempos_ms": resultado["tiempos_ms"],
+            "violaciones": resultado["violaciones"],
+        }
         st.session_state.cartera_auto = df_final
         st.session_state.params_auto = {"perfil": perfil, "horizonte": horizonte, "region": region}
         st.session_state.movs_auto = movs
@@ -337,6 +296,17 @@ if "cartera_auto" in st.session_state:
 
     st.markdown("---")
     st.subheader("📋 Propuesta de Selección")
+    optim = st.session_state.get("optim_auto")
+    if optim:
+        st.caption(f"⚙️ Optimizador: {optim['n_candidatos']} fondos candidatos, "
+                   f"{optim['tiempos_ms']['total']:.0f} ms "
+                   f"(relajado {optim['tiempos_ms']['relajado']:.0f} ms, cardinalidad {optim['tiempos_ms']['cardinalidad']:.0f} ms)")
+        if optim["covarianza"] is not None:
+            st.caption(f"🔗 Volatilidad con correlaciones: {optim['con_historico']}/{optim['n_candidatos']} fondos con histórico NAV, "
+                       f"{optim['semanas']} semanas, contracción Ledoit-Wolf {optim['contraccion']:.2f}")
+        incumplidas = [k for k, v in optim["violaciones"].items() if v > 0.01]
+        if incumplidas:
+            st.warning(f"⚠️ No se pudieron cumplir del todo las restricciones: {', '.join(incumplidas)}")
     
     for tramo_db in df_final["tramo_rf"].unique():
         st.markdown(f'<div class="category-header">📦 {TRAMO_MAP_INV.get(tramo_db)} ({df_final[df_final["tramo_rf"] == tramo_db]["peso"].sum()*100:.1f}%)</div>', unsafe_allow_html=True)
@@ -348,29 +318,61 @@ if "cartera_auto" in st.session_state:
 
     # Métricas Consolidadas
     st.subheader("📊 Métricas Consolidadas")
-    total_ytm = (df_final["ytm"] * df_final["peso"]).sum()
-    total_vol = (df_final["vol"] * df_final["peso"]).sum()
-    total_dur = (df_final["duracion"] * df_final["peso"]).sum()
-    
-    rent_proyectada = 0
-    for _, row in df_final.iterrows():
-        t = row["tramo_rf"]
-        d_mov = movs.get(t, {"delta": 0})["delta"]
-        rent_proyectada += row["peso"] * (row["ytm"] + (d_mov * row["duracion"]) / horizonte)
+    cov_final = (st.session_state.get("optim_auto") or {}).get("covarianza")
+    metricas = metricas_dataframe(df_final, horizonte, covarianza=cov_final)
+    total_ytm, total_vol, total_dur = metricas["ytm"], metricas["vol"], metricas["dur"]
+    rent_proyectada = metricas["rent"]
         
     c1, c2, c3, c4, c5 = st.columns(5)
     with c1: st.markdown(f'<div class="metric-card"><h4>Rent. Esperada</h4><h2>{rent_proyectada:.2f}%</h2></div>', unsafe_allow_html=True)
     with c2: st.markdown(f'<div class="metric-card"><h4>YTM Medio</h4><h2>{total_ytm:.2f}%</h2></div>', unsafe_allow_html=True)
-    with c3: st.markdown(f'<div class="metric-card"><h4>Volatilidad Media</h4><h2>{total_vol:.2f}%</h2></div>', unsafe_allow_html=True)
+    with c3: st.markdown(f'<div class="metric-card"><h4>{"Volatilidad Cartera" if cov_final is not None else "Volatilidad Media"}</h4><h2>{total_vol:.2f}%</h2></div>', unsafe_allow_html=True)
     with c4: st.markdown(f'<div class="metric-card"><h4>Duración Media</h4><h2>{total_dur:.2f} yr</h2></div>', unsafe_allow_html=True)
     with c5:
-        be = total_ytm / total_dur if total_dur > 0.1 else 9.9
-        st.markdown(f'<div class="metric-card"><h4>Break-even Tipos</h4><h2>{be:.2f}%</h2></div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="metric-card"><h4>Break-even Tipos</h4><h2>{metricas["break_even"]:.2f}%</h2></div>', unsafe_allow_html=True)
 
     fig = go.Figure(data=[go.Pie(labels=df_final["nombre"], values=df_final["peso"], hole=.4)])
     fig.update_layout(title_text="Distribución de la Cartera", height=450)
     st.plotly_chart(fig, use_container_width=True)
 
+    # Simulación Monte Carlo
+    with st.expander("🎲 Simulación Monte Carlo de Tipos", expanded="sim_auto" in st.session_state):
+        st.caption("Simula caminos correlacionados de la curva (factores PCA con reversión a la media hacia las previsiones) y revaloriza cada fondo por duración y convexidad.")
+        cs1, cs2 = st.columns([3, 1])
+        with cs1: n_caminos = st.select_slider("Nº de caminos", [1000, 2000, 5000, 10000, 20000], value=5000, key=f"caminos_auto{suffix}")
+        with cs2:
+            st.write("")
+            if st.button("▶️ Simular", use_container_width=True, key="btn_sim_auto"):
+                st.session_state.sim_auto = simular_cartera(
+                    db, region, df_final["peso"], df_final["ytm"], df_final["duracion"], horizonte, n_caminos=n_caminos,
+                )
+
+        sim = st.session_state.get("sim_auto")
+        if sim:
+            origen = f"{sim['modelo']['semanas']} semanas de histórico" if sim["modelo"]["origen"] == "historico" else "estructura por defecto (histórico insuficiente)"
+            st.caption(f"⏱️ {sim['n_caminos']} caminos en {sim['tiempo_ms']:.0f} ms · {sim['modelo']['factores']} factores, {origen}")
+            s1, s2, s3, s4 = st.columns(4)
+            with s1: st.markdown(f'<div class="metric-card"><h4>Rent. Media Anual</h4><h2>{sim["media"]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s2: st.markdown(f'<div class="metric-card"><h4>Percentil 5 Anual</h4><h2>{sim["percentiles"][5]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s3: st.markdown(f'<div class="metric-card"><h4>VaR {sim["nivel_var"]:.0%} ({horizonte}A)</h4><h2>{sim["var"]:.2f}%</h2></div>', unsafe_allow_html=True)
+            with s4: st.markdown(f'<div class="metric-card"><h4>Prob. Pérdida</h4><h2>{sim["prob_perdida"]*100:.1f}%</h2></div>', unsafe_allow_html=True)
+
+            fig_h = go.Figure(go.Histogram(x=sim["rent_anual"], nbinsx=60, marker_color="#4e79a7"))
+            fig_h.add_vline(x=rent_proyectada, line_dash="dash", annotation_text="Proyección")
+            fig_h.add_vline(x=sim["percentiles"][5], line_dash="dot", line_color="red", annotation_text="P5")
+            fig_h.update_layout(title_text="Distribución de la rentabilidad anualizada", xaxis_title="Rentabilidad anual (%)", height=350, showlegend=False)
+            st.plotly_chart(fig_h, use_container_width=True)
+
+            abanico = sim["abanico"]
+            fig_a = go.Figure()
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[95], line=dict(width=0), showlegend=False))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[5], fill="tonexty", line=dict(width=0), name="P5–P95"))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[75], line=dict(width=0), showlegend=False))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[25], fill="tonexty", line=dict(width=0), name="P25–P75"))
+            fig_a.add_trace(go.Scatter(x=abanico["tiempos"], y=abanico[50], name="Mediana"))
+            fig_a.update_layout(title_text="Rentabilidad acumulada a lo largo del horizonte", xaxis_title="Años", yaxis_title="Acumulada (%)", height=350)
+            st.plotly_chart(fig_a, use_container_width=True)
+
     st.divider()
     col_acc1, col_acc2, col_acc3 = st.columns([4, 2, 4])
     with col_acc2:
@@ -380,7 +382,7 @@ if "cartera_auto" in st.session_state:
             doc = {
                 "cartera_id": cartera_id, "fecha_creacion": datetime.now(UTC), "origen": "A",
                 "perfil": perfil, "region": region, "horizonte": horizonte,
-                "metricas": {"rent": rent_proyectada, "ytm": total_ytm, "vol": total_vol, "dur": total_dur},
+                "metricas": {"rent": rent_proyectada, "ytm": total_ytm, "vol": total_vol, "vol_media": metricas["vol_media"], "dur": total_dur},
                 "fondos": fondos_lista
             }
             try:
@@ -392,3 +394,102 @@ if "cartera_auto" in st.session_state:
             except Exception as e: st.error(f"Error: {e}")
 else:
     st.info("Configura los parámetros y pulsa 'Generar Propuesta' para que el algoritmo trabaje por ti.")
+
+# --- SECCIÓN: BARRIDO DE ESCENARIOS ---
+st.markdown("---")
+with st.expander("🧪 Barrido de Escenarios (Perfiles × Horizontes × Regiones)", expanded="barrido_auto" in st.session_state):
+    st.caption("Calcula de una vez la propuesta de cada combinación con los mismos N, M, criterio y restricciones de arriba, para comparar sin ir clic a clic. "
+               "El barrido optimiza con Σ diagonal (unos milisegundos por escenario; la volatilidad de la tabla sí usa las correlaciones NAV). "
+               "La combinación que elijas se puede recalcular con Σ completa, como 'Generar Propuesta' (décimas de segundo por escenario).")
+    cb1, cb2, cb3 = st.columns(3)
+    with cb1: perfiles_barrido = st.multiselect("Perfiles", list(PERFILES), default=list(PERFILES), key=f"perfiles_barrido{suffix}")
+    with cb2: horizontes_barrido = st.multiselect("Horizontes (Años)", list(HORIZONTES), default=list(HORIZONTES), key=f"horizontes_barrido{suffix}")
+    with cb3: regiones_barrido = st.multiselect("Regiones", list(REGION_MAP.keys()), default=list(REGION_MAP.keys()), key=f"regiones_barrido{suffix}")
+
+    if st.button("▶️ Ejecutar Barrido", use_container_width=True):
+        with st.spinner("🧮 Calculando todas las combinaciones..."):
+            inicio = datetime.now()
+            universo = cargar_universo(db)
+            if universo.empty:
+                st.warning("No hay fondos de renta fija con tramo asignado.")
+            else:
+                restricciones = {"vol_max": vol_max or None, "dur_min": dur_min or None,
+                                 "dur_max": dur_max or None, "peso_max": peso_max / 100}
+                opciones_barrido = {"n_fondos": n_fondos, "m_fondos": m_fondos,
+                                    "criterio_ytm": "Proyectada" in criterio_base, "restricciones": restricciones}
+                tabla, _ = barrer_escenarios(
+                    db, universo,
+                    perfiles=perfiles_barrido, horizontes=sorted(horizontes_barrido),
+                    regiones=[REGION_MAP[r] for r in regiones_barrido],
+                    **opciones_barrido,
+                )
+                st.session_state.barrido_auto = {
+                    "tabla": tabla, "n_universo": len(universo),
+                    "tiempo_ms": (datetime.now() - inicio).total_seconds() * 1000,
+                    "universo": universo, "opciones": opciones_barrido,
+                }
+
+    barrido = st.session_state.get("barrido_auto")
+    if barrido:
+        tabla = barrido["tabla"]
+        media_ms = tabla["tiempo_ms"].mean() if not tabla.empty else 0.0
+        st.caption(f"⏱️ {len(tabla)} escenarios sobre {barrido['n_universo']} fondos en {barrido['tiempo_ms']:.0f} ms "
+                   f"(optimización con Σ diagonal: {media_ms:.0f} ms por escenario)")
+        if tabla.empty:
+            st.info("Ninguna combinación tiene fondos suficientes para construir una propuesta.")
+        else:
+            viz = tabla.rename(columns={
+                "perfil": "Perfil", "horizonte": "Horizonte", "region": "Región", "n_fondos": "Nº Fondos",
+                "rent": "Rent. Esperada (%)", "ytm": "YTM (%)", "vol": "Volatilidad (%)",
+                "dur": "Duración (yr)", "break_even": "Break-even (%)",
+                **{f"peso_{t}": f"{n} (%)" for n, t in TRAMO_MAP.items()},
+            }).drop(columns=["tiempo_ms"])
+            for n in TRAMO_MAP:
+                viz[f"{n} (%)"] = viz[f"{n} (%)"] * 100
+            st.dataframe(viz.style.format(precision=2), use_container_width=True, hide_index=True)
+
+            fig_b = go.Figure()
+            for perfil_b, grupo in tabla.groupby("perfil"):
+                fig_b.add_trace(go.Scatter(
+                    x=grupo["vol"], y=grupo["rent"], mode="markers", name=perfil_b,
+                    text=[f"{r} · {h}A" for r, h in zip(grupo["region"], grupo["horizonte"])],
+                    hovertemplate="%{text}<br>Vol %{x:.2f}% · Rent %{y:.2f}%<extra></extra>",
+                ))
+            fig_b.update_layout(title_text="Rentabilidad esperada vs volatilidad por escenario",
+                                xaxis_title="Volatilidad (%)", yaxis_title="Rent. Esperada (%)", height=450)
+            st.plotly_chart(fig_b, use_container_width=True)
+
+            # Solo la combinación elegida se vuelve a optimizar con Σ completa
+            claves_b = list(zip(tabla["perfil"], tabla["horizonte"], tabla["region"]))
+            cr1, cr2 = st.columns([3, 1])
+            with cr1:
+                clave_b = st.selectbox("Escenario a recalcular con Σ completa", claves_b,
+                                       format_func=lambda c: f"{c[0]} · {c[1]}A · {c[2]}", key=f"escenario_barrido{suffix}")
+            with cr2:
+                st.write("")
+                recalcular = st.button("🎯 Recalcular", use_container_width=True)
+            if recalcular:
+                with st.spinner("🧮 Optimizando con covarianzas completas..."):
+                    inicio = datetime.now()
+                    tabla_c, propuestas_c = barrer_escenarios(
+                        db, barrido["universo"], perfiles=[clave_b[0]], horizontes=[clave_b[1]], regiones=[clave_b[2]],
+                        optimizar_con_covarianzas=True, **barrido["opciones"],
+                    )
+                    barrido["completa"] = {
+                        "clave": clave_b, "tabla": tabla_c, "cartera": propuestas_c.get(clave_b),
+                        "tiempo_ms": (datetime.now() - inicio).total_seconds() * 1000,
+                    }
+
+            completa = barrido.get("completa")
+            if completa and completa["cartera"] is not None:
+                perfil_c, horizonte_c, region_c = completa["clave"]
+                fila_d = tabla[(tabla["perfil"] == perfil_c) & (tabla["horizonte"] == horizonte_c) & (tabla["region"] == region_c)]
+                comparacion = pd.concat([fila_d.assign(modelo="Σ diagonal"), completa["tabla"].assign(modelo="Σ completa")])
+                st.caption(f"🔗 {perfil_c} · {horizonte_c}A · {region_c} con Σ completa en {completa['tiempo_ms']:.0f} ms")
+                st.dataframe(comparacion[["modelo", "n_fondos", "rent", "ytm", "vol", "dur", "break_even"]].rename(columns={
+                    "modelo": "Modelo", "n_fondos": "Nº Fondos", "rent": "Rent. Esperada (%)", "ytm": "YTM (%)",
+                    "vol": "Volatilidad (%)", "dur": "Duración (yr)", "break_even": "Break-even (%)",
+                }).style.format(precision=2), use_container_width=True, hide_index=True)
+                viz_c = completa["cartera"][["isin", "nombre", "tramo_rf", "ytm", "vol", "duracion", "peso"]].copy()
+                viz_c["peso"] = viz_c["peso"].map(lambda x: f"{x*100:.2f}%")
+                st.table(viz_c)
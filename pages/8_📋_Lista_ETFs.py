@@ -1,9 +1,19 @@
 import streamlit as st
 import pandas as pd
 from pymongo import MongoClient
-import math
 import plotly.graph_objects as go
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import coincidencias
+from src.cache_figuras import figura, resumen_figuras
+from src.detalle_activos import obtener_detalle
+from src.percentiles_categoria import texto_percentiles
+from src.consultas_listado import RANGOS_RENTABILIDAD, TODOS, construir_consulta, obtener_pagina, opciones_filtro
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -29,33 +39,6 @@ def get_db():
 db = get_db()
 etfs_collection = db["etfs"]
 
-# ==========================================================
-# CARGA DATOS (Resumen para listado)
-# ==========================================================
-etfs_cursor = etfs_collection.find({}, {
-    "_id": 0,
-    "isin": 1,
-    "nombreEtf": 1,
-    "tipoEtf": 1,
-    "riesgo": 1,
-    "ter": 1,
-    "yield_1y": 1,
-    "calidad_crediticia": 1
-})
-
-df = pd.DataFrame(list(etfs_cursor))
-
-if df.empty:
-    st.warning("No hay ETFs disponibles en la base de datos.")
-    st.stop()
-
-# Eliminar duplicados por ISIN (Limpieza de seguridad)
-df = df.drop_duplicates(subset=["isin"]).reset_index(drop=True)
-
-# Limpieza de datos básicos
-df["ter"] = df["ter"].fillna("N/A")
-df["tipoEtf"] = df["tipoEtf"].fillna("Sin Categoría")
-
 # ==========================================================
 # SECCIÓN 1: FILTROS (Encima de la Tabla)
 # ==========================================================
@@ -67,52 +50,21 @@ with filter_container:
         isin_input = st.text_input("🔍 Buscar por ISIN o Nombre", placeholder="Escriba ISIN o nombre...").strip()
     
     with col_f2:
-        tipo_options = ["Todos"] + sorted([t for t in df["tipoEtf"].dropna().unique().tolist() if t])
+        tipo_options = [TODOS] + opciones_filtro(db, "etfs", "tipo")
         tipo_filter = st.selectbox("📊 Tipo ETF", tipo_options)
     
     with col_f3:
         # Rentabilidad Filter (Categorized yield_1y)
-        def parse_yield(y):
-            if not y or y == "N/A": return 0.0
-            try: return float(str(y).name.replace("%", "").replace("+", ""))
-            except: 
-                try: return float(str(y).replace("%", "").replace("+", ""))
-                except: return 0.0
-
-        df["rent_val"] = df["yield_1y"].apply(parse_yield)
-        rent_options = ["Todos", "Sinceramente Positiva (>0%)", "Alta (>3%)", "Muy Alta (>5%)", "Negativa (<0%)"]
+        rent_options = [TODOS] + list(RANGOS_RENTABILIDAD)
         rent_filter = st.selectbox("📈 Rentabilidad (1A)", rent_options)
     
     with col_f4:
         # Riesgo Filter (1/7, 2/7, etc)
-        riesgo_options = ["Todos"] + sorted([r for r in df["riesgo"].dropna().unique().tolist() if r])
+        riesgo_options = [TODOS] + opciones_filtro(db, "etfs", "riesgo")
         riesgo_filter = st.selectbox("⚠️ Riesgo", riesgo_options)
 
-# Aplicar Filtros
-filtered_df = df.copy()
-
-if isin_input:
-    mask_isin = filtered_df["isin"].str.contains(isin_input, case=False, na=False)
-    mask_nombre = filtered_df["nombreEtf"].str.contains(isin_input, case=False, na=False)
-    filtered_df = filtered_df[mask_isin | mask_nombre]
-
-if tipo_filter != "Todos":
-    filtered_df = filtered_df[filtered_df["tipoEtf"] == tipo_filter]
-
-if rent_filter != "Todos":
-    if rent_filter == "Sinceramente Positiva (>0%)":
-        filtered_df = filtered_df[filtered_df["rent_val"] > 0]
-    elif rent_filter == "Alta (>3%)":
-        filtered_df = filtered_df[filtered_df["rent_val"] > 3]
-    elif rent_filter == "Muy Alta (>5%)":
-        filtered_df = filtered_df[filtered_df["rent_val"] > 5]
-    elif rent_filter == "Negativa (<0%)":
-        filtered_df = filtered_df[filtered_df["rent_val"] < 0]
-
-if riesgo_filter != "Todos":
-    filtered_df = filtered_df[filtered_df["riesgo"] == riesgo_filter]
-
-st.markdown(f"### 📋 Listado de ETFs ({len(filtered_df)} encontrados)")
+# Consulta en servidor (solo viajan las filas de la página)
+consulta = construir_consulta("etfs", coincidencias(db, "etfs", isin_input), rentabilidad=rent_filter, tipo=tipo_filter, riesgo=riesgo_filter)
 
 # ==========================================================
 # GESTIÓN DE PAGINACIÓN Y SELECCIÓN (ÚNICA)
@@ -127,17 +79,21 @@ if "rows_per_page_etfs" not in st.session_state:
     st.session_state.rows_per_page_etfs = 10
 
 rows_per_page = st.session_state.rows_per_page_etfs
-total_rows = len(filtered_df)
-total_pages = max(1, math.ceil(total_rows / rows_per_page))
+pagina = obtener_pagina(db, "etfs", consulta, st.session_state.page_number_etfs, rows_per_page)
+total_rows = pagina["total"]
+total_pages = pagina["paginas"]
+st.session_state.page_number_etfs = current_page = pagina["pagina"]
 
-if st.session_state.page_number_etfs > total_pages:
-    st.session_state.page_number_etfs = 1
+st.markdown(f"### 📋 Listado de ETFs ({total_rows} encontrados)")
 
-current_page = st.session_state.page_number_etfs
-start_idx = (current_page - 1) * rows_per_page
-end_idx = start_idx + rows_per_page
+if total_rows == 0 and consulta == {}:
+    st.warning("No hay ETFs disponibles en la base de datos.")
+    st.stop()
 
-page_df = filtered_df.iloc[start_idx:end_idx].copy()
+# Limpieza de datos básicos
+page_df = pagina["df"]
+page_df["ter"] = page_df["ter"].fillna("N/A")
+page_df["tipoEtf"] = page_df["tipoEtf"].fillna("Sin Categoría")
 page_df.insert(0, "Seleccionar", page_df["isin"] == st.session_state.selected_etf_isin)
 
 # ==========================================================
@@ -263,12 +219,29 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# ==========================================================
+# GRÁFICOS (figuras cacheadas por valores de entrada)
+# ==========================================================
+def gauge_figure(value, axis_max, bar_color, steps):
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = value,
+        gauge = {
+            'axis': {'range': [0, axis_max]}, 
+            'bar': {'color': bar_color},
+            'steps': [{'range': [lo, hi], 'color': color} for lo, hi, color in steps]
+        }
+    ))
+    fig.update_layout(height=220, margin=dict(l=20, r=20, t=30, b=20), paper_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+
 # ==========================================================
 # SECCIÓN 3: DETALLE ETFS
 # ==========================================================
 if st.session_state.selected_etf_isin:
     isin_detail = st.session_state.selected_etf_isin
-    etf_doc = etfs_collection.find_one({"isin": isin_detail}, {"_id": 0})
+    etf_doc = obtener_detalle(db, "etfs", isin_detail)
     
     if etf_doc:
         st.markdown(f"## 🔎 {etf_doc.get('nombreEtf', 'Sin Nombre')}")
@@ -296,6 +269,10 @@ if st.session_state.selected_etf_isin:
                 val = etf_doc.get('calidad_crediticia')
                 st.metric("Calidad Crediticia", str(val) if val else "N/A")
 
+            peer_txt = texto_percentiles(etf_doc, "etfs")
+            if peer_txt:
+                st.caption(f"🏅 Frente a su tipo ({etf_doc.get('tipoEtf', 'N/A')}): {peer_txt}")
+
             st.markdown("---")
             c4, c5 = st.columns(2)
             with c4:
@@ -330,42 +307,20 @@ if st.session_state.selected_etf_isin:
 
             with col_g1:
                 st.caption(f"**Nivel de Riesgo (Volatilidad)**: {vol_raw}")
-                fig_vol = go.Figure(go.Indicator(
-                    mode = "gauge+number",
-                    value = vol_val,
-                    gauge = {
-                        'axis': {'range': [0, 20]}, 
-                        'bar': {'color': "#d9534f"},
-                        'steps': [
-                            {'range': [0, 3], 'color': "#d4edda"},
-                            {'range': [3, 8], 'color': "#fff3cd"},
-                            {'range': [8, 20], 'color': "#f8d7da"}
-                        ]
-                    }
-                ))
-                fig_vol.update_layout(height=220, margin=dict(l=20, r=20, t=30, b=20), paper_bgcolor="rgba(0,0,0,0)")
+                fig_vol = figura("Lista_ETFs", gauge_figure, vol_val, 20, "#d9534f",
+                                 [(0, 3, "#d4edda"), (3, 8, "#fff3cd"), (8, 20, "#f8d7da")])
                 st.plotly_chart(fig_vol, width="stretch")
 
             with col_g2:
                 # Duración en gauge
                 dur_val = etf_doc.get('duracion_efectiva', 0)
                 st.caption(f"**Sensibilidad Tipos (Duración)**: {dur_val} años")
-                fig_dur = go.Figure(go.Indicator(
-                    mode = "gauge+number",
-                    value = dur_val or 0,
-                    gauge = {
-                        'axis': {'range': [0, 10]}, 
-                        'bar': {'color': "#4a6fa5"},
-                        'steps': [
-                            {'range': [0, 2], 'color': "#e6f3ff"},
-                            {'range': [2, 5], 'color': "#b3d9ff"},
-                            {'range': [5, 10], 'color': "#80bfff"}
-                        ]
-                    }
-                ))
-                fig_dur.update_layout(height=220, margin=dict(l=20, r=20, t=30, b=20), paper_bgcolor="rgba(0,0,0,0)")
+                fig_dur = figura("Lista_ETFs", gauge_figure, dur_val or 0, 10, "#4a6fa5",
+                                 [(0, 2, "#e6f3ff"), (2, 5, "#b3d9ff"), (5, 10, "#80bfff")])
                 st.plotly_chart(fig_dur, width="stretch")
 
+            st.caption(resumen_figuras("Lista_ETFs"))
+
         with tab_rent:
             st.markdown("##### 📅 Rendimientos Históricos")
             
@@ -388,9 +343,9 @@ if st.session_state.selected_etf_isin:
                 except: return 0
             
             bar_data = {
-                "1A": clean_pct(etfs_collection.find_one({"isin": isin_detail}).get('yield_1y')),
-                "3A": clean_pct(etfs_collection.find_one({"isin": isin_detail}).get('yield_3y')),
-                "5A": clean_pct(etfs_collection.find_one({"isin": isin_detail}).get('yield_5y'))
+                "1A": clean_pct(etf_doc.get('yield_1y')),
+                "3A": clean_pct(etf_doc.get('yield_3y')),
+                "5A": clean_pct(etf_doc.get('yield_5y'))
             }
             st.bar_chart(pd.Series(bar_data), color="#4a6fa5")
 
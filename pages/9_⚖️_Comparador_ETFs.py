@@ -2,8 +2,22 @@ import streamlit as st
 import pandas as pd
 from pymongo import MongoClient
 import plotly.graph_objects as go
+from plotly.colors import sample_colorscale
+import numpy as np
 import math
+import sys
+import os
+
+# Añadir src al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
 from styles import apply_styles
+from src.buscador import coincidencias
+from src.cache_figuras import figura, resumen_figuras
+from src.motor_comparacion import (
+    MAX_INSTRUMENTOS, cargar_comparacion, nombres_columnas, normalizar_radar, tabla_comparacion, tabla_ranking,
+)
+from src.percentiles_categoria import percentiles
 
 # ==========================================================
 # CONFIGURACIÓN
@@ -86,10 +100,9 @@ with filter_container:
 # Aplicar Filtros
 filtered_df = df.copy()
 
-if isin_input:
-    mask_isin = filtered_df["isin"].str.contains(isin_input, case=False, na=False)
-    mask_nombre = filtered_df["nombreEtf"].str.contains(isin_input, case=False, na=False)
-    filtered_df = filtered_df[mask_isin | mask_nombre]
+isins_busqueda = coincidencias(db, "etfs", isin_input)
+if isins_busqueda is not None:
+    filtered_df = filtered_df[filtered_df["isin"].isin(isins_busqueda)]
 
 if tipo_filter != "Todos":
     filtered_df = filtered_df[filtered_df["tipoEtf"] == tipo_filter]
@@ -108,7 +121,7 @@ if riesgo_filter != "Todos":
     filtered_df = filtered_df[filtered_df["riesgo"] == riesgo_filter]
 
 # ==========================================================
-# GESTIÓN DE SELECCIÓN (Hasta 4)
+# GESTIÓN DE SELECCIÓN (Hasta MAX_INSTRUMENTOS)
 # ==========================================================
 if "compare_isins_etfs" not in st.session_state:
     st.session_state.compare_isins_etfs = []
@@ -134,7 +147,7 @@ page_df.insert(0, "Comparar", page_df["isin"].isin(st.session_state.compare_isin
 # SECCIÓN 2: TABLA SELECCIÓN
 # ==========================================================
 st.markdown(f"### 📋 Selecciona ETFs ({total_rows} encontrados)")
-st.caption(f"Seleccionados: {len(st.session_state.compare_isins_etfs)} / 4 (Máximo)")
+st.caption(f"Seleccionados: {len(st.session_state.compare_isins_etfs)} / {MAX_INSTRUMENTOS} (Máximo)")
 
 edited_df = st.data_editor(
     page_df,
@@ -158,10 +171,10 @@ for idx, row in edited_df.iterrows():
     is_checked = row["Comparar"]
     
     if is_checked and isin not in st.session_state.compare_isins_etfs:
-        if len(st.session_state.compare_isins_etfs) < 4:
+        if len(st.session_state.compare_isins_etfs) < MAX_INSTRUMENTOS:
             st.session_state.compare_isins_etfs.append(isin)
         else:
-            st.toast("⚠️ Máximo 4 ETFs permitidos.", icon="🛑")
+            st.toast(f"⚠️ Máximo {MAX_INSTRUMENTOS} ETFs permitidos.", icon="🛑")
             st.rerun()
             
     elif not is_checked and isin in st.session_state.compare_isins_etfs:
@@ -193,98 +206,32 @@ selected_isins = st.session_state.compare_isins_etfs
 if len(selected_isins) > 0:
     st.header("⚖️ Comparativa Cara a Cara")
     
-    # Recuperar datos completos
-    etfs_data = list(etfs_collection.find({"isin": {"$in": selected_isins}}, {"_id": 0}))
+    # Matriz de métricas de los ETFs seleccionados (una consulta)
+    comp = cargar_comparacion(db, "etfs", selected_isins)
+    n_etfs = len(comp["isins"])
     
-    # Ordenar
-    e_map = {e['isin']: e for e in etfs_data}
-    ordered_etfs = [e_map[isin] for isin in selected_isins if isin in e_map]
+    # Percentil de cada ETF dentro de su tipo
+    posiciones = percentiles(db, "etfs", comp["categorias"], comp["valores"])
     
     # --- 1. TABLA MÉTRICAS CLAVE ---
     st.subheader("📊 Datos Fundamentales")
+    st.dataframe(tabla_comparacion(comp, posiciones), width="stretch", hide_index=True)
+    st.caption("P = percentil dentro de su tipo de ETF (% de ETFs del mismo tipo con valor menor o igual).")
     
-    metrics_map = {
-        "Categoría": lambda x: x.get("tipoEtf", "-"),
-        "Coste (TER)": lambda x: x.get("ter", "-"),
-        "Yield to Maturity": lambda x: f"{x.get('yield_to_maturity', '-')}%",
-        "Duración Efectiva": lambda x: f"{x.get('duracion_efectiva', '-')} años",
-        "Calidad Crediticia": lambda x: x.get('calidad_crediticia', '-'),
-        "Riesgo (SRI)": lambda x: x.get('riesgo', '-'),
-        "Volatilidad (3A)": lambda x: x.get('volatility_3y', '-'),
-        "Rentabilidad 1A": lambda x: x.get('yield_1y', '-'),
-        "Rentabilidad 3A": lambda x: x.get('yield_3y', '-'),
-        "Rentabilidad 5A": lambda x: x.get('yield_5y', '-')
-    }
-
-    table_data = []
-    for m_label, m_func in metrics_map.items():
-        row = {"Métrica": m_label}
-        for e in ordered_etfs:
-            name = (e.get('nombreEtf') or 'Sin Nombre')[:20] + "..." 
-            try:
-                val = m_func(e)
-                if "None" in str(val) or val is None: val = "-"
-                row[name] = val
-            except:
-                row[name] = "-"
-        table_data.append(row)
-
-    st.dataframe(pd.DataFrame(table_data), width="stretch", hide_index=True)
+    if n_etfs > 1:
+        st.markdown("##### 🏅 Ranking (1 = mejor)")
+        st.dataframe(tabla_ranking(comp), width="stretch")
 
     # --- 2. GESTIÓN DE DATOS VISUALES ---
     st.subheader("🕸️ Perfil Visual (Individual)")
     
-    def get_num(val):
-        if val is None: return 0
-        if isinstance(val, (int, float)): return val
-        if isinstance(val, str):
-            try: return float(val.replace("%", "").replace(",", ".").replace("+", ""))
-            except: return 0
-        return 0
-
-    radar_labels = ["Yield (TIR)", "Duración", "Volatilidad", "Ratio Rent/Riesgo", "Retorno 1A"]
-    metric_extractors = {
-        "Yield (TIR)": lambda x: x.get('yield_to_maturity'),
-        "Duración": lambda x: x.get('duracion_efectiva'),
-        "Volatilidad": lambda x: x.get('volatility_3y'),
-        "Ratio Rent/Riesgo": lambda x: x.get('return_per_risk_3y'),
-        "Retorno 1A": lambda x: x.get('yield_1y'),
-    }
-    
-    max_vals = {m: 0.1 for m in radar_labels}
-    etfs_metrics = {}
-
-    for e in ordered_etfs:
-        isin = e['isin']
-        vals = {}
-        for m in radar_labels:
-            raw = metric_extractors[m](e)
-            val = get_num(raw)
-            vals[m] = val
-            if val > max_vals[m]: max_vals[m] = val
-        etfs_metrics[isin] = vals
-
-    # --- 3. GRÁFICOS RADAR ---
-    cols_radar = st.columns(len(ordered_etfs))
-    custom_colors = ['#1f77b4', '#d62728', '#2ca02c', '#9467bd']
-
-    for idx, e in enumerate(ordered_etfs):
-        isin = e['isin']
-        name = (e.get('nombreEtf') or 'Desc')[:15]
-        
-        r_vals = []
-        hover_txt = []
-        for m in radar_labels:
-            limit = max_vals[m]
-            val = etfs_metrics[isin][m]
-            norm = val / limit if limit > 0 else 0
-            r_vals.append(norm)
-            hover_txt.append(f"{m}: {val}")
-        
-        r_vals.append(r_vals[0])
-        theta = radar_labels + [radar_labels[0]]
-        color = custom_colors[idx % len(custom_colors)]
+    radar_idx = [j for j, m in enumerate(comp["metricas"]) if m["radar"]]
+    radar_labels = [comp["metricas"][j]["etiqueta"] for j in radar_idx]
+    radar_norm = normalizar_radar(comp["valores"][:, radar_idx])
+    radar_raw = comp["valores"][:, radar_idx]
 
+    # --- 3. GRÁFICOS RADAR (filas de 4) ---
+    def radar_figure(r_vals, theta, name, color, hover_txt):
         fig = go.Figure()
         fig.add_trace(go.Scatterpolar(
             r=r_vals,
@@ -293,7 +240,7 @@ if len(selected_isins) > 0:
             name=name,
             line=dict(color=color),
             hovertemplate="%{text}<extra></extra>",
-            text=hover_txt + [hover_txt[0]]
+            text=hover_txt
         ))
         
         fig.update_layout(
@@ -303,26 +250,41 @@ if len(selected_isins) > 0:
             showlegend=False,
             title=dict(text=name, font=dict(size=14), x=0.5)
         )
-        
-        with cols_radar[idx]:
-            st.plotly_chart(fig, width="stretch")
+        return fig
+
+    custom_colors = sample_colorscale("Turbo", [i / max(n_etfs - 1, 1) for i in range(n_etfs)]) if n_etfs > 4 else ['#1f77b4', '#d62728', '#2ca02c', '#9467bd']
+    theta = radar_labels + [radar_labels[0]]
+    per_row = 4
+
+    for row_start in range(0, n_etfs, per_row):
+        cols_radar = st.columns(per_row)
+        for idx in range(row_start, min(row_start + per_row, n_etfs)):
+            name = comp["nombres"][idx][:15]
+            r_vals = radar_norm[idx].tolist()
+            hover_txt = [f"{m}: {'-' if np.isnan(v) else round(v, 2)}" for m, v in zip(radar_labels, radar_raw[idx])]
+
+            fig = figura("Comparador_ETFs", radar_figure, r_vals + r_vals[:1], theta, name, custom_colors[idx], hover_txt + hover_txt[:1])
+            
+            with cols_radar[idx - row_start]:
+                st.plotly_chart(fig, width="stretch")
+
+    st.caption(resumen_figuras("Comparador_ETFs"))
 
     # --- 4. COMPARATIVA POR PERIODOS ---
     st.divider()
     st.markdown("##### 📈 Comparativa de Rentabilidades Separadas")
 
     col_1a, col_3a, col_5a = st.columns(3)
+    claves = [m["clave"] for m in comp["metricas"]]
+    bar_names = nombres_columnas(comp, largo=15)
 
-    for idx, (col, period, key) in enumerate(zip([col_1a, col_3a, col_5a], ["1 Año", "3 Años", "5 Años"], ["yield_1y", "yield_3y", "yield_5y"])):
+    for col, period, key in zip([col_1a, col_3a, col_5a], ["1 Año", "3 Años", "5 Años"], ["rent_1a", "rent_3a", "rent_5a"]):
         with col:
             st.markdown(f"**Rentabilidad {period}**")
-            data_period = {}
-            for e in ordered_etfs:
-                name = (e.get('nombreEtf') or 'Desc')[:15] + "..."
-                data_period[name] = get_num(e.get(key))
+            data_period = np.nan_to_num(comp["valores"][:, claves.index(key)])
             
-            if any(v != 0 for v in data_period.values()):
-                st.bar_chart(pd.Series(data_period), color="#4a6fa5")
+            if (data_period != 0).any():
+                st.bar_chart(pd.Series(data_period, index=bar_names), color="#4a6fa5")
             else:
                 st.info(f"Sin datos para {period}")
 
@@ -0,0 +1,126 @@
+"""
+Benchmark del parseo HTML de los scrapers de curvas y tipos de interés.
+
+Compara, sobre las páginas guardadas en assets/fixtures/html/, la extracción
+anterior (árbol completo de BeautifulSoup + regex por celda) con la actual
+(XPath de lxml + patrón de plazos precompilado) y muestra en qué difieren
+sus resultados. La referencia buscaba subcadenas ("5 years" dentro de
+"15 years"), por lo que en páginas con el plazo de 15 años su 5Y era erróneo.
+
+Uso (desde la raíz del proyecto):
+    python -m src.bench_parseo_html [repeticiones]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from src.scraper_curvas_tipos import PLAZOS_OBJETIVO, _parsear_curva
+from src.scraper_tipos_interes import _parsear_tipo_global_rates
+
+
+DIRECTORIO_FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets", "fixtures", "html",
+)
+
+
+# ============================================================
+# IMPLEMENTACIÓN ANTERIOR (referencia)
+# ============================================================
+
+def _normalizar_plazo_anterior(texto: str) -> str | None:
+    t = texto.strip().lower()
+    for clave, codigo in PLAZOS_OBJETIVO.items():
+        if clave in t:
+            return codigo
+    for patron, codigo in [(r"\b3\s*m", "3M"), (r"\b6\s*m", "6M"), (r"\b1\s*y", "1Y"),
+                           (r"\b2\s*y", "2Y"), (r"\b5\s*y", "5Y"), (r"\b10\s*y", "10Y"),
+                           (r"\b30\s*y", "30Y")]:
+        if re.search(patron, t):
+            return codigo
+    return None
+
+
+def _extraer_rendimiento_anterior(texto: str) -> float | None:
+    match = re.search(r"(-?\d+[\.,]\d+)\s*%", texto) or re.search(r"(-?\d+[\.,]\d+)", texto)
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+def _parsear_curva_anterior(contenido: bytes) -> dict[str, float]:
+    rendimientos = {}
+    soup = BeautifulSoup(contenido, "lxml")
+    for table in soup.find_all("table"):
+        for row in table.find_all("tr"):
+            cells = row.find_all("td")
+            if len(cells) < 2:
+                continue
+            plazo = _normalizar_plazo_anterior(cells[0].get_text(strip=True))
+            if plazo:
+                for cell in cells[1:]:
+                    valor = _extraer_rendimiento_anterior(cell.get_text(strip=True))
+                    if valor is not None:
+                        rendimientos[plazo] = valor
+                        break
+    return rendimientos
+
+
+def _parsear_tipo_anterior(contenido: bytes) -> float | None:
+    soup = BeautifulSoup(contenido, "lxml")
+    tables = soup.find_all("table", class_="tabledata1") or soup.find_all("table")
+    for table in tables:
+        for row in table.find_all("tr"):
+            for cell in row.find_all("td"):
+                match = re.search(r"(\d+[\.,]\d+)\s*%", cell.get_text(strip=True))
+                if match:
+                    return float(match.group(1).replace(",", "."))
+    match = re.search(r"(?:current|actual|present).*?(\d+[\.,]\d+)\s*%",
+                      soup.get_text(), re.IGNORECASE)
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+CASOS = [
+    ("worldgovernmentbonds_us.html", _parsear_curva_anterior, _parsear_curva),
+    ("global_rates_fed.html", _parsear_tipo_anterior, _parsear_tipo_global_rates),
+]
+
+
+def ejecutar(repeticiones: int = 50) -> list[dict]:
+    resultados = []
+    for fichero, anterior, actual in CASOS:
+        with open(os.path.join(DIRECTORIO_FIXTURES, fichero), "rb") as f:
+            contenido = f.read()
+
+        r_anterior, r_actual = anterior(contenido), actual(contenido)
+        if isinstance(r_actual, dict):
+            diferencias = {k: (r_anterior.get(k), v) for k, v in r_actual.items() if r_anterior.get(k) != v}
+        else:
+            diferencias = {} if r_anterior == r_actual else {"valor": (r_anterior, r_actual)}
+
+        t_anterior = min(timeit.repeat(lambda: anterior(contenido), number=repeticiones, repeat=3))
+        t_actual = min(timeit.repeat(lambda: actual(contenido), number=repeticiones, repeat=3))
+        resultados.append({
+            "fixture": fichero,
+            "kb": len(contenido) / 1024,
+            "anterior_ms": t_anterior / repeticiones * 1000,
+            "actual_ms": t_actual / repeticiones * 1000,
+            "diferencias": diferencias,
+        })
+    return resultados
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{'Fixture':32} {'KB':>6} {'Anterior (ms)':>14} {'Actual (ms)':>12} {'Mejora':>7}")
+    for r in ejecutar(n):
+        print(f"{r['fixture']:32} {r['kb']:6.1f} {r['anterior_ms']:14.2f} "
+              f"{r['actual_ms']:12.2f} {r['anterior_ms'] / r['actual_ms']:6.1f}x")
+        for clave, (antes, ahora) in r["diferencias"].items():
+            print(f"    {clave}: anterior={antes} actual={ahora}")
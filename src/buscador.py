@@ -0,0 +1,217 @@
+"""
+Buscador de fondos y ETFs por nombre e ISIN.
+
+Índice invertido de trigramas en memoria, construido una vez por versión de
+la colección (src.cache_datos) y compartido por todas las sesiones:
+  - Cada documento se normaliza (minúsculas, sin acentos, solo letras y
+    dígitos) y se trocea en palabras; de cada palabra " palabra " salen sus
+    trigramas, así que " am" marca el inicio de palabra (prefijos) y los
+    trigramas internos toleran erratas (búsqueda aproximada).
+  - Una consulta suma, con un np.bincount por palabra sobre las listas de
+    sus trigramas, cuántos comparte con cada documento. La similitud es la
+    fracción de trigramas de la consulta presentes; la última palabra se
+    trata como prefijo (el usuario aún está escribiendo); si es de un solo
+    carácter no tiene trigramas y se busca como prefijo de palabra. Para
+    filtrar listados se exige además que cada palabra esté presente por
+    separado.
+  - Sobre los mejores candidatos se aplican bonificaciones: ISIN exacto o
+    por prefijo, todas las palabras como prefijo de palabras del nombre y
+    subcadena literal.
+Sobre decenas de miles de nombres una búsqueda tarda del orden de 1 ms.
+"""
+
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from src.cache_datos import version_coleccion
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+CORPUS = {
+    "fondos": {"coleccion": "fondos", "nombre": "nombre", "extras": ["tramo_rf"]},
+    "etfs": {"coleccion": "etfs", "nombre": "nombreEtf", "extras": ["tipoEtf"]},
+}
+
+# Consultas más cortas no filtran (una letra casa con casi todo)
+MIN_CARACTERES = 2
+# Candidatos que se puntúan en detalle antes de ordenar
+MAX_CANDIDATOS = 200
+# Similitud mínima por palabra (fracción de trigramas) para una coincidencia aproximada
+UMBRAL_COINCIDENCIA = 0.5
+
+BONO_ISIN_EXACTO = 3.0
+BONO_ISIN_PREFIJO = 2.0
+BONO_PREFIJOS = 1.0
+BONO_SUBCADENA = 0.5
+
+_lock = threading.Lock()
+_indices = {}   # corpus → (versión, IndiceBusqueda)
+
+
+# ============================================================
+# NORMALIZACIÓN
+# ============================================================
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: str | None) -> str:
+    """Minúsculas, sin acentos y con cualquier separador reducido a un espacio."""
+    if not texto:
+        return ""
+    sin_acentos = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return _NO_ALFANUMERICO.sub(" ", sin_acentos.lower()).strip()
+
+
+def _trigramas(palabras: list[str], prefijo_final: bool = False) -> set[str]:
+    """Trigramas de ' palabra ' (sin el espacio final en la última si es prefijo)."""
+    resultado = set()
+    for i, palabra in enumerate(palabras):
+        abierta = prefijo_final and i == len(palabras) - 1
+        relleno = " " + palabra + ("" if abierta else " ")
+        resultado.update(relleno[j:j + 3] for j in range(len(relleno) - 2))
+    return resultado
+
+
+# ============================================================
+# ÍNDICE
+# ============================================================
+
+class IndiceBusqueda:
+    """Índice de trigramas sobre una lista de documentos {isin, nombre, extras...}."""
+
+    def __init__(self, documentos: list[dict], campo_nombre: str = "nombre"):
+        vistos = set()
+        self.documentos = []
+        for doc in documentos:
+            isin = doc.get("isin")
+            if not isin or isin in vistos:
+                continue
+            vistos.add(isin)
+            self.documentos.append(doc)
+
+        self.campo_nombre = campo_nombre
+        self.isins = [d["isin"] for d in self.documentos]
+        self.textos = [normalizar(f"{d.get(campo_nombre) or ''} {d['isin']}") for d in self.documentos]
+        self.palabras = [texto.split() for texto in self.textos]
+        self._textos = np.array(self.textos, dtype=str)
+        self._inicios_palabra = np.char.add(" ", self._textos)
+        self._isins = np.array(self.isins, dtype=str)
+
+        listas = {}
+        for i, palabras in enumerate(self.palabras):
+            for trigrama in _trigramas(palabras):
+                listas.setdefault(trigrama, []).append(i)
+        self.listas = {t: np.array(ids, dtype=np.int32) for t, ids in listas.items()}
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def _similitud(self, consulta: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Para la consulta (ya normalizada) y cada documento: fracción de todos
+        sus trigramas presentes y la peor fracción entre sus palabras (exige
+        que cada palabra aparezca, aunque sea con erratas).
+        """
+        palabras = consulta.split()
+        cuentas, totales = [], []
+        for i, palabra in enumerate(palabras):
+            trigramas = _trigramas([palabra], prefijo_final=(i == len(palabras) - 1))
+            if not trigramas:
+                # Palabra final de un carácter ("1" en "treasury 1"): no da
+                # trigramas, cuenta como prefijo de alguna palabra del documento
+                cuentas.append((np.char.find(self._inicios_palabra, " " + palabra) >= 0).astype(int))
+                totales.append(1)
+                continue
+            presentes = [self.listas[t] for t in trigramas if t in self.listas]
+            cuenta = (np.bincount(np.concatenate(presentes), minlength=len(self.documentos))
+                      if presentes else np.zeros(len(self.documentos), dtype=int))
+            cuentas.append(cuenta)
+            totales.append(max(len(trigramas), 1))
+        cuentas = np.array(cuentas)
+        totales = np.array(totales)[:, None]
+        return cuentas.sum(axis=0) / totales.sum(), (cuentas / totales).min(axis=0)
+
+    def _puntuar(self, texto: str) -> tuple[np.ndarray, np.ndarray]:
+        """(índices de documento, puntuación) de los mejores candidatos, de mayor a menor."""
+        consulta = normalizar(texto)
+        if len(consulta) < MIN_CARACTERES or not self.documentos:
+            return np.array([], dtype=int), np.array([])
+        palabras = consulta.split()
+
+        similitud, _ = self._similitud(consulta)
+        candidatos = np.flatnonzero(similitud > 0)
+        if len(candidatos) > MAX_CANDIDATOS:
+            candidatos = candidatos[np.argpartition(-similitud[candidatos], MAX_CANDIDATOS)[:MAX_CANDIDATOS]]
+
+        isin_consulta = consulta.replace(" ", "").upper()
+        puntuacion = similitud[candidatos].astype(float)
+        for n, i in enumerate(candidatos):
+            isin = self.isins[i]
+            if isin == isin_consulta:
+                puntuacion[n] += BONO_ISIN_EXACTO
+            elif isin.startswith(isin_consulta):
+                puntuacion[n] += BONO_ISIN_PREFIJO
+            if all(any(p.startswith(q) for p in self.palabras[i]) for q in palabras):
+                puntuacion[n] += BONO_PREFIJOS
+            if consulta in self.textos[i]:
+                puntuacion[n] += BONO_SUBCADENA
+
+        orden = np.argsort(-puntuacion, kind="stable")
+        return candidatos[orden], puntuacion[orden]
+
+    def buscar(self, texto: str, k: int = 20) -> list[dict]:
+        """Los k documentos más parecidos, con su puntuación."""
+        indices, puntuacion = self._puntuar(texto)
+        return [{**self.documentos[i], "puntuacion": float(p)} for i, p in zip(indices[:k], puntuacion[:k])]
+
+    def coincidencias(self, texto: str, umbral: float = UMBRAL_COINCIDENCIA) -> list[str] | None:
+        """
+        ISIN de todos los documentos que coinciden (subcadena literal, prefijo
+        de ISIN o todas las palabras con similitud >= umbral), de más a menos
+        parecido, para filtrar listados. None si la consulta es demasiado
+        corta para filtrar.
+        """
+        consulta = normalizar(texto)
+        if len(consulta) < MIN_CARACTERES:
+            return None
+        similitud, por_palabra = self._similitud(consulta)
+        mascara = ((por_palabra >= umbral)
+                   | (np.char.find(self._textos, consulta) >= 0)
+                   | np.char.startswith(self._isins, consulta.replace(" ", "").upper()))
+        indices = np.flatnonzero(mascara)
+        indices = indices[np.argsort(-similitud[indices], kind="stable")]
+        return [self.isins[i] for i in indices]
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def obtener_indice(db, corpus: str) -> IndiceBusqueda:
+    """Índice del corpus ("fondos" o "etfs"), reconstruido solo si cambia la colección."""
+    config = CORPUS[corpus]
+    version = version_coleccion(db, config["coleccion"])
+    with _lock:
+        guardado = _indices.get(corpus)
+        if guardado and guardado[0] == version:
+            return guardado[1]
+
+    proyeccion = {"_id": 0, "isin": 1, config["nombre"]: 1, **{c: 1 for c in config["extras"]}}
+    indice = IndiceBusqueda(list(db[config["coleccion"]].find({}, proyeccion)), config["nombre"])
+    with _lock:
+        _indices[corpus] = (version, indice)
+    return indice
+
+
+def buscar(db, corpus: str, texto: str, k: int = 20) -> list[dict]:
+    return obtener_indice(db, corpus).buscar(texto, k)
+
+
+def coincidencias(db, corpus: str, texto: str, umbral: float = UMBRAL_COINCIDENCIA) -> list[str] | None:
+    return obtener_indice(db, corpus).coincidencias(texto, umbral)
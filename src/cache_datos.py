@@ -0,0 +1,133 @@
+"""
+Capa compartida de acceso a datos con caché invalidada por versión.
+
+Las páginas de consulta (Fondos, Comparador, Constructor) cargaban el
+universo completo con find + json_normalize en cada rerun de Streamlit, es
+decir, en cada clic. Aquí el DataFrame normalizado se guarda una vez por
+proceso (compartido entre sesiones, como la caché de servicio_curvas) y se
+reutiliza mientras no cambie la versión de la colección.
+
+Versión de una colección (consulta barata, sin leer documentos):
+  - contador en 'versiones_colecciones' que incrementan los procesos de
+    escritura (pipeline, importadores) con marcar_cambio;
+  - máximo de updated_at (índice descendente);
+  - número estimado de documentos (metadatos; detecta borrados).
+La versión se comprueba como mucho una vez cada TTL_VERSION_S segundos; entre
+medias los reruns no tocan Mongo. Cada llamada devuelve una copia, así que
+las páginas pueden renombrar o añadir columnas sin afectar a la caché.
+"""
+
+import threading
+import time
+from datetime import datetime, UTC
+
+import pandas as pd
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+COLECCION_VERSIONES = "versiones_colecciones"
+
+TTL_VERSION_S = 30
+
+UNIVERSOS = {
+    "fondos": {
+        "coleccion": "fondos",
+        "proyeccion": {
+            "_id": 0,
+            "isin": 1,
+            "nombre": 1,
+            "tipo_rf": 1,
+            "tramo_rf": 1,
+            "duration.avg_effective_duration": 1,
+            "sensibilidad_tipos.nivel": 1,
+        },
+        "renombrar": {
+            "duration.avg_effective_duration": "duration",
+            "sensibilidad_tipos.nivel": "sensibilidad",
+        },
+    },
+}
+
+_lock = threading.Lock()
+_cache = {}                 # nombre de universo → {"version", "df"}
+_versiones = {}             # colección → (instante de verificación, versión)
+_indices_creados = set()
+
+
+# ============================================================
+# VERSIONES
+# ============================================================
+
+def marcar_cambio(db, coleccion: str) -> None:
+    """Incrementa el contador de versión de una colección (llamar tras escribir)."""
+    db[COLECCION_VERSIONES].update_one(
+        {"_id": coleccion},
+        {"$inc": {"version": 1}, "$set": {"actualizado": datetime.now(UTC)}},
+        upsert=True,
+    )
+    with _lock:
+        _versiones.pop(coleccion, None)
+
+
+def _asegurar_indice(db, coleccion: str) -> None:
+    if coleccion in _indices_creados:
+        return
+    db[coleccion].create_index([("updated_at", -1)])
+    _indices_creados.add(coleccion)
+
+
+def version_coleccion(db, coleccion: str, forzar: bool = False) -> tuple:
+    """Versión actual de la colección (comprobada como mucho cada TTL_VERSION_S)."""
+    ahora = time.monotonic()
+    with _lock:
+        verificada = _versiones.get(coleccion)
+        if verificada and not forzar and ahora - verificada[0] < TTL_VERSION_S:
+            return verificada[1]
+
+    _asegurar_indice(db, coleccion)
+    contador = db[COLECCION_VERSIONES].find_one({"_id": coleccion}, {"version": 1}) or {}
+    ultimo = db[coleccion].find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)]) or {}
+    version = (contador.get("version", 0), ultimo.get("updated_at"), db[coleccion].estimated_document_count())
+
+    with _lock:
+        _versiones[coleccion] = (ahora, version)
+    return version
+
+
+def invalidar(nombre: str | None = None) -> None:
+    """Olvida un universo (o todos) y fuerza a comprobar de nuevo las versiones."""
+    with _lock:
+        if nombre is None:
+            _cache.clear()
+            _versiones.clear()
+        else:
+            _cache.pop(nombre, None)
+            _versiones.pop(UNIVERSOS[nombre]["coleccion"], None)
+
+
+# ============================================================
+# UNIVERSOS
+# ============================================================
+
+def obtener_universo(db, nombre: str = "fondos") -> pd.DataFrame:
+    """DataFrame normalizado del universo 'nombre' (copia de la versión en caché)."""
+    config = UNIVERSOS[nombre]
+    version = version_coleccion(db, config["coleccion"])
+    with _lock:
+        guardado = _cache.get(nombre)
+        if guardado and guardado["version"] == version:
+            return guardado["df"].copy()
+
+    df = pd.json_normalize(list(db[config["coleccion"]].find({}, config["proyeccion"])))
+    df = df.rename(columns=config["renombrar"])
+
+    with _lock:
+        _cache[nombre] = {"version": version, "df": df}
+    return df.copy()
+
+
+def obtener_universo_fondos(db) -> pd.DataFrame:
+    """Universo de fondos para listados: isin, nombre, tipo_rf, tramo_rf, duration, sensibilidad."""
+    return obtener_universo(db, "fondos")
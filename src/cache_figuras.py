@@ -0,0 +1,112 @@
+"""
+Caché de figuras Plotly por valores de entrada, con medición del ahorro.
+
+Las páginas de detalle, comparadores y datos macro reconstruían en cada
+rerun los mismos go.Figure (gauges de duración/volatilidad, radares por
+fondo, gauges macro) aunque los datos no hubieran cambiado. Construir un
+go.Figure valida cada propiedad contra el esquema de Plotly, y es lo que
+domina el tiempo de render en equipos lentos.
+
+Aquí la página pasa la función que construye la figura y sus argumentos:
+    fig = figura("Datos_Macro", gauge, "PMI", 52.1, [40, 65], pasos)
+La clave es un hash SHA-1 de la página, el nombre de la función y los
+argumentos serializados; si ya existe se devuelve la figura validada
+guardada (LRU de proceso, compartida entre sesiones como la caché de
+servicio_curvas).
+Streamlit serializa un go.Figure con to_dict sin volver a validarlo; si se
+guardara el JSON y se reconstruyera la figura se repetiría la validación,
+que es justo lo que se quiere evitar. Las figuras devueltas son
+compartidas: no modificarlas después de pedirlas.
+
+Por página se lleva la cuenta de aciertos, fallos y milisegundos ahorrados
+(tiempo de construcción de cada figura reutilizada); resumen_figuras lo
+da en una línea para mostrarlo con st.caption.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+MAX_FIGURAS = 512
+
+_lock = threading.Lock()
+_figuras = OrderedDict()    # clave → (figura, ms de construcción)
+_estadisticas = {}          # página → {"aciertos", "fallos", "ms_construccion", "ms_ahorrados"}
+
+
+# ============================================================
+# CACHÉ
+# ============================================================
+
+def clave_figura(pagina: str, constructor, *args, **kwargs) -> str:
+    """
+    Hash estable de página, constructor y argumentos (valores JSON o str).
+    La página entra en la clave porque todas se ejecutan como __main__ y
+    dos páginas pueden tener constructores con el mismo nombre.
+    """
+    contenido = json.dumps([pagina, constructor.__qualname__, args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+def _registrar(pagina: str, acierto: bool, ms: float) -> None:
+    est = _estadisticas.setdefault(pagina, {"aciertos": 0, "fallos": 0, "ms_construccion": 0.0, "ms_ahorrados": 0.0})
+    if acierto:
+        est["aciertos"] += 1
+        est["ms_ahorrados"] += ms
+    else:
+        est["fallos"] += 1
+        est["ms_construccion"] += ms
+
+
+def figura(pagina: str, constructor, *args, **kwargs):
+    """Figura de constructor(*args, **kwargs), reutilizada si ya se construyó con esos valores."""
+    clave = clave_figura(pagina, constructor, *args, **kwargs)
+    with _lock:
+        guardada = _figuras.get(clave)
+        if guardada:
+            _figuras.move_to_end(clave)
+            _registrar(pagina, True, guardada[1])
+            return guardada[0]
+
+    inicio = time.perf_counter()
+    fig = constructor(*args, **kwargs)
+    ms = (time.perf_counter() - inicio) * 1000
+
+    with _lock:
+        _figuras[clave] = (fig, ms)
+        while len(_figuras) > MAX_FIGURAS:
+            _figuras.popitem(last=False)
+        _registrar(pagina, False, ms)
+    return fig
+
+
+def limpiar() -> None:
+    with _lock:
+        _figuras.clear()
+        _estadisticas.clear()
+
+
+# ============================================================
+# INSTRUMENTACIÓN
+# ============================================================
+
+def estadisticas(pagina: str) -> dict:
+    with _lock:
+        return dict(_estadisticas.get(pagina, {"aciertos": 0, "fallos": 0, "ms_construccion": 0.0, "ms_ahorrados": 0.0}))
+
+
+def resumen_figuras(pagina: str) -> str:
+    """Línea de instrumentación acumulada de la página (vacía si aún no hay figuras)."""
+    est = estadisticas(pagina)
+    total = est["aciertos"] + est["fallos"]
+    if not total:
+        return ""
+    return (f"⚡ Figuras reutilizadas: {est['aciertos']}/{total} · "
+            f"render ahorrado: {est['ms_ahorrados']:.0f} ms · "
+            f"construcción: {est['ms_construccion']:.0f} ms")
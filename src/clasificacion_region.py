@@ -0,0 +1,165 @@
+"""
+Clasificación normalizada de región y divisa de fondos y ETFs.
+
+Los constructores automáticos filtraban por región con expresiones regulares
+sin anclar y sin distinguir mayúsculas sobre 'categoria' (fondos) o
+'nombreEtf' (ETFs), que no pueden usar índices y recorren toda la colección
+en cada "Generar". Aquí la clasificación se hace una vez al ingerir y se
+guarda en el documento:
+    {"regiones": ["EUR", ...], "region": "EUR", "divisa": "EUR",
+     "clasificacion_version": VERSION_CLASIFICACION}
+  - regiones: todas las regiones que casan (un fondo "Europe Bond - USD
+    Hedged" aparece en EUR y en US, igual que con los filtros antiguos).
+    Lista vacía = sin región concreta (solo entra en GLOBAL).
+  - region:   la primera que casa según el orden de REGLAS_REGION ("GLOBAL" si ninguna).
+  - divisa:   divisa de referencia (la cubierta si hay "<DIV> Hedged").
+Las consultas pasan a ser de igualdad sobre 'regiones' (multikey) con índice
+compuesto junto al tramo. Las reglas son deterministas y están versionadas:
+al cambiarlas se sube VERSION_CLASIFICACION y etiquetar_coleccion
+reetiqueta solo los documentos con versión anterior.
+
+Las ingestas etiquetan al escribir; para el histórico existente (o tras
+cambiar las reglas) lo hace la tarea "regiones" del planificador:
+    python -m src.planificador --una-vez regiones
+"""
+
+import re
+
+from pymongo import ASCENDING, UpdateOne
+
+from src.cache_datos import marcar_cambio
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+VERSION_CLASIFICACION = 2
+
+REGION_GLOBAL = "GLOBAL"
+
+
+def _codigo(patron: str) -> str:
+    """
+    Código de divisa en mayúsculas aislado: sin mayúscula delante ni
+    minúscula detrás. \\b no sirve porque '_' y los dígitos son caracteres de
+    palabra ("1-3yr_USD", "US1-3Yr"), y hay nombres en camel case
+    ("USLqCrp1-5YrUSDAdis").
+    """
+    return rf"(?<![A-Z])(?:{patron})(?![a-z])"
+
+
+# Reglas (región, patrón) en orden de prioridad. Los códigos de divisa se
+# distinguen por mayúsculas (_codigo) para no confundir "JP Morgan" con Japón
+# o "Bonus" con US, como pasaba con las subcadenas de los filtros antiguos;
+# las palabras no distinguen mayúsculas.
+REGLAS_REGION = [
+    ("EUR", r"(?i:EUR|Euro)"),
+    ("US", _codigo(r"USD?") + r"|(?i:U\.S\.)"),
+    ("JP", _codigo(r"JPY") + r"|(?i:\bYen\b|Japan)"),
+    ("CN", _codigo(r"CN[YH]") + r"|(?i:China|Renminbi)"),
+]
+
+# Campo del que se deduce la región en cada colección
+CAMPO_TEXTO = {
+    "fondos": "categoria",
+    "etfs": "nombreEtf",
+}
+
+DIVISAS = [
+    ("EUR", _codigo(r"EUR") + r"|(?i:\bEuro\b)"),
+    ("USD", _codigo(r"USD") + r"|(?i:US Dollar|U\.S\. Dollar)"),
+    ("GBP", _codigo(r"GBP") + r"|(?i:Sterling)"),
+    ("JPY", _codigo(r"JPY") + r"|(?i:\bYen\b)"),
+    ("CHF", _codigo(r"CHF") + r"|(?i:Swiss Franc)"),
+    ("CNY", _codigo(r"CN[YH]") + r"|(?i:Renminbi)"),
+]
+
+INDICES = {
+    "fondos": [("regiones", ASCENDING), ("tramo_rf", ASCENDING)],
+    "etfs": [("regiones", ASCENDING), ("tipoEtf", ASCENDING)],
+}
+
+TAMANO_LOTE = 500
+
+_PATRONES_REGION = [(region, re.compile(patron)) for region, patron in REGLAS_REGION]
+_PATRONES_DIVISA = [(divisa, re.compile(patron)) for divisa, patron in DIVISAS]
+_PATRON_CUBIERTA = re.compile(r"(?<![A-Za-z])([A-Za-z]{3})[ _-](?i:Hedged)\b")
+
+
+# ============================================================
+# CLASIFICACIÓN
+# ============================================================
+
+def clasificar_divisa(texto: str | None) -> str | None:
+    """Divisa de referencia: la cubierta si la hay; si no, la primera que aparece."""
+    if not texto:
+        return None
+    cubierta = _PATRON_CUBIERTA.search(texto)
+    if cubierta and cubierta.group(1).upper() in dict(DIVISAS):
+        return cubierta.group(1).upper()
+    encontradas = [(m.start(), divisa) for divisa, patron in _PATRONES_DIVISA if (m := patron.search(texto))]
+    return min(encontradas)[1] if encontradas else None
+
+
+def clasificar(texto: str | None) -> dict:
+    """Etiquetas de región y divisa para el texto de categoría o nombre de un activo."""
+    texto = texto or ""
+    regiones = [region for region, patron in _PATRONES_REGION if patron.search(texto)]
+    return {
+        "regiones": regiones,
+        "region": regiones[0] if regiones else REGION_GLOBAL,
+        "divisa": clasificar_divisa(texto),
+        "clasificacion_version": VERSION_CLASIFICACION,
+    }
+
+
+def clasificar_documento(doc: dict, coleccion: str = "fondos") -> dict:
+    return clasificar(doc.get(CAMPO_TEXTO[coleccion]))
+
+
+def filtro_region(region) -> dict:
+    """Fragmento de consulta Mongo para una región o lista de regiones (GLOBAL = sin filtro)."""
+    regiones = [region] if isinstance(region, str) else list(region)
+    regiones = [r for r in regiones if r != REGION_GLOBAL]
+    if not regiones:
+        return {}
+    return {"regiones": {"$in": regiones}}
+
+
+# ============================================================
+# ETIQUETADO EN MONGO
+# ============================================================
+
+def asegurar_indices(db, coleccion: str | None = None) -> None:
+    for nombre in ([coleccion] if coleccion else INDICES):
+        db[nombre].create_index(INDICES[nombre])
+
+
+def etiquetar_coleccion(db, coleccion: str, forzar: bool = False) -> dict:
+    """
+    Etiqueta los documentos sin clasificar o con una versión anterior de las
+    reglas (todos si forzar) y crea el índice. Devuelve un resumen con el
+    número de documentos revisados y actualizados.
+    """
+    campo = CAMPO_TEXTO[coleccion]
+    filtro = {} if forzar else {"clasificacion_version": {"$ne": VERSION_CLASIFICACION}}
+    revisados, actualizados, operaciones = 0, 0, []
+
+    for doc in db[coleccion].find(filtro, {campo: 1}):
+        revisados += 1
+        operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": clasificar_documento(doc, coleccion)}))
+        if len(operaciones) >= TAMANO_LOTE:
+            actualizados += db[coleccion].bulk_write(operaciones, ordered=False).modified_count
+            operaciones = []
+    if operaciones:
+        actualizados += db[coleccion].bulk_write(operaciones, ordered=False).modified_count
+
+    asegurar_indices(db, coleccion)
+    if actualizados:
+        marcar_cambio(db, coleccion)
+    return {"coleccion": coleccion, "revisados": revisados, "actualizados": actualizados}
+
+
+def etiquetar_todo(db, forzar: bool = False) -> list[dict]:
+    return [etiquetar_coleccion(db, coleccion, forzar) for coleccion in CAMPO_TEXTO]
+
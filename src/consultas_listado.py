@@ -0,0 +1,178 @@
+"""
+Filtrado y paginación en servidor para los listados de fondos y ETFs.
+
+Los listados cargaban la colección completa en pandas, filtraban con
+str.contains y máscaras de igualdad y se quedaban con 10–50 filas con iloc.
+Aquí los filtros de la página se traducen a una consulta Mongo indexada y
+solo viajan las filas de la página:
+  - búsqueda por ISIN o nombre → ISIN que devuelve el buscador en memoria
+    (src.buscador), filtrados con $in sobre el índice de isin;
+  - tipo / tramo / sensibilidad / riesgo → igualdad sobre campos indexados;
+  - rentabilidad 1A de ETFs (texto tipo "+3,2%") → $expr con conversión a
+    número, aplicada solo sobre los documentos que ya pasan el resto.
+La página se pide con sort por _id (orden de inserción, el mismo que veía
+el listado) + skip/limit, y el total con count_documents, que con filtros
+de igualdad se resuelve recorriendo solo el índice. No se usa $facet para el
+total porque sus subpipelines no pueden usar índices y leerían todos los
+documentos que cumplen el filtro.
+
+Las opciones de los desplegables (valores distintos) se cachean por versión
+de colección (src.cache_datos).
+"""
+
+import threading
+
+import pandas as pd
+from pymongo import ASCENDING
+
+from src.cache_datos import version_coleccion
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+TODOS = "Todos"
+
+LISTADOS = {
+    "fondos": {
+        "coleccion": "fondos",
+        "proyeccion": {
+            "_id": 0,
+            "isin": 1,
+            "nombre": 1,
+            "tipo_rf": 1,
+            "tramo_rf": 1,
+            "duration.avg_effective_duration": 1,
+            "sensibilidad_tipos.nivel": 1,
+        },
+        "renombrar": {
+            "duration.avg_effective_duration": "duration",
+            "sensibilidad_tipos.nivel": "sensibilidad",
+        },
+        "filtros": {"tipo": "tipo_rf", "tramo": "tramo_rf", "sensibilidad": "sensibilidad_tipos.nivel"},
+    },
+    "etfs": {
+        "coleccion": "etfs",
+        "proyeccion": {
+            "_id": 0,
+            "isin": 1,
+            "nombreEtf": 1,
+            "tipoEtf": 1,
+            "riesgo": 1,
+            "ter": 1,
+            "yield_1y": 1,
+            "calidad_crediticia": 1,
+        },
+        "renombrar": {},
+        "filtros": {"tipo": "tipoEtf", "riesgo": "riesgo"},
+    },
+}
+
+# Rangos de rentabilidad 1A del listado de ETFs: (operador, umbral)
+RANGOS_RENTABILIDAD = {
+    "Sinceramente Positiva (>0%)": ("$gt", 0),
+    "Alta (>3%)": ("$gt", 3),
+    "Muy Alta (>5%)": ("$gt", 5),
+    "Negativa (<0%)": ("$lt", 0),
+}
+
+_lock = threading.Lock()
+_opciones = {}               # (colección, campo) → (versión, valores)
+_indices_creados = set()
+
+
+# ============================================================
+# ÍNDICES
+# ============================================================
+
+def asegurar_indices(db, listado: str) -> None:
+    """Índices de búsqueda y filtros del listado (una vez por proceso)."""
+    if listado in _indices_creados:
+        return
+    config = LISTADOS[listado]
+    coleccion = db[config["coleccion"]]
+    coleccion.create_index([("isin", ASCENDING)])
+    for campo in config["filtros"].values():
+        coleccion.create_index([(campo, ASCENDING)])
+    _indices_creados.add(listado)
+
+
+# ============================================================
+# CONSTRUCCIÓN DE CONSULTAS
+# ============================================================
+
+def _numero_desde_texto(campo: str) -> dict:
+    """Expresión de agregación: "+3,2%" → 3.2 (0 si no es convertible), como parse_yield."""
+    texto = {"$toString": {"$ifNull": [f"${campo}", ""]}}
+    for quitar, poner in (("%", ""), ("+", ""), (",", ".")):
+        texto = {"$replaceAll": {"input": texto, "find": quitar, "replacement": poner}}
+    return {"$convert": {"input": {"$trim": {"input": texto}}, "to": "double", "onError": 0.0, "onNull": 0.0}}
+
+
+def construir_consulta(listado: str, isins: list[str] | None = None, rentabilidad: str = TODOS, **filtros) -> dict:
+    """
+    Filtro Mongo del listado. 'isins' son las coincidencias de la búsqueda
+    (None = sin búsqueda). 'filtros' usa las claves de LISTADOS[listado]
+    ["filtros"] (tipo, tramo, sensibilidad, riesgo); TODOS o vacío = sin filtro.
+    """
+    config = LISTADOS[listado]
+    consulta = {}
+
+    for clave, valor in filtros.items():
+        if valor and valor != TODOS:
+            consulta[config["filtros"][clave]] = valor
+
+    if isins is not None:
+        consulta["isin"] = {"$in": list(isins)}
+
+    if rentabilidad in RANGOS_RENTABILIDAD:
+        operador, umbral = RANGOS_RENTABILIDAD[rentabilidad]
+        consulta["$expr"] = {operador: [_numero_desde_texto("yield_1y"), umbral]}
+
+    return consulta
+
+
+# ============================================================
+# PAGINACIÓN
+# ============================================================
+
+def obtener_pagina(db, listado: str, consulta: dict, pagina: int, filas_por_pagina: int) -> dict:
+    """
+    Una página del listado: {"df", "total", "paginas", "pagina"}. Si la
+    página pedida ya no existe (p. ej. tras filtrar) se devuelve la primera.
+    """
+    config = LISTADOS[listado]
+    asegurar_indices(db, listado)
+    coleccion = db[config["coleccion"]]
+
+    total = coleccion.count_documents(consulta)
+    paginas = max(1, -(-total // filas_por_pagina))
+    if pagina > paginas or pagina < 1:
+        pagina = 1
+
+    cursor = (coleccion.find(consulta, config["proyeccion"])
+              .sort("_id", ASCENDING)
+              .skip((pagina - 1) * filas_por_pagina)
+              .limit(filas_por_pagina))
+    df = pd.json_normalize(list(cursor)).rename(columns=config["renombrar"])
+    columnas = [config["renombrar"].get(c, c) for c in config["proyeccion"] if c != "_id"]
+    df = df.reindex(columns=columnas)
+
+    return {"df": df, "total": total, "paginas": paginas, "pagina": pagina}
+
+
+def opciones_filtro(db, listado: str, clave: str) -> list:
+    """Valores distintos de un filtro (ordenados, sin vacíos), en caché por versión."""
+    config = LISTADOS[listado]
+    campo = config["filtros"][clave]
+    version = version_coleccion(db, config["coleccion"])
+    with _lock:
+        guardado = _opciones.get((config["coleccion"], campo))
+        if guardado and guardado[0] == version:
+            return guardado[1]
+
+    asegurar_indices(db, listado)
+    valores = sorted(v for v in db[config["coleccion"]].distinct(campo) if v not in (None, ""))
+    with _lock:
+        _opciones[(config["coleccion"], campo)] = (version, valores)
+    return valores
@@ -0,0 +1,392 @@
+"""
+Matrices de covarianzas a partir de históricos de valor liquidativo (NAV).
+
+Almacén:
+  Colección 'nav_historico', un documento por ISIN con el histórico diario
+  en columnas binarias compactas (fechas como ordinal int32 y NAV float64):
+      {"_id": isin, "fechas": Binary, "nav": Binary, "desde", "hasta", "actualizado"}
+  Se descarga con mstarpy (replay.Funds, así que funciona también en
+  record/replay) y las actualizaciones solo piden los días posteriores al
+  último guardado.
+
+Estimación:
+  - Rendimientos logarítmicos semanales (último NAV de cada semana), que
+    alinean fondos y ETFs con calendarios distintos, en una ventana móvil de
+    VENTANA_SEMANAS.
+  - Estadísticos suficientes aditivos por pares (Σ mᵢmⱼ, Σ xᵢxⱼ, Σ xᵢ²xⱼ²),
+    así que al llegar precios nuevos solo se suman las semanas nuevas y se
+    restan las que salen de la ventana. Los huecos (fondos con menos
+    historia) se tratan por pares de observaciones completas.
+  - Contracción de Ledoit-Wolf sobre la matriz de correlaciones hacia la
+    identidad (rendimientos semanales tratados como de media cero) y
+    reescalado con las volatilidades propias. Resultado anualizado en %².
+
+Caché:
+  Estadísticos por universo (hash de los ISIN) en memoria y en
+  assets/cache/covarianzas/, y la matriz final por (universo, última semana,
+  versión de 'nav_historico'): actualizar_historico marca el cambio con
+  cache_datos.marcar_cambio, así que una descarga a mitad de semana o un
+  relleno de huecos recalcula la matriz (y la huella decide qué reutilizar).
+  Los activos sin histórico suficiente se tratan como independientes con su
+  volatilidad de Morningstar.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta, UTC
+
+import numpy as np
+from bson.binary import Binary
+
+from src.cache_datos import marcar_cambio, version_coleccion
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+COLECCION_NAV = "nav_historico"
+
+ANOS_HISTORIA = 3
+VENTANA_SEMANAS = 156
+MIN_SEMANAS = 26             # observaciones mínimas para usar la covarianza estimada
+SEMANAS_ANO = 52
+MAX_MATRICES_CACHE = 8
+
+DIRECTORIO_CACHE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets", "cache", "covarianzas",
+)
+
+_lock = threading.Lock()
+_estadisticos = {}   # clave universo → estadísticos suficientes
+_matrices = {}       # (clave universo, última semana, versión NAV) → resultado
+
+
+# ============================================================
+# ALMACÉN COLUMNAR DE NAV
+# ============================================================
+
+def _a_binario(valores: np.ndarray) -> Binary:
+    return Binary(np.ascontiguousarray(valores).tobytes())
+
+
+def _columnas(doc: dict) -> tuple[np.ndarray, np.ndarray]:
+    return (np.frombuffer(doc["fechas"], dtype=np.int32),
+            np.frombuffer(doc["nav"], dtype=np.float64))
+
+
+def leer_historicos(db, isins: list[str]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """(fechas ordinales, NAV) de cada ISIN con histórico, en una sola consulta."""
+    docs = db[COLECCION_NAV].find({"_id": {"$in": list(isins)}}, {"fechas": 1, "nav": 1})
+    return {doc["_id"]: _columnas(doc) for doc in docs}
+
+
+def _descargar_nav(isin: str, desde: date, hasta: date) -> list[tuple[int, float]]:
+    """Serie diaria de Morningstar; usa el rendimiento total (con dividendos) si viene."""
+    from src import replay   # trae requests: solo al descargar, no al abrir los constructores
+    serie = replay.Funds(isin).nav(start_date=desde, end_date=hasta, frequency="daily") or []
+    puntos = []
+    for fila in serie:
+        valor = fila.get("totalReturn") or fila.get("nav")
+        fecha = str(fila.get("date", ""))[:10]
+        if valor is None or not fecha:
+            continue
+        puntos.append((date.fromisoformat(fecha).toordinal(), float(valor)))
+    return sorted(puntos)
+
+
+def actualizar_historico(db, isin: str, hoy: date | None = None) -> int:
+    """Añade al histórico de un ISIN los días posteriores al último guardado. Devuelve nº de puntos nuevos."""
+    hoy = hoy or date.today()
+    coleccion = db[COLECCION_NAV]
+    doc = coleccion.find_one({"_id": isin})
+
+    if doc:
+        fechas, navs = _columnas(doc)
+        desde = date.fromordinal(int(fechas[-1]) + 1)
+    else:
+        fechas, navs = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        desde = hoy - timedelta(days=365 * ANOS_HISTORIA)
+    if desde > hoy:
+        return 0
+
+    nuevos = [(f, v) for f, v in _descargar_nav(isin, desde, hoy) if not len(fechas) or f > fechas[-1]]
+    if not nuevos:
+        return 0
+
+    fechas = np.concatenate([fechas, np.array([f for f, _ in nuevos], dtype=np.int32)])
+    navs = np.concatenate([navs, np.array([v for _, v in nuevos], dtype=np.float64)])
+    coleccion.update_one(
+        {"_id": isin},
+        {"$set": {
+            "fechas": _a_binario(fechas),
+            "nav": _a_binario(navs),
+            "desde": datetime.combine(date.fromordinal(int(fechas[0])), datetime.min.time()),
+            "hasta": datetime.combine(date.fromordinal(int(fechas[-1])), datetime.min.time()),
+            "actualizado": datetime.now(UTC),
+        }},
+        upsert=True,
+    )
+    marcar_cambio(db, COLECCION_NAV)
+    return len(nuevos)
+
+
+def universo_renta_fija(db) -> list[str]:
+    """ISIN de los fondos con tramo de renta fija y de los ETFs monetarios / de renta fija."""
+    isins = set(db["fondos"].distinct("isin", {"tramo_rf": {"$exists": True}}))
+    isins.update(db["etfs"].distinct("isin", {"tipoEtf": {"$in": ["Mercado Monetario", "Renta Fija"]}}))
+    return sorted(i for i in isins if i and i != "N/A")
+
+
+def actualizar_historicos(db, isins: list[str] | None = None, progreso=None) -> dict:
+    """Actualiza el histórico de NAV de una lista de ISIN (por defecto, todo el universo de renta fija)."""
+    from src import replay
+    isins = universo_renta_fija(db) if isins is None else isins
+    resumen = {"isins": len(isins), "actualizados": 0, "puntos": 0, "errores": 0}
+    for i, isin in enumerate(isins):
+        try:
+            nuevos = actualizar_historico(db, isin)
+            if nuevos:
+                resumen["actualizados"] += 1
+                resumen["puntos"] += nuevos
+        except Exception as e:
+            resumen["errores"] += 1
+            logger.warning("NAV de %s: %s", isin, e)
+        if progreso:
+            progreso((i + 1) / len(isins), isin)
+        replay.pausa(0.5, 1.5)
+    return resumen
+
+
+# ============================================================
+# RENDIMIENTOS SEMANALES Y ESTADÍSTICOS SUFICIENTES
+# ============================================================
+
+def _semana(ordinal) -> np.ndarray:
+    # El ordinal 1 (1 de enero del año 1) es lunes: semanas de lunes a domingo
+    return (np.asarray(ordinal) - 1) // 7
+
+
+def _panel_rendimientos(historicos: dict, isins: list[str], desde: int, hasta: int) -> np.ndarray:
+    """
+    Rendimientos log semanales (%) de las semanas desde..hasta (inclusive),
+    matriz (semanas × activos) con NaN donde falta el precio de cierre.
+    """
+    precios = np.full((hasta - desde + 2, len(isins)), np.nan)
+    for j, isin in enumerate(isins):
+        if isin not in historicos:
+            continue
+        fechas, navs = historicos[isin]
+        semanas = _semana(fechas)
+        # Último NAV de cada semana (las fechas vienen ordenadas)
+        ultimos = np.flatnonzero(np.append(semanas[1:] != semanas[:-1], True))
+        semanas, cierres = semanas[ultimos], navs[ultimos]
+        dentro = (semanas >= desde - 1) & (semanas <= hasta) & (cierres > 0)
+        precios[semanas[dentro] - desde + 1, j] = cierres[dentro]
+    return np.diff(np.log(precios), axis=0) * 100
+
+
+def _nuevos_estadisticos(n_activos: int) -> dict:
+    return {
+        "n": np.zeros((n_activos, n_activos)),
+        "sxx": np.zeros((n_activos, n_activos)),
+        "s4": np.zeros((n_activos, n_activos)),
+        "desde": None,
+        "hasta": None,
+    }
+
+
+def _acumular(estadisticos: dict, rendimientos: np.ndarray, signo: int = 1) -> None:
+    if not len(rendimientos):
+        return
+    presentes = (~np.isnan(rendimientos)).astype(float)
+    x = np.nan_to_num(rendimientos)
+    x2 = x * x
+    estadisticos["n"] += signo * (presentes.T @ presentes)
+    estadisticos["sxx"] += signo * (x.T @ x)
+    estadisticos["s4"] += signo * (x2.T @ x2)
+
+
+def _huella(historicos: dict, isins: list[str], hasta: int) -> str:
+    """Hash de los NAV de cada ISIN hasta el último día de la semana 'hasta'."""
+    corte = hasta * 7 + 7
+    h = hashlib.sha1()
+    for isin in isins:
+        if isin in historicos:
+            fechas, navs = historicos[isin]
+            k = int(np.searchsorted(fechas, corte, side="right"))
+            h.update(fechas[:k].tobytes())
+            h.update(navs[:k].tobytes())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def _clave_universo(isins: list[str]) -> str:
+    return hashlib.sha1("|".join(isins).encode("utf-8")).hexdigest()[:16]
+
+
+def _ruta_estadisticos(clave: str) -> str:
+    return os.path.join(DIRECTORIO_CACHE, f"{clave}.npz")
+
+
+def _cargar_estadisticos(clave: str) -> dict | None:
+    try:
+        with np.load(_ruta_estadisticos(clave)) as datos:
+            return {
+                "n": datos["n"], "sxx": datos["sxx"], "s4": datos["s4"],
+                "desde": int(datos["desde"]), "hasta": int(datos["hasta"]),
+                "huella": str(datos["huella"]),
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _guardar_estadisticos(clave: str, estadisticos: dict) -> None:
+    os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+    ruta = _ruta_estadisticos(clave)
+    with open(ruta + ".tmp", "wb") as f:
+        np.savez(f, **estadisticos)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _actualizar_estadisticos(clave: str, isins: list[str], historicos: dict, hasta: int) -> dict:
+    """
+    Lleva los estadísticos del universo hasta la semana 'hasta' sumando las
+    semanas nuevas y restando las que salen de la ventana. Restar solo es
+    exacto si las semanas ya sumadas se recalculan igual, así que se
+    recalculan desde cero si ha cambiado algún histórico hasta el 'hasta'
+    anterior (NAV que llegan tarde, descarga nueva de un ISIN) o si el salto
+    es mayor que la ventana.
+    """
+    desde = hasta - VENTANA_SEMANAS + 1
+
+    with _lock:
+        previos = _estadisticos.get(clave)
+    if previos is None:
+        previos = _cargar_estadisticos(clave)
+
+    reutilizable = (
+        previos is not None
+        and previos["hasta"] <= hasta
+        and previos["huella"] == _huella(historicos, isins, previos["hasta"])
+        and hasta - previos["hasta"] < VENTANA_SEMANAS
+    )
+    if reutilizable and previos["hasta"] == hasta:
+        return previos
+
+    if reutilizable:
+        estadisticos = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in previos.items()}
+        _acumular(estadisticos, _panel_rendimientos(historicos, isins, previos["hasta"] + 1, hasta))
+        if desde > previos["desde"]:
+            _acumular(estadisticos, _panel_rendimientos(historicos, isins, previos["desde"], desde - 1), signo=-1)
+    else:
+        estadisticos = _nuevos_estadisticos(len(isins))
+        _acumular(estadisticos, _panel_rendimientos(historicos, isins, desde, hasta))
+    estadisticos.update({"desde": desde, "hasta": hasta, "huella": _huella(historicos, isins, hasta)})
+
+    with _lock:
+        _estadisticos[clave] = estadisticos
+    _guardar_estadisticos(clave, estadisticos)
+    return estadisticos
+
+
+# ============================================================
+# LEDOIT-WOLF
+# ============================================================
+
+def _ledoit_wolf(estadisticos: dict) -> tuple[np.ndarray, float]:
+    """
+    Covarianza semanal contraída: Ledoit-Wolf sobre la matriz de correlaciones
+    (objetivo = identidad), con conteos por pares. Devuelve (Σ, intensidad).
+    """
+    n = np.maximum(estadisticos["n"], 1.0)
+    s = estadisticos["sxx"] / n
+    varianzas = np.maximum(np.diag(s), 1e-12)
+    escala = np.sqrt(varianzas)
+    correlacion = s / np.outer(escala, escala)
+    np.fill_diagonal(correlacion, 1.0)
+
+    p = len(correlacion)
+    objetivo = np.eye(p)
+    delta = np.sum((correlacion - objetivo) ** 2) / p
+    # Varianza del estimador de cada par: (E[x²y²] − E[xy]²) / n, en unidades de correlación
+    s4 = estadisticos["s4"] / n / np.outer(varianzas, varianzas)
+    beta = np.sum((s4 - correlacion ** 2) / n) / p
+    intensidad = float(np.clip(beta / delta, 0.0, 1.0)) if delta > 0 else 1.0
+
+    contraida = (1 - intensidad) * correlacion + intensidad * objetivo
+    try:
+        np.linalg.cholesky(contraida)
+    except np.linalg.LinAlgError:
+        # Las correlaciones por pares pueden no ser semidefinidas: se recortan autovalores
+        valores, vectores = np.linalg.eigh(contraida)
+        contraida = (vectores * np.maximum(valores, 1e-6)) @ vectores.T
+        d = np.sqrt(np.diag(contraida))
+        contraida = contraida / np.outer(d, d)
+    return contraida * np.outer(escala, escala), intensidad
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def matriz_covarianzas(db, isins: list[str], vol_respaldo=None, hoy: date | None = None) -> dict:
+    """
+    Covarianza anualizada (%²) alineada con 'isins'.
+
+    vol_respaldo: volatilidades anuales (%) para los activos sin histórico
+    suficiente, que se tratan como independientes del resto.
+
+    Devuelve {"covarianza", "con_historico" (máscara), "semanas", "contraccion", "hasta"}.
+    """
+    isins = list(isins)
+    universo = sorted(set(isins))
+    clave = _clave_universo(universo)
+    hasta = int(_semana((hoy or date.today()).toordinal())) - 1   # última semana completa
+    clave_matriz = (clave, hasta, version_coleccion(db, COLECCION_NAV))
+
+    with _lock:
+        cacheado = _matrices.get(clave_matriz)
+    if cacheado is None:
+        historicos = leer_historicos(db, universo)
+        estadisticos = _actualizar_estadisticos(clave, universo, historicos, hasta)
+        semanal, intensidad = _ledoit_wolf(estadisticos)
+        cacheado = {
+            "covarianza": semanal * SEMANAS_ANO,
+            "con_historico": np.diag(estadisticos["n"]) >= MIN_SEMANAS,
+            "semanas": int(np.diag(estadisticos["n"]).max()) if universo else 0,
+            "contraccion": intensidad,
+            "hasta": date.fromordinal(int(hasta) * 7 + 7),
+            "posicion": {isin: i for i, isin in enumerate(universo)},
+        }
+        with _lock:
+            _matrices[clave_matriz] = cacheado
+            while len(_matrices) > MAX_MATRICES_CACHE:
+                _matrices.pop(next(iter(_matrices)))
+
+    # Reordenar al orden pedido y completar los activos sin histórico
+    posiciones = np.array([cacheado["posicion"][i] for i in isins], dtype=int)
+    con_historico = cacheado["con_historico"][posiciones]
+    covarianza = cacheado["covarianza"][np.ix_(posiciones, posiciones)].copy()
+    sin_historico = ~con_historico
+    if sin_historico.any():
+        if vol_respaldo is not None:
+            varianza = np.nan_to_num(np.asarray(vol_respaldo, dtype=float)) ** 2
+        else:
+            conocidas = np.diag(covarianza)[con_historico]
+            varianza = np.full(len(isins), float(np.median(conocidas)) if len(conocidas) else 1.0)
+        covarianza[sin_historico, :] = 0.0
+        covarianza[:, sin_historico] = 0.0
+        covarianza[sin_historico, sin_historico] = varianza[sin_historico]
+
+    return {
+        "covarianza": covarianza,
+        "con_historico": con_historico,
+        "semanas": cacheado["semanas"],
+        "contraccion": cacheado["contraccion"],
+        "hasta": cacheado["hasta"],
+    }
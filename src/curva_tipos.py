@@ -0,0 +1,236 @@
+"""
+Curva de tipos continua a partir de los plazos discretos de un snapshot.
+
+Los snapshots de 'curvas_tipos' solo guardan siete vencimientos (3M…30Y).
+CurvaTipos precalcula una vez los parámetros de la interpolación y permite
+evaluar, vectorizado sobre arrays de vencimientos (p. ej. la duración
+efectiva de cada fondo):
+  - rendimiento(t)        → yield (%) a cualquier vencimiento
+  - forward(t1, t2)       → forward implícito entre t1 y t2 (o instantáneo)
+  - factor_descuento(t)   → exp(-y(t)·t)
+
+Métodos:
+  - "pchip" → cúbica monótona de Fritsch-Carlson (pasa por todos los puntos
+              y no inventa máximos ni mínimos entre plazos). Por defecto.
+  - "nss"   → ajuste Nelson-Siegel-Svensson por mínimos cuadrados (curva
+              suave, útil para forwards). Con menos de 6 plazos se ajusta
+              Nelson-Siegel; con menos de 4 se usa pchip.
+
+Fuera del rango de plazos disponibles la curva se extiende plana.
+Los rendimientos se tratan como tipos cero con capitalización continua,
+aproximación suficiente para comparar movimientos de la curva.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from src.previsiones_dinamicas import DURACION_ANOS
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+METODOS = ("pchip", "nss")
+
+# Rejilla de lambdas (años) para el ajuste NSS; las betas se resuelven por
+# mínimos cuadrados lineales para cada par
+TAUS_1 = np.linspace(0.25, 5.0, 20)
+TAUS_2 = np.linspace(2.0, 20.0, 19)
+
+# Las previsiones de los snapshots llegan como máximo a 3 años vista
+HORIZONTE_MAX_PREVISIONES = 3
+
+
+# ============================================================
+# INTERPOLACIÓN
+# ============================================================
+
+def _pendientes_pchip(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Derivadas en los nodos según Fritsch-Carlson (mismo criterio que PCHIP)."""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    if len(x) == 2:
+        return np.array([delta[0], delta[0]])
+
+    d = np.zeros_like(y)
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    mismo_signo = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    d[1:-1] = np.where(mismo_signo, media, 0.0)
+
+    def extremo(h0, h1, d0, d1):
+        p = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        if np.sign(p) != np.sign(d0):
+            return 0.0
+        if np.sign(d0) != np.sign(d1) and abs(p) > abs(3 * d0):
+            return 3 * d0
+        return p
+
+    d[0] = extremo(h[0], h[1], delta[0], delta[1])
+    d[-1] = extremo(h[-1], h[-2], delta[-1], delta[-2])
+    return d
+
+
+def _cargas_nss(t: np.ndarray, tau1: float, tau2: float | None) -> np.ndarray:
+    """Matriz de factores (nivel, pendiente, curvatura[, segunda curvatura])."""
+    t = np.maximum(t, 1e-6)
+    x1 = t / tau1
+    f1 = (1 - np.exp(-x1)) / x1
+    columnas = [np.ones_like(t), f1, f1 - np.exp(-x1)]
+    if tau2 is not None:
+        x2 = t / tau2
+        columnas.append((1 - np.exp(-x2)) / x2 - np.exp(-x2))
+    return np.column_stack(columnas)
+
+
+def _ajustar_nss(x: np.ndarray, y: np.ndarray) -> dict:
+    """Mejor ajuste NSS (o NS) sobre la rejilla de taus."""
+    usar_tau2 = len(x) >= 6
+    mejor = None
+    for tau1 in TAUS_1:
+        for tau2 in (TAUS_2[TAUS_2 > tau1 + 0.5] if usar_tau2 else [None]):
+            cargas = _cargas_nss(x, tau1, tau2)
+            betas, *_ = np.linalg.lstsq(cargas, y, rcond=None)
+            error = float(np.sum((cargas @ betas - y) ** 2))
+            if mejor is None or error < mejor["error"]:
+                mejor = {"tau1": float(tau1), "tau2": tau2 and float(tau2),
+                         "betas": betas, "error": error}
+    return mejor
+
+
+# ============================================================
+# CURVA
+# ============================================================
+
+class CurvaTipos:
+    """Curva continua construida una vez a partir de (plazos en años, yields en %)."""
+
+    def __init__(self, plazos, rendimientos, metodo: str = "pchip"):
+        if metodo not in METODOS:
+            raise ValueError(f"Método de interpolación desconocido: {metodo}")
+        x = np.asarray(plazos, dtype=float)
+        y = np.asarray(rendimientos, dtype=float)
+        orden = np.argsort(x)
+        x, y = x[orden], y[orden]
+        if len(x) == 0 or np.any(np.diff(x) <= 0):
+            raise ValueError("Se necesita al menos un plazo y sin vencimientos repetidos")
+
+        self.plazos = x
+        self.rendimientos = y
+        self.metodo = metodo if (metodo == "pchip" or len(x) >= 4) else "pchip"
+        self.nss = None
+
+        if self.metodo == "nss":
+            self.nss = _ajustar_nss(x, y)
+        elif len(x) > 1:
+            # Coeficientes de Hermite por tramo: y = a + b·s + c·s² + d·s³
+            h = np.diff(x)
+            delta = np.diff(y) / h
+            pendientes = _pendientes_pchip(x, y)
+            self._b = pendientes[:-1]
+            self._c = (3 * delta - 2 * pendientes[:-1] - pendientes[1:]) / h
+            self._d = (pendientes[:-1] + pendientes[1:] - 2 * delta) / h ** 2
+
+    def __repr__(self):
+        return f"CurvaTipos({self.metodo}, {len(self.plazos)} plazos, {self.plazos[0]:g}–{self.plazos[-1]:g} años)"
+
+    def _evaluar(self, t: np.ndarray, derivada: bool = False) -> np.ndarray:
+        x = self.plazos
+        if self.metodo == "nss":
+            tc = np.clip(t, x[0], x[-1])
+            if not derivada:
+                return _cargas_nss(tc, self.nss["tau1"], self.nss["tau2"]) @ self.nss["betas"]
+            paso = 1e-4
+            arriba = _cargas_nss(tc + paso, self.nss["tau1"], self.nss["tau2"]) @ self.nss["betas"]
+            abajo = _cargas_nss(tc - paso, self.nss["tau1"], self.nss["tau2"]) @ self.nss["betas"]
+            pendiente = (arriba - abajo) / (2 * paso)
+            return np.where((t < x[0]) | (t > x[-1]), 0.0, pendiente)
+
+        if len(x) == 1:
+            return np.zeros_like(t) if derivada else np.full_like(t, self.rendimientos[0])
+
+        tc = np.clip(t, x[0], x[-1])
+        i = np.clip(np.searchsorted(x, tc, side="right") - 1, 0, len(x) - 2)
+        s = tc - x[i]
+        if derivada:
+            pendiente = self._b[i] + 2 * self._c[i] * s + 3 * self._d[i] * s ** 2
+            return np.where((t < x[0]) | (t > x[-1]), 0.0, pendiente)
+        return self.rendimientos[i] + s * (self._b[i] + s * (self._c[i] + s * self._d[i]))
+
+    def rendimiento(self, t):
+        """Yield (%) a los vencimientos t (años). Acepta escalares o arrays."""
+        t_arr = np.asarray(t, dtype=float)
+        resultado = self._evaluar(np.atleast_1d(t_arr))
+        return resultado.reshape(t_arr.shape) if t_arr.ndim else float(resultado[0])
+
+    __call__ = rendimiento
+
+    def forward(self, t1, t2=None):
+        """
+        Forward implícito (%) entre t1 y t2. Sin t2, forward instantáneo
+        f(t) = y(t) + t·y'(t).
+        """
+        a = np.atleast_1d(np.asarray(t1, dtype=float))
+        escalar = np.ndim(t1) == 0 and (t2 is None or np.ndim(t2) == 0)
+        if t2 is None:
+            resultado = self._evaluar(a) + a * self._evaluar(a, derivada=True)
+        else:
+            b = np.atleast_1d(np.asarray(t2, dtype=float))
+            ya, yb = self._evaluar(a), self._evaluar(b)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                resultado = np.where(b > a, (yb * b - ya * a) / (b - a), yb)
+        return float(resultado[0]) if escalar else resultado
+
+    def factor_descuento(self, t):
+        """exp(-y(t)·t) con y en tanto por uno."""
+        t_arr = np.asarray(t, dtype=float)
+        resultado = np.exp(-np.asarray(self.rendimiento(t_arr)) / 100 * t_arr)
+        return float(resultado) if t_arr.ndim == 0 else resultado
+
+
+# ============================================================
+# CONSTRUCCIÓN DESDE SNAPSHOTS
+# ============================================================
+
+def anno_objetivo(horizonte: int) -> str:
+    """Año de previsión usado para un horizonte (las previsiones llegan a +3 años)."""
+    return str(datetime.now().year + min(horizonte, HORIZONTE_MAX_PREVISIONES))
+
+
+def puntos_curva(curva: dict, anno: str | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (plazos en años, yields) de una curva de snapshot. Con anno se toman las
+    previsiones de ese año; sin él, el rendimiento actual.
+    """
+    puntos = {}
+    for p in curva.get("plazos", []):
+        anos = DURACION_ANOS.get(p.get("plazo"))
+        valor = p.get("rendimiento_actual") if anno is None else p.get("previsiones", {}).get(anno)
+        if anos is not None and valor is not None:
+            puntos[anos] = float(valor)
+    plazos = np.array(sorted(puntos))
+    return plazos, np.array([puntos[t] for t in plazos])
+
+
+def construir_curva(curva: dict | None, anno: str | None = None, metodo: str = "pchip") -> CurvaTipos | None:
+    """CurvaTipos de un snapshot (actual o prevista para 'anno'); None si no hay puntos."""
+    if not curva:
+        return None
+    plazos, rendimientos = puntos_curva(curva, anno)
+    if len(plazos) == 0:
+        return None
+    return CurvaTipos(plazos, rendimientos, metodo)
+
+
+def movimiento_esperado(actual: CurvaTipos | None, proyectada: CurvaTipos | None, duraciones) -> np.ndarray:
+    """
+    Bajada esperada de tipos (actual − previsto, en puntos %) evaluada en la
+    duración de cada activo. Positivo = los tipos bajan (ganancia de precio).
+    """
+    duraciones = np.nan_to_num(np.asarray(duraciones, dtype=float))
+    if actual is None or proyectada is None:
+        return np.zeros_like(duraciones)
+    return actual.rendimiento(duraciones) - proyectada.rendimiento(duraciones)
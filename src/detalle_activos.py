@@ -0,0 +1,124 @@
+"""
+Carga de fichas de detalle de fondos y ETFs con caché LRU por ISIN.
+
+Los paneles de detalle hacían find_one({"isin": ...}, {"_id": 0}) en cada
+rerun mientras el panel estaba abierto, trayendo el documento completo
+(incluidos los payloads en bruto de Morningstar/JustETF), y la pestaña de
+rentabilidad de ETFs repetía otros tres find_one para yield_1y/3y/5y.
+
+Aquí cada pestaña declara los campos que pinta (SECCIONES) y la ficha se pide
+una sola vez con la proyección de las secciones que aún no están en caché.
+La caché es de proceso (compartida entre sesiones, como servicio_curvas),
+LRU con MAX_FICHAS entradas y clave (colección, ISIN); cada entrada guarda
+la versión de la colección (src.cache_datos) con la que se leyó y se
+descarta si la colección ha cambiado. Cambiar de pestaña o hacer rerun no
+vuelve a consultar Mongo.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+
+from src.cache_datos import version_coleccion
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+MAX_FICHAS = 256
+
+# Campos por sección del panel de detalle. Dentro de una colección ningún
+# campo puede ser prefijo de otro (Mongo rechaza proyecciones solapadas).
+SECCIONES = {
+    "fondos": {
+        "cabecera": ["nombre", "isin", "categoria", "currency.base_currency", "mstar_id"],
+        "fundamental": ["duration.yield_to_maturity", "duration.avg_effective_duration", "duration.avg_credit_quality",
+                        "percentiles_categoria"],
+        "riesgo": ["riesgo.for1Year", "riesgo.for3Year", "duration.avg_effective_duration"],
+        "rentabilidad": ["rentabilidad.historica"],
+        "composicion": ["allocation_map.globalAssetClasses", "allocation_map.fixedIncomeSectors"],
+        "detalles": ["tipo_rf", "tramo_rf", "sensibilidad", "updated_at", "mstar_id"],
+    },
+    "etfs": {
+        "cabecera": ["nombreEtf", "isin", "tipoEtf"],
+        "fundamental": ["yield_to_maturity", "duracion_efectiva", "calidad_crediticia",
+                        "replication_method", "ter", "dividend_policy", "fund_size", "percentiles_categoria"],
+        "riesgo": ["volatility_3y", "max_drawdown_3y", "return_per_risk_3y", "duracion_efectiva"],
+        "rentabilidad": ["yield_1y", "yield_3y", "yield_5y"],
+        "detalles": ["vencimiento_efectivo", "cupon_medio", "last_update_justetf", "fecha_datos_bonos"],
+    },
+}
+
+_lock = threading.Lock()
+_fichas = OrderedDict()     # (colección, isin) → {"version", "secciones", "doc"}
+
+
+# ============================================================
+# CACHÉ
+# ============================================================
+
+def _fusionar(destino: dict, origen: dict) -> None:
+    """Mezcla recursiva de documentos parciales (las proyecciones anidadas)."""
+    for clave, valor in origen.items():
+        if isinstance(valor, dict) and isinstance(destino.get(clave), dict):
+            _fusionar(destino[clave], valor)
+        else:
+            destino[clave] = valor
+
+
+def invalidar(coleccion: str | None = None, isin: str | None = None) -> None:
+    """Olvida fichas: todas, las de una colección o la de un ISIN concreto."""
+    with _lock:
+        for clave in list(_fichas):
+            if (coleccion is None or clave[0] == coleccion) and (isin is None or clave[1] == isin):
+                del _fichas[clave]
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def obtener_detalle(db, coleccion: str, isin: str, secciones: list[str] | None = None) -> dict | None:
+    """
+    Ficha del activo con los campos de las secciones pedidas (todas si
+    None). Solo se consulta Mongo por las secciones que faltan en caché, en
+    un único find_one proyectado. None si el ISIN no existe.
+    """
+    config = SECCIONES[coleccion]
+    secciones = list(config) if secciones is None else secciones
+    version = version_coleccion(db, coleccion)
+    clave = (coleccion, isin)
+
+    with _lock:
+        ficha = _fichas.get(clave)
+        if ficha and ficha["version"] != version:
+            ficha = None
+        if ficha:
+            _fichas.move_to_end(clave)
+            if ficha["doc"] is None:
+                return None
+            faltan = [s for s in secciones if s not in ficha["secciones"]]
+            if not faltan:
+                return copy.deepcopy(ficha["doc"])
+        else:
+            faltan = secciones
+
+    proyeccion = {"_id": 0, **{campo: 1 for s in faltan for campo in config[s]}}
+    leido = db[coleccion].find_one({"isin": isin}, proyeccion)
+
+    with _lock:
+        ficha = _fichas.get(clave)
+        if not ficha or ficha["version"] != version:
+            ficha = {"version": version, "secciones": set(), "doc": {} if leido is not None else None}
+            _fichas[clave] = ficha
+        if leido is None:
+            ficha["doc"] = None
+        else:
+            if ficha["doc"] is None:
+                ficha["doc"] = {}
+            _fusionar(ficha["doc"], leido)
+            ficha["secciones"].update(faltan)
+        _fichas.move_to_end(clave)
+        while len(_fichas) > MAX_FICHAS:
+            _fichas.popitem(last=False)
+        return copy.deepcopy(ficha["doc"]) if ficha["doc"] is not None else None
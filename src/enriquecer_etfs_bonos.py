@@ -1,9 +1,11 @@
-import mstarpy as ms
-import time
-import random
+import sys
+import os
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from src import replay
+
 # Configuración MongoDB
 MONGO_CONFIG = {
     'host': 'localhost',
@@ -15,6 +17,25 @@ MONGO_CONFIG = {
     'auth_source': 'admin'
 }
 
+def obtener_datos_bonos(isin):
+    """Datos de duración y vencimiento de Morningstar para un ISIN (None si no hay)"""
+    f = replay.Funds(isin)
+    fis = f.fixedIncomeStyle()
+
+    if not fis or 'fund' not in fis:
+        return None
+
+    info = fis['fund']
+    return {
+        "duracion_efectiva": info.get("avgEffectiveDuration"),
+        "duracion_modificada": info.get("modifiedDuration"),
+        "vencimiento_efectivo": info.get("avgEffectiveMaturity"),
+        "cupon_medio": info.get("avgCoupon"),
+        "yield_to_maturity": info.get("yieldToMaturity"),
+        "calidad_crediticia": info.get("avgCreditQualityName"),
+        "fecha_datos_bonos": info.get("portfolioDate")
+    }
+
 def enrich_bond_data():
     """Enriquece los ETFs de renta fija con datos de duración y vencimiento de Morningstar"""
     try:
@@ -44,22 +65,9 @@ def enrich_bond_data():
             print(f"[{count+1}/{len(etfs)}] Procesando {isin} - {etf.get('nombreEtf')}...")
             
             try:
-                # Inicializar mstarpy
-                f = ms.Funds(isin)
-                fis = f.fixedIncomeStyle()
+                bond_data = obtener_datos_bonos(isin)
                 
-                if fis and 'fund' in fis:
-                    info = fis['fund']
-                    bond_data = {
-                        "duracion_efectiva": info.get("avgEffectiveDuration"),
-                        "duracion_modificada": info.get("modifiedDuration"),
-                        "vencimiento_efectivo": info.get("avgEffectiveMaturity"),
-                        "cupon_medio": info.get("avgCoupon"),
-                        "yield_to_maturity": info.get("yieldToMaturity"),
-                        "calidad_crediticia": info.get("avgCreditQualityName"),
-                        "fecha_datos_bonos": info.get("portfolioDate")
-                    }
-                    
+                if bond_data:
                     collection.update_one({"_id": etf["_id"]}, {"$set": bond_data})
                     print(f"   ✅ Datos de bonos actualizados (Duración: {bond_data['duracion_efectiva']})")
                 else:
@@ -70,10 +78,10 @@ def enrich_bond_data():
             except Exception as e:
                 print(f"   ❌ Error con mstarpy para {isin}: {e}")
                 # En caso de error de conexión o API, podríamos esperar un poco más
-                time.sleep(2)
+                replay.pausa(2, 2)
             
             # Delay para no saturar la API de Morningstar
-            time.sleep(random.uniform(1, 3))
+            replay.pausa(1, 3)
             count += 1
                 
         client.close()
@@ -1,10 +1,14 @@
-import requests
 from bs4 import BeautifulSoup
 import time
 import random
+import sys
+import os
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from src import http_cliente, replay
+
 # Configuración MongoDB
 MONGO_CONFIG = {
     'host': 'localhost',
@@ -33,7 +37,7 @@ def scrape_justetf_details(isin):
     url = f"https://www.justetf.com/en/etf-profile.html?isin={isin}"
     
     try:
-        response = requests.get(url, headers=get_headers(), timeout=15)
+        response = http_cliente.obtener(url, headers=get_headers(), timeout=15)
         if response.status_code != 200:
             return None
 
@@ -154,7 +158,7 @@ def main():
                 print(f"   ⚠️ No se pudieron obtener datos para {isin}")
             
             # Delay aleatorio para evitar baneos (JustETF es sensible)
-            time.sleep(random.uniform(3, 7))
+            replay.pausa(3, 7)
             count += 1
                 
         client.close()
@@ -0,0 +1,236 @@
+"""
+Barrido de escenarios del constructor automático de carteras de fondos.
+
+En lugar de probar perfil × horizonte × región uno a uno (cada clic vuelve a
+consultar Mongo y a ordenar), se carga el universo de renta fija una sola vez
+y se calcula la propuesta de cada combinación reutilizando todo lo que no
+cambia entre ellas:
+  - por región: filtro en memoria, códigos de tramo y covarianzas;
+  - por región y horizonte: movimiento de tipos a la duración de cada fondo
+    (curva interpolada en caché) y rentabilidad esperada por activo;
+  - por escenario: solo la optimización (milisegundos con Σ diagonal,
+    décimas de segundo con Σ completa).
+Las métricas consolidadas se evalúan en lote (todas las carteras de una
+región y horizonte en una sola llamada al motor).
+
+También contiene la lógica de perfiles compartida con la página (pesos por
+defecto y pesos dinámicos del perfil Atrevido).
+"""
+
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.clasificacion_region import REGION_GLOBAL, clasificar
+from src.covarianzas import matriz_covarianzas
+from src.motor_rentabilidad import codificar_tramos, evaluar_carteras, rentabilidad_activos, TRAMOS
+from src.optimizador import optimizar_cartera
+from src.servicio_curvas import obtener_curva, obtener_movimiento_tipos
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+PERFILES = ("Conservador", "Moderado", "Atrevido")
+HORIZONTES = (1, 2, 3, 4, 5)
+REGIONES = ("EUR", "US", "JP", "CN", "GLOBAL")
+
+PESOS_DEFAULT = {
+    "Conservador": {"very_short": 50, "short": 40, "intermediate": 10, "long": 0},
+    "Moderado": {"very_short": 20, "short": 30, "intermediate": 40, "long": 10}
+}
+
+COLUMNAS_FONDO = {
+    "duration.yield_to_maturity": "ytm",
+    "duration.avg_effective_duration": "duracion",
+    "riesgo.for3Year.volatility": "vol",
+    "rentabilidad.historica.y1": "rent1y",
+}
+
+
+# ============================================================
+# PERFILES
+# ============================================================
+
+def predecir_movimiento_tipos(curve, horizon_years=3):
+    if not curve: return {}
+    ahora_anno = datetime.now().year
+    target_year = str(ahora_anno + min(horizon_years, 3))
+    movimientos = {}
+    for p in curve.get("plazos", []):
+        plazo = p["plazo"]
+        actual = p["rendimiento_actual"]
+        proyectado = p.get("previsiones", {}).get(target_year)
+        if proyectado is not None:
+            movimientos[plazo] = {"actual": actual, "proyectado": proyectado, "delta": actual - proyectado}
+    mapeo = {
+        "very_short": movimientos.get("3M") or movimientos.get("6M"),
+        "short": movimientos.get("2Y") or movimientos.get("1Y"),
+        "intermediate": movimientos.get("5Y"),
+        "long": movimientos.get("10Y") or movimientos.get("30Y")
+    }
+    return {k: v for k, v in mapeo.items() if v}
+
+
+def get_dynamic_atrevido_weights(movimientos):
+    duraciones_standard = {"very_short": 0.2, "short": 2.0, "intermediate": 4.0, "long": 10.0}
+    scores = {}
+    for tramo, m in movimientos.items():
+        dur = duraciones_standard.get(tramo, 1.0)
+        scores[tramo] = m["actual"] + (m["delta"] * dur)
+    sorted_tramos = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    pesos = {t: 0 for t in ["very_short", "short", "intermediate", "long"]}
+    pesos[sorted_tramos[0][0]] = 50
+    if len(sorted_tramos) > 1: pesos[sorted_tramos[1][0]] = 30
+    if len(sorted_tramos) > 2: pesos[sorted_tramos[2][0]] = 20
+    return pesos
+
+
+def pesos_perfil(perfil: str, movimientos: dict) -> dict[str, float] | None:
+    """Pesos por tramo (tanto por uno) de un perfil; None si Atrevido no tiene previsiones."""
+    if perfil == "Atrevido":
+        if not movimientos:
+            return None
+        pesos = get_dynamic_atrevido_weights(movimientos)
+    else:
+        pesos = PESOS_DEFAULT[perfil]
+    return {t: p / 100 for t, p in pesos.items()}
+
+
+# ============================================================
+# UNIVERSO
+# ============================================================
+
+def cargar_universo(db) -> pd.DataFrame:
+    """Todos los fondos de renta fija con tramo, en una sola consulta."""
+    fondos_raw = list(db["fondos"].find({"tramo_rf": {"$in": list(TRAMOS)}}, {
+        "_id": 0, "isin": 1, "nombre": 1, "tramo_rf": 1, "categoria": 1, "regiones": 1,
+        **{campo: 1 for campo in COLUMNAS_FONDO},
+    }))
+    df = pd.json_normalize(fondos_raw)
+    if df.empty:
+        return df
+    df = df.rename(columns=COLUMNAS_FONDO)
+    for col in list(COLUMNAS_FONDO.values()) + ["categoria"]:
+        if col not in df.columns:
+            df[col] = 0.0 if col != "categoria" else ""
+    for col in COLUMNAS_FONDO.values():
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    df["categoria"] = df["categoria"].fillna("")
+    # Documentos aún sin etiquetar: misma clasificación que en la ingesta
+    if "regiones" not in df.columns:
+        df["regiones"] = None
+    pendientes = df["regiones"].isna()
+    df.loc[pendientes, "regiones"] = pd.Series(
+        [clasificar(c)["regiones"] for c in df.loc[pendientes, "categoria"]],
+        index=df.index[pendientes], dtype=object,
+    )
+    return df
+
+
+def filtrar_region(universo: pd.DataFrame, region: str) -> pd.DataFrame:
+    """Mismo filtro por etiqueta de región que la consulta de la página, aplicado en memoria."""
+    if region == REGION_GLOBAL or universo.empty:
+        return universo.reset_index(drop=True)
+    mascara = universo["regiones"].map(lambda regiones: region in regiones)
+    return universo[mascara].reset_index(drop=True)
+
+
+# ============================================================
+# BARRIDO
+# ============================================================
+
+def barrer_escenarios(
+    db,
+    universo: pd.DataFrame,
+    perfiles=PERFILES,
+    horizontes=HORIZONTES,
+    regiones=REGIONES,
+    n_fondos: int = 10,
+    m_fondos: int = 2,
+    criterio_ytm: bool = True,
+    restricciones: dict | None = None,
+    optimizar_con_covarianzas: bool = False,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Propuesta y métricas de cada combinación perfil × horizonte × región.
+
+    restricciones: vol_max, dur_min, dur_max, peso_max (como en optimizar_cartera).
+    optimizar_con_covarianzas: optimizar con Σ completa (históricos NAV),
+    como 'Generar Propuesta' en la página. Cuesta unas diez veces más que Σ
+    diagonal (con 1000 candidatos, ~15-140 ms por escenario frente a
+    ~2-15 ms, según haya restricciones de volatilidad y duración): en un
+    barrido de decenas de escenarios son segundos frente a décimas, así que
+    el barrido se hace con False y solo la combinación elegida se recalcula
+    con True. La volatilidad de la tabla usa en ambos casos las correlaciones
+    si hay históricos.
+    Devuelve (tabla resumen, propuestas) con propuestas[(perfil, horizonte,
+    región)] = DataFrame de la cartera con su columna "peso".
+    """
+    restricciones = restricciones or {}
+    filas, propuestas = [], {}
+
+    for region in regiones:
+        df = filtrar_region(universo, region)
+        if df.empty:
+            continue
+        curva = obtener_curva(db, region)
+        codigos = codificar_tramos(df["tramo_rf"])
+        cov = matriz_covarianzas(db, df["isin"].tolist(), vol_respaldo=df["vol"].to_numpy())
+        covarianza = cov["covarianza"] if cov["con_historico"].any() else None
+
+        for horizonte in horizontes:
+            delta = obtener_movimiento_tipos(db, region, df["duracion"].to_numpy(), horizonte)
+            if criterio_ytm:
+                rent_esperada = rentabilidad_activos(df["ytm"], df["duracion"], delta, horizonte)
+            else:
+                rent_esperada = df["rent1y"].to_numpy()
+            movimientos = predecir_movimiento_tipos(curva, horizonte)
+
+            claves, matriz_pesos, tiempos = [], [], []
+            for perfil in perfiles:
+                pesos = pesos_perfil(perfil, movimientos)
+                if pesos is None:
+                    continue
+                inicio = time.perf_counter()
+                try:
+                    resultado = optimizar_cartera(
+                        rent_esperada, df["vol"], df["duracion"], codigos, pesos,
+                        max_activos=n_fondos, max_por_tramo=m_fondos,
+                        covarianza=covarianza if optimizar_con_covarianzas else None,
+                        **restricciones,
+                    )
+                except ValueError:
+                    continue
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                claves.append((perfil, horizonte, region))
+                matriz_pesos.append(resultado["pesos"])
+
+                cartera = df.iloc[resultado["indices"]].copy()
+                cartera["peso"] = resultado["pesos"][resultado["indices"]]
+                cartera["delta_tipos"] = delta[resultado["indices"]]
+                propuestas[claves[-1]] = cartera
+
+            if not claves:
+                continue
+            # Métricas de todas las carteras de esta región y horizonte en lote
+            metricas = evaluar_carteras(
+                np.array(matriz_pesos), df["ytm"], df["duracion"], horizonte,
+                movimiento=delta, vol=df["vol"], codigos_tramo=codigos, covarianza=covarianza,
+            )
+            for k, (perfil, h, reg) in enumerate(claves):
+                filas.append({
+                    "perfil": perfil, "horizonte": h, "region": reg,
+                    "n_fondos": int(np.count_nonzero(matriz_pesos[k])),
+                    "rent": float(metricas["rent"][k]),
+                    "ytm": float(metricas["ytm"][k]),
+                    "vol": float(metricas["vol"][k]),
+                    "dur": float(metricas["dur"][k]),
+                    "break_even": float(metricas["break_even"][k]),
+                    **{f"peso_{t}": float(metricas["pesos_tramo"][k][i]) for i, t in enumerate(TRAMOS)},
+                    "tiempo_ms": tiempos[k],
+                })
+
+    return pd.DataFrame(filas), propuestas
@@ -0,0 +1,101 @@
+"""
+Extracción ligera de tablas HTML para los scrapers de curvas y tipos.
+
+En lugar de construir el árbol completo de BeautifulSoup y recorrer todas
+las tablas/filas/celdas, se usa XPath de lxml directamente sobre las filas
+con celdas de datos. Si lxml no estuviera disponible se recurre a
+BeautifulSoup con un SoupStrainer que solo parsea las etiquetas <table>.
+"""
+
+import re
+
+try:
+    from lxml import html as lxml_html
+    _LXML_DISPONIBLE = True
+except ImportError:
+    _LXML_DISPONIBLE = False
+
+
+# ============================================================
+# EXPRESIONES PRECOMPILADAS
+# ============================================================
+
+# Un único patrón para todos los plazos: "3 months", "6M", "1 year", "10Y"...
+# El orden de la alternativa numérica evita que "10y" se lea como "1y".
+RE_PLAZO = re.compile(r"\b(?:(?P<meses>3|6)\s*m|(?P<anos>10|30|1|2|5)\s*y)", re.IGNORECASE)
+
+RE_PORCENTAJE = re.compile(r"(-?\d+[\.,]\d+)\s*%")
+RE_NUMERO = re.compile(r"(-?\d+[\.,]\d+)")
+
+
+def normalizar_plazo(texto: str) -> str | None:
+    """Normaliza el texto de un plazo ("10 years" → "10Y") o None si no es un plazo."""
+    m = RE_PLAZO.search(texto)
+    if not m:
+        return None
+    if m.group("meses"):
+        return m.group("meses") + "M"
+    return m.group("anos") + "Y"
+
+
+def extraer_porcentaje(texto: str, solo_con_simbolo: bool = False) -> float | None:
+    """Extrae un valor como "4.500%", "2,15 %" o "-0.10" de un texto."""
+    m = RE_PORCENTAJE.search(texto)
+    if not m and not solo_con_simbolo:
+        m = RE_NUMERO.search(texto)
+    if m:
+        return float(m.group(1).replace(",", "."))
+    return None
+
+
+# ============================================================
+# FILAS DE TABLAS
+# ============================================================
+
+def _xpath_tablas(clase: str | None) -> str:
+    if clase:
+        return f"//table[contains(concat(' ', normalize-space(@class), ' '), ' {clase} ')]"
+    return "//table"
+
+
+def filas_tablas(contenido: bytes | str, clase: str | None = None) -> list[list[str]]:
+    """
+    Devuelve el texto de las celdas <td> de cada fila de las tablas del
+    documento (solo filas con al menos una celda de datos). Con 'clase'
+    se limita a las tablas que tengan esa clase CSS.
+    """
+    if not contenido:
+        return []
+
+    if _LXML_DISPONIBLE:
+        arbol = lxml_html.fromstring(contenido)
+        filas = []
+        for tr in arbol.xpath(_xpath_tablas(clase) + "//tr[td]"):
+            filas.append([td.text_content().strip() for td in tr.xpath("./td")])
+        return filas
+
+    from bs4 import BeautifulSoup, SoupStrainer
+    filtro = SoupStrainer("table", class_=clase) if clase else SoupStrainer("table")
+    soup = BeautifulSoup(contenido, "html.parser", parse_only=filtro)
+    return [
+        [td.get_text(strip=True) for td in tr.find_all("td")]
+        for tr in soup.find_all("tr")
+        if tr.find("td")
+    ]
+
+
+def texto_documento(contenido: bytes | str) -> str:
+    """Texto visible del documento (sin <script> ni <style>)."""
+    if not contenido:
+        return ""
+    if _LXML_DISPONIBLE:
+        arbol = lxml_html.fromstring(contenido)
+        for nodo in arbol.xpath("//script|//style"):
+            nodo.drop_tree()
+        return arbol.text_content()
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(contenido, "html.parser")
+    for nodo in soup(["script", "style"]):
+        nodo.decompose()
+    return soup.get_text()
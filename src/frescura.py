@@ -0,0 +1,190 @@
+"""
+Capa de frescura "stale-while-revalidate" para tipos de interés y curvas.
+
+Las páginas leen siempre el último snapshot guardado en Mongo (una lectura
+indexada por _id) y nunca esperan a la red:
+  - Si el snapshot es más antiguo que su edad máxima, se lanza en segundo
+    plano la misma tarea que usa el planificador (con su lease en Mongo, así
+    que no se solapa con el demonio ni con otras sesiones).
+  - Un solo refresco por fuente y proceso (single-flight).
+  - Cada refresco que escribe datos ("ok") incrementa una versión en
+    memoria; la página la sondea desde session_state con un st.fragment y se
+    recarga al cambiar. Los fallos y los leases ocupados solo quedan en el
+    resultado, y el refresco automático espera ESPERA_REINTENTO antes de
+    volver a intentarlo (si no, la recarga lo relanzaría cada pocos segundos).
+"""
+
+import threading
+from datetime import datetime, timedelta, UTC
+
+from src import planificador
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+FUENTES = {
+    "tipos": {
+        "coleccion": "tipos_interes",
+        "edad_maxima": timedelta(hours=12),
+        "campos_fecha": ("fecha_consulta",),
+    },
+    "curvas": {
+        "coleccion": "curvas_tipos",
+        "edad_maxima": timedelta(hours=4),
+        # Un refresco sin cambios solo actualiza la fecha de verificación
+        "campos_fecha": ("fecha_ultima_verificacion", "fecha_consulta"),
+    },
+}
+
+# Cada cuántos segundos sondea la página si han llegado datos nuevos
+INTERVALO_SONDEO_S = 5
+
+# Tras un fallo o un lease ocupado, cuánto espera el refresco automático
+ESPERA_REINTENTO = timedelta(minutes=5)
+
+_lock = threading.Lock()
+_estado = {
+    fuente: {"hilo": None, "version": 0, "resultado": None, "ultimo_intento": None}
+    for fuente in FUENTES
+}
+
+
+# ============================================================
+# UTILIDADES
+# ============================================================
+
+def _como_utc(fecha: datetime | None) -> datetime | None:
+    if fecha is None:
+        return None
+    # pymongo devuelve datetimes naive en UTC
+    return fecha if fecha.tzinfo else fecha.replace(tzinfo=UTC)
+
+
+def fecha_snapshot(doc: dict | None, fuente: str) -> datetime | None:
+    """Fecha más reciente en la que se confirmó el contenido del snapshot."""
+    if not doc:
+        return None
+    fechas = [_como_utc(doc.get(c)) for c in FUENTES[fuente]["campos_fecha"] if doc.get(c)]
+    return max(fechas) if fechas else None
+
+
+def describir_edad(edad: timedelta | None) -> str:
+    """'hace 5 min', 'hace 3 h', 'hace 2 días'."""
+    if edad is None:
+        return "sin datos"
+    minutos = int(edad.total_seconds() // 60)
+    if minutos < 1:
+        return "hace unos segundos"
+    if minutos < 60:
+        return f"hace {minutos} min"
+    if minutos < 60 * 48:
+        return f"hace {minutos // 60} h"
+    return f"hace {minutos // (60 * 24)} días"
+
+
+# ============================================================
+# REFRESCO EN SEGUNDO PLANO
+# ============================================================
+
+def _refrescar(db, fuente: str) -> None:
+    try:
+        resultado = planificador.ejecutar_tarea(db, fuente)
+        if resultado is None:
+            resultado = {"estado": "en_curso", "detalle": "Otro proceso está actualizando esta fuente"}
+    except Exception as e:
+        resultado = {"estado": "error", "detalle": f"{type(e).__name__}: {e}"}
+    with _lock:
+        _estado[fuente]["resultado"] = resultado
+        if resultado.get("estado") == "ok":
+            _estado[fuente]["version"] += 1
+        _estado[fuente]["hilo"] = None
+
+
+def refrescar_en_segundo_plano(db, fuente: str) -> bool:
+    """Lanza el refresco de la fuente si no hay uno en curso. True si lo ha lanzado."""
+    with _lock:
+        hilo = _estado[fuente]["hilo"]
+        if hilo is not None and hilo.is_alive():
+            return False
+        hilo = threading.Thread(target=_refrescar, args=(db, fuente), daemon=True,
+                                name=f"frescura-{fuente}")
+        _estado[fuente]["hilo"] = hilo
+        _estado[fuente]["ultimo_intento"] = datetime.now(UTC)
+        hilo.start()
+        return True
+
+
+def en_espera(fuente: str) -> bool:
+    """True si el último refresco falló (o halló el lease ocupado) hace menos de ESPERA_REINTENTO."""
+    with _lock:
+        resultado = _estado[fuente]["resultado"]
+        intento = _estado[fuente]["ultimo_intento"]
+    if not resultado or resultado.get("estado") == "ok" or intento is None:
+        return False
+    return datetime.now(UTC) - intento < ESPERA_REINTENTO
+
+
+def en_curso(fuente: str) -> bool:
+    with _lock:
+        hilo = _estado[fuente]["hilo"]
+        return hilo is not None and hilo.is_alive()
+
+
+def version(fuente: str) -> int:
+    with _lock:
+        return _estado[fuente]["version"]
+
+
+def ultimo_resultado(fuente: str) -> dict | None:
+    """Resultado del último refresco lanzado desde este proceso."""
+    with _lock:
+        return _estado[fuente]["resultado"]
+
+
+# ============================================================
+# API PARA LAS PÁGINAS
+# ============================================================
+
+def obtener_snapshot(db, fuente: str) -> dict:
+    """
+    Último snapshot guardado + metadatos de frescura. Si está obsoleto
+    dispara un refresco asíncrono (salvo que el anterior fallara hace menos
+    de ESPERA_REINTENTO) y devuelve igualmente el snapshot actual.
+    """
+    config = FUENTES[fuente]
+    doc = db[config["coleccion"]].find_one({}, sort=[("_id", -1)])
+
+    fecha = fecha_snapshot(doc, fuente)
+    edad = datetime.now(UTC) - fecha if fecha else None
+    obsoleto = edad is None or edad > config["edad_maxima"]
+    if obsoleto and not en_espera(fuente):
+        refrescar_en_segundo_plano(db, fuente)
+
+    return {
+        "doc": doc,
+        "fecha": fecha,
+        "edad": edad,
+        "obsoleto": obsoleto,
+        "refrescando": en_curso(fuente),
+        "marca": (version(fuente), fecha),
+    }
+
+
+def hay_datos_nuevos(db, fuente: str, marca: tuple, consultar_mongo: bool = False) -> bool:
+    """
+    Compara la marca del snapshot mostrado con el estado actual. Sin
+    consultar_mongo solo mira la versión en memoria (coste cero); con él
+    también detecta escrituras de otros procesos (planificador) con una
+    lectura de la cabecera del último documento.
+    """
+    version_mostrada, fecha_mostrada = marca
+    if version(fuente) != version_mostrada:
+        return True
+    if not consultar_mongo:
+        return False
+
+    config = FUENTES[fuente]
+    proyeccion = {c: 1 for c in config["campos_fecha"]}
+    cabecera = db[config["coleccion"]].find_one({}, proyeccion, sort=[("_id", -1)])
+    return fecha_snapshot(cabecera, fuente) != fecha_mostrada
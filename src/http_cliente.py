@@ -0,0 +1,263 @@
+"""
+Capa HTTP compartida por todos los scrapers y clientes de API.
+
+ - Una requests.Session por host con pool de conexiones (keep-alive) y
+   reintentos ante errores transitorios del servidor.
+ - Negociación de compresión: gzip/deflate, y br si 'brotli' está instalado.
+ - Peticiones condicionales (ETag / Last-Modified) respaldadas por una caché
+   local de respuestas: si el servidor responde 304 se devuelve el cuerpo
+   guardado sin volver a transferirlo. Solo se guardan las respuestas con
+   validador, y la caché se poda por edad y tamaño (MAX_EDAD_CACHE_S,
+   MAX_BYTES_CACHE) como mucho una vez cada INTERVALO_PODA_S.
+ - Grabación / reproducción offline de respuestas (ver src/replay.py); en
+   esos modos no se usa la caché local.
+
+Uso:
+    from src import http_cliente
+    resp = http_cliente.obtener(url, params=..., headers=..., timeout=15)
+    resp.raise_for_status()
+    resp.from_cache   # True si el cuerpo viene de la caché local (304)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, UTC
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from src import replay
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+DIRECTORIO_CACHE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets", "cache", "http",
+)
+MAX_EDAD_CACHE_S = 30 * 24 * 3600     # entradas sin usar en 30 días
+MAX_BYTES_CACHE = 200 * 1024 * 1024
+INTERVALO_PODA_S = 3600
+
+try:
+    import brotli  # noqa: F401  (solo se comprueba que existe)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+POOL_MAXSIZE = 8
+REINTENTOS = Retry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=("GET", "HEAD"),
+)
+
+_sesiones: dict[str, requests.Session] = {}
+_lock = threading.Lock()
+_ultima_poda = {"instante": None}
+
+
+# ============================================================
+# SESIONES POR HOST
+# ============================================================
+
+def obtener_sesion(url: str) -> requests.Session:
+    """Devuelve (creándola si hace falta) la sesión asociada al host de la URL."""
+    host = urlsplit(url).netloc
+    with _lock:
+        sesion = _sesiones.get(host)
+        if sesion is None:
+            sesion = requests.Session()
+            adaptador = replay.AdaptadorReplay(
+                pool_connections=1,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=REINTENTOS,
+            )
+            sesion.mount("https://", adaptador)
+            sesion.mount("http://", adaptador)
+            sesion.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _sesiones[host] = sesion
+    return sesion
+
+
+def cerrar_sesiones() -> None:
+    """Cierra todas las sesiones abiertas (útil en scripts y procesos largos)."""
+    with _lock:
+        for sesion in _sesiones.values():
+            sesion.close()
+        _sesiones.clear()
+
+
+# ============================================================
+# CACHÉ LOCAL DE RESPUESTAS
+# ============================================================
+
+def _clave_cache(url: str, params: dict | None) -> str:
+    base = url + "?" + json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def _rutas_cache(clave: str) -> tuple[str, str]:
+    base = os.path.join(DIRECTORIO_CACHE, clave[:2], clave)
+    return base + ".json", base + ".body"
+
+
+def _leer_cache(clave: str) -> tuple[dict | None, bytes | None]:
+    ruta_meta, ruta_cuerpo = _rutas_cache(clave)
+    try:
+        with open(ruta_meta, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(ruta_cuerpo, "rb") as f:
+            cuerpo = f.read()
+        return meta, cuerpo
+    except (OSError, ValueError):
+        return None, None
+
+
+def _guardar_cache(clave: str, url: str, resp: requests.Response) -> None:
+    """Guarda cuerpo + validadores. La URL se guarda sin parámetros (pueden llevar claves)."""
+    ruta_meta, ruta_cuerpo = _rutas_cache(clave)
+    meta = {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "content_type": resp.headers.get("Content-Type"),
+        "encoding": resp.encoding,
+        "fecha": datetime.now(UTC).isoformat(),
+    }
+    try:
+        os.makedirs(os.path.dirname(ruta_meta), exist_ok=True)
+        # Escribir primero el cuerpo: una meta sin cuerpo nunca se considera válida
+        with open(ruta_cuerpo + ".tmp", "wb") as f:
+            f.write(resp.content)
+        os.replace(ruta_cuerpo + ".tmp", ruta_cuerpo)
+        with open(ruta_meta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(ruta_meta + ".tmp", ruta_meta)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar la caché HTTP de {url}: {e}")
+
+
+def _borrar_cache(clave: str) -> None:
+    for ruta in _rutas_cache(clave):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _podar_cache() -> None:
+    """
+    Borra las entradas sin usar en MAX_EDAD_CACHE_S y, si aun así la caché
+    pasa de MAX_BYTES_CACHE, las menos usadas recientemente (la fecha de
+    modificación del cuerpo se renueva en cada 304).
+    """
+    ahora = time.monotonic()
+    with _lock:
+        if _ultima_poda["instante"] is not None and ahora - _ultima_poda["instante"] < INTERVALO_PODA_S:
+            return
+        _ultima_poda["instante"] = ahora
+
+    entradas = []   # (último uso, bytes, clave)
+    for directorio, _, ficheros in os.walk(DIRECTORIO_CACHE):
+        for fichero in ficheros:
+            if not fichero.endswith(".body"):
+                continue
+            ruta = os.path.join(directorio, fichero)
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, fichero[:-len(".body")]))
+
+    limite = time.time() - MAX_EDAD_CACHE_S
+    entradas.sort()
+    total = sum(tamano for _, tamano, _ in entradas)
+    for uso, tamano, clave in entradas:
+        if uso >= limite and total <= MAX_BYTES_CACHE:
+            break
+        _borrar_cache(clave)
+        total -= tamano
+
+
+def _respuesta_desde_cache(resp_304: requests.Response, meta: dict, cuerpo: bytes) -> requests.Response:
+    """Construye una respuesta 200 equivalente a partir del cuerpo cacheado."""
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.reason = "OK (cache)"
+    resp._content = cuerpo
+    resp.url = resp_304.url
+    resp.request = resp_304.request
+    resp.headers = CaseInsensitiveDict(resp_304.headers)
+    if meta.get("content_type"):
+        resp.headers["Content-Type"] = meta["content_type"]
+    resp.encoding = meta.get("encoding")
+    resp.elapsed = resp_304.elapsed
+    resp.from_cache = True
+    return resp
+
+
+def cabeceras_condicionales(meta: dict | None) -> dict:
+    """Cabeceras If-None-Match / If-Modified-Since a partir de la meta guardada."""
+    cabeceras = {}
+    if meta:
+        if meta.get("etag"):
+            cabeceras["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            cabeceras["If-Modified-Since"] = meta["last_modified"]
+    return cabeceras
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def obtener(
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+    timeout: float = 15,
+    usar_cache: bool = True,
+) -> requests.Response:
+    """
+    GET con sesión por host, compresión y petición condicional.
+
+    Si existe una respuesta cacheada se envían sus validadores; ante un 304
+    se devuelve el cuerpo local como si fuera un 200 (resp.from_cache = True).
+    Las respuestas 200 con ETag o Last-Modified se guardan en la caché
+    local; sin validador no habría forma de reutilizarlas.
+    """
+    sesion = obtener_sesion(url)
+    cabeceras = dict(headers or {})
+
+    clave = meta = cuerpo = None
+    usar_cache = usar_cache and replay.modo() == "live"
+    if usar_cache:
+        clave = _clave_cache(url, params)
+        meta, cuerpo = _leer_cache(clave)
+        cabeceras.update(cabeceras_condicionales(meta))
+
+    resp = sesion.get(url, params=params, headers=cabeceras, timeout=timeout)
+
+    if resp.status_code == 304 and cuerpo is not None:
+        try:
+            os.utime(_rutas_cache(clave)[1])   # último uso, para la poda
+        except OSError:
+            pass
+        return _respuesta_desde_cache(resp, meta, cuerpo)
+
+    resp.from_cache = False
+    if usar_cache and resp.status_code == 200:
+        if resp.headers.get("ETag") or resp.headers.get("Last-Modified"):
+            _guardar_cache(clave, url, resp)
+            _podar_cache()
+        elif meta is not None:
+            _borrar_cache(clave)   # el recurso ya no trae validadores
+    return resp
@@ -1,8 +1,14 @@
 import json
 import os
-from pymongo import MongoClient
+import sys
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import ConnectionFailure
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from src.cache_datos import marcar_cambio
+from src.clasificacion_region import asegurar_indices, clasificar_documento
+from src.percentiles_categoria import recalcular_percentiles
+
 # Configuración MongoDB
 MONGO_CONFIG = {
     'host': 'localhost',
@@ -14,6 +20,19 @@ MONGO_CONFIG = {
     'auth_source': 'admin'
 }
 
+def eliminar_duplicados(collection) -> int:
+    """Deja un solo documento por ISIN (el primero insertado). Retorna cuántos se borran."""
+    sobrantes = []
+    for grupo in collection.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$isin", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}, "_id": {"$ne": None}}},
+    ]):
+        sobrantes.extend(grupo["ids"][1:])
+    if sobrantes:
+        collection.delete_many({"_id": {"$in": sobrantes}})
+    return len(sobrantes)
+
 def importar_etfs():
     # Rutas de los archivos JSON
     files = [
@@ -53,9 +72,8 @@ def importar_etfs():
         db = client[MONGO_CONFIG['database']]
         collection = db[MONGO_CONFIG['collection']]
         
-        # Opcional: Limpiar la colección antes de insertar para evitar duplicados si se vuelve a ejecutar
-        # Por ahora, simplemente insertamos como se pidió "crear una colección"
-        # Si ya existe, insertaremos a continuación.
+        # Se inserta o actualiza por ISIN, así que reimportar no duplica ETFs
+        # (los campos añadidos por los enriquecedores se conservan)
         
         # Contar documentos actuales
         count_before = collection.count_documents({})
@@ -65,10 +83,21 @@ def importar_etfs():
             # collection.delete_many({})
             # print("🧹 Colección limpiada para carga fresca.")
 
-        # Insertar registros
-        result = collection.insert_many(records_to_insert)
+        # Etiquetas de región/divisa para los filtros del constructor automático
+        for record in records_to_insert:
+            record.update(clasificar_documento(record, "etfs"))
+
+        # Insertar / actualizar registros
+        eliminados = eliminar_duplicados(collection)
+        if eliminados:
+            print(f"🧹 Eliminados {eliminados} documentos duplicados por ISIN.")
+        operaciones = [UpdateOne({"isin": r["isin"]}, {"$set": r}, upsert=True) for r in records_to_insert if r.get("isin")]
+        result = collection.bulk_write(operaciones, ordered=False)
+        asegurar_indices(db, "etfs")
+        marcar_cambio(db, "etfs")
+        recalcular_percentiles(db, "etfs")
         
-        print(f"\n🚀 ¡Éxito! Se han insertado {len(result.inserted_ids)} registros en la colección '{MONGO_CONFIG['collection']}'.")
+        print(f"\n🚀 ¡Éxito! {result.upserted_count} ETFs nuevos y {result.modified_count} actualizados en la colección '{MONGO_CONFIG['collection']}'.")
         print(f"📁 Total en DB: {collection.count_documents({})}")
         
     except ConnectionFailure:
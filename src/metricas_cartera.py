@@ -0,0 +1,112 @@
+"""
+Métricas de activos y totales ponderados de carteras guardadas.
+
+La edición de carteras pedía las métricas activo a activo con find_one y
+documento completo: dos veces por rerun (antes/después) y otra más por el
+tramo de cada fila, unas 3N consultas por pulsación. Aquí:
+  - resolver_metricas trae todos los ISIN que falten con una única consulta
+    $in y proyección estrecha, y devuelve un DataFrame indexado por ISIN
+    (ytm, vol, dur, tramo). La página lo guarda en el estado de edición y
+    solo vuelve a consultar los ISIN que se añaden.
+  - totales_cartera calcula YTM, volatilidad y duración como sumas
+    ponderadas vectorizadas (pesos normalizados a 1, como en el borrador).
+Los campos de ETFs vienen de JustETF como texto ("+3,21%"); se convierten a
+número aquí (0 si no es convertible).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+METRICAS = ["ytm", "vol", "dur"]
+
+FUENTES = {
+    "Fondos": {
+        "coleccion": "fondos",
+        # métrica → campos candidatos, en orden de preferencia
+        "campos": {
+            "ytm": ["duration.yield_to_maturity"],
+            "vol": ["riesgo.for3Year.volatility", "riesgo.for1Year.volatility"],
+            "dur": ["duration.avg_effective_duration"],
+            "tramo": ["tramo_rf"],
+        },
+    },
+    "ETFs": {
+        "coleccion": "etfs",
+        "campos": {
+            "ytm": ["yield_to_maturity"],
+            "vol": ["volatility_3y"],
+            "dur": ["duracion_efectiva"],
+            "tramo": ["tipoEtf"],
+        },
+    },
+}
+
+SIN_TRAMO = "N/A"
+
+
+# ============================================================
+# RESOLUCIÓN
+# ============================================================
+
+def _a_numero(serie: pd.Series) -> pd.Series:
+    """Texto tipo "+3,21%" o número → float (0 si falta o no es convertible)."""
+    texto = serie.astype(str).str.replace("%", "", regex=False).str.replace("+", "", regex=False)
+    texto = texto.str.replace(",", ".", regex=False).str.strip()
+    return pd.to_numeric(texto, errors="coerce").fillna(0.0)
+
+
+def _vacio(isins: list[str]) -> pd.DataFrame:
+    df = pd.DataFrame(0.0, index=pd.Index(isins, name="isin"), columns=METRICAS)
+    df["tramo"] = SIN_TRAMO
+    return df
+
+
+def resolver_metricas(db, tipo: str, isins, conocidas: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Métricas por ISIN ('tipo' = "Fondos" o "ETFs"). Con 'conocidas' solo se
+    consultan los ISIN que no estén ya en ella, y se devuelve la unión. Los
+    ISIN que no existen en la colección quedan con métricas 0 y tramo N/A.
+    """
+    config = FUENTES[tipo]
+    conocidas = conocidas if conocidas is not None else _vacio([])
+    faltan = list(dict.fromkeys(i for i in isins if i and i not in conocidas.index))
+    if not faltan:
+        return conocidas
+
+    campos = [c for candidatos in config["campos"].values() for c in candidatos]
+    proyeccion = {"_id": 0, "isin": 1, **{c: 1 for c in campos}}
+    docs = list(db[config["coleccion"]].find({"isin": {"$in": faltan}}, proyeccion))
+
+    nuevas = _vacio(faltan)
+    if docs:
+        planos = pd.json_normalize(docs).drop_duplicates("isin").set_index("isin")
+        planos = planos.reindex(index=faltan, columns=campos)
+        for metrica, candidatos in config["campos"].items():
+            if metrica == "tramo":
+                nuevas["tramo"] = planos[candidatos[0]].fillna(SIN_TRAMO).replace("", SIN_TRAMO)
+                continue
+            # Primer candidato no nulo y distinto de 0 (como el "or" encadenado)
+            valores = pd.Series(0.0, index=planos.index)
+            for campo in reversed(candidatos):
+                numero = _a_numero(planos[campo])
+                valores = numero.where(numero != 0, valores)
+            nuevas[metrica] = valores
+
+    return pd.concat([conocidas, nuevas]) if len(conocidas) else nuevas
+
+
+# ============================================================
+# TOTALES
+# ============================================================
+
+def totales_cartera(metricas: pd.DataFrame, activos: list[dict]) -> dict:
+    """YTM, volatilidad y duración ponderadas por peso (normalizado a 1)."""
+    pesos = np.array([a.get("peso", 0) or 0 for a in activos], dtype=float)
+    if not len(pesos) or pesos.sum() == 0:
+        return {"ytm": 0, "vol": 0, "dur": 0}
+    valores = metricas.reindex([a["isin"] for a in activos])[METRICAS].fillna(0.0).to_numpy()
+    return {m: float(v) for m, v in zip(METRICAS, (pesos / pesos.sum()) @ valores)}
@@ -0,0 +1,238 @@
+"""
+Motor de comparación de fondos y ETFs (N instrumentos).
+
+Los comparadores construían la tabla con bucles anidados sobre lambdas de
+métricas, convertían cada celda con get_num y normalizaban el radar con
+bucles de diccionarios, con un máximo de 4 instrumentos (4 colores). Aquí:
+  - cargar_comparacion lee los instrumentos seleccionados con una única
+    consulta $in y proyección estrecha y los deja en una matriz float
+    (instrumentos × métricas, NaN = sin dato), más los campos de texto;
+  - normalización del radar, ranking y percentil dentro de la categoría se
+    calculan por columnas con NumPy, sin trabajo por celda en Python;
+  - en fondos se añaden las medias de categoría que guarda el pipeline en
+    'category_duration' (YTM y duración).
+El percentil de categoría (P = % de la categoría con valor menor o igual)
+se lee del índice precalculado en cada refresco (src.percentiles_categoria),
+que usa percentil_en_categoria sobre toda la colección.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+MAX_INSTRUMENTOS = 30
+
+# Suelo del máximo al normalizar el radar (evita dividir por ~0)
+SUELO_NORMALIZACION = 0.1
+
+# sentido: 1 = mayor es mejor, -1 = menor es mejor, 0 = sin orden (no se rankea)
+COMPARADORES = {
+    "fondos": {
+        "coleccion": "fondos",
+        "nombre": "nombre",
+        "categoria": "categoria",
+        "textos": {
+            "Categoría": "categoria",
+            "Calidad Crediticia": "duration.avg_credit_quality",
+        },
+        "metricas": [
+            {"clave": "ytm", "etiqueta": "Yield (TIR)", "campo": "duration.yield_to_maturity", "sufijo": "%", "sentido": 1, "radar": True},
+            {"clave": "duracion", "etiqueta": "Duración (Años)", "campo": "duration.avg_effective_duration", "sufijo": "", "sentido": 0, "radar": True},
+            {"clave": "vol", "etiqueta": "Volatilidad (3A)", "campo": "riesgo.for3Year.volatility", "sufijo": "%", "sentido": -1, "radar": True},
+            {"clave": "sharpe", "etiqueta": "Sharpe (3A)", "campo": "riesgo.for3Year.sharpe", "sufijo": "", "sentido": 1, "radar": True},
+            {"clave": "rent_1a", "etiqueta": "Rentabilidad 1 Año", "campo": "rentabilidad.historica.1 Year", "sufijo": "%", "sentido": 1, "radar": True},
+        ],
+        "promedio_categoria": {
+            "ytm": "category_duration.yield_to_maturity",
+            "duracion": "category_duration.avg_effective_duration",
+        },
+    },
+    "etfs": {
+        "coleccion": "etfs",
+        "nombre": "nombreEtf",
+        "categoria": "tipoEtf",
+        "textos": {
+            "Categoría": "tipoEtf",
+            "Calidad Crediticia": "calidad_crediticia",
+            "Riesgo (SRI)": "riesgo",
+        },
+        "metricas": [
+            {"clave": "ter", "etiqueta": "Coste (TER)", "campo": "ter", "sufijo": "%", "sentido": -1, "radar": False},
+            {"clave": "ytm", "etiqueta": "Yield to Maturity", "campo": "yield_to_maturity", "sufijo": "%", "sentido": 1, "radar": True},
+            {"clave": "duracion", "etiqueta": "Duración Efectiva", "campo": "duracion_efectiva", "sufijo": " años", "sentido": 0, "radar": True},
+            {"clave": "vol", "etiqueta": "Volatilidad (3A)", "campo": "volatility_3y", "sufijo": "%", "sentido": -1, "radar": True},
+            {"clave": "rent_riesgo", "etiqueta": "Ratio Rent/Riesgo", "campo": "return_per_risk_3y", "sufijo": "", "sentido": 1, "radar": True},
+            {"clave": "rent_1a", "etiqueta": "Rentabilidad 1A", "campo": "yield_1y", "sufijo": "%", "sentido": 1, "radar": True},
+            {"clave": "rent_3a", "etiqueta": "Rentabilidad 3A", "campo": "yield_3y", "sufijo": "%", "sentido": 1, "radar": False},
+            {"clave": "rent_5a", "etiqueta": "Rentabilidad 5A", "campo": "yield_5y", "sufijo": "%", "sentido": 1, "radar": False},
+        ],
+        "promedio_categoria": {},
+    },
+}
+
+
+# ============================================================
+# CARGA
+# ============================================================
+
+def a_numero(serie: pd.Series) -> np.ndarray:
+    """Números o texto tipo "+3,21%" → float (NaN si falta o no es convertible)."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype=float)
+    texto = serie.astype("string").str.replace("%", "", regex=False).str.replace("+", "", regex=False)
+    texto = texto.str.replace(",", ".", regex=False).str.strip()
+    return pd.to_numeric(texto, errors="coerce").to_numpy(dtype=float)
+
+
+def matriz_documentos(docs: list[dict], campos: list[str], indice: list[str] | None = None) -> pd.DataFrame:
+    """Documentos → DataFrame plano con exactamente las columnas 'campos'."""
+    planos = pd.json_normalize(docs) if docs else pd.DataFrame()
+    if indice is not None:
+        planos = planos.drop_duplicates("isin").set_index("isin").reindex(indice) if len(planos) else pd.DataFrame(index=indice)
+    return planos.reindex(columns=campos)
+
+
+def nombres_columnas(comparacion: dict, largo: int = 20) -> list[str]:
+    """Nombres cortos de los instrumentos para columnas; si dos coinciden se añade el ISIN."""
+    cortos = [(n or "Sin Nombre")[:largo] for n in comparacion["nombres"]]
+    repetidos = {c for c in cortos if cortos.count(c) > 1}
+    return [f"{c} ({i})" if c in repetidos else c for c, i in zip(cortos, comparacion["isins"])]
+
+
+def cargar_comparacion(db, tipo: str, isins: list[str]) -> dict:
+    """
+    Instrumentos seleccionados (en el orden de 'isins') en forma matricial:
+    {"tipo", "isins", "nombres", "categorias", "metricas", "valores" (n×m),
+     "textos" (DataFrame), "promedio_categoria" (n×m, NaN si no hay dato)}.
+    """
+    config = COMPARADORES[tipo]
+    metricas = config["metricas"]
+    campos_num = [m["campo"] for m in metricas]
+    campos_prom = [config["promedio_categoria"].get(m["clave"]) for m in metricas]
+    campos = list(dict.fromkeys([config["nombre"], *config["textos"].values(), *campos_num,
+                                 *[c for c in campos_prom if c]]))
+
+    proyeccion = {"_id": 0, "isin": 1, **{c: 1 for c in campos}}
+    docs = list(db[config["coleccion"]].find({"isin": {"$in": list(isins)}}, proyeccion))
+    encontrados = {d["isin"] for d in docs}
+    isins = [i for i in dict.fromkeys(isins) if i in encontrados]
+    planos = matriz_documentos(docs, campos, isins)
+
+    valores = np.column_stack([a_numero(planos[c]) for c in campos_num]) if isins else np.empty((0, len(metricas)))
+    promedio = np.full(valores.shape, np.nan)
+    for j, campo in enumerate(campos_prom):
+        if campo and isins:
+            promedio[:, j] = a_numero(planos[campo])
+
+    textos = pd.DataFrame({etiqueta: planos[campo].fillna("-").astype(str).to_numpy()
+                           for etiqueta, campo in config["textos"].items()}, index=isins)
+    nombres = planos[config["nombre"]].fillna("Sin Nombre").astype(str).tolist()
+
+    return {
+        "tipo": tipo,
+        "isins": isins,
+        "nombres": nombres,
+        "categorias": [c if isinstance(c, str) and c else None for c in planos[config["categoria"]]],
+        "metricas": metricas,
+        "valores": valores,
+        "textos": textos,
+        "promedio_categoria": promedio,
+    }
+
+
+# ============================================================
+# CÁLCULOS VECTORIZADOS
+# ============================================================
+
+def normalizar_radar(valores: np.ndarray) -> np.ndarray:
+    """Cada métrica entre su máximo (con suelo) → escala común del radar; NaN = 0."""
+    limpios = np.nan_to_num(valores, nan=0.0)
+    maximos = np.maximum(limpios.max(axis=0, initial=SUELO_NORMALIZACION), SUELO_NORMALIZACION)
+    return limpios / maximos
+
+
+def ranking(valores: np.ndarray, metricas: list[dict]) -> np.ndarray:
+    """Puesto (1 = mejor) por métrica según su sentido; NaN sin dato o sin orden."""
+    n, m = valores.shape
+    puestos = np.full((n, m), np.nan)
+    sentidos = np.array([met["sentido"] for met in metricas], dtype=float)
+    con_orden = sentidos != 0
+    if not n or not con_orden.any():
+        return puestos
+
+    # Orden descendente del valor con signo; los NaN al final
+    claves = np.where(np.isnan(valores), np.inf, -valores * sentidos)
+    orden = np.argsort(claves, axis=0, kind="stable")
+    filas = np.empty_like(orden)
+    np.put_along_axis(filas, orden, np.arange(n)[:, None].repeat(m, axis=1), axis=0)
+    puestos = (filas + 1).astype(float)
+    puestos[np.isnan(valores)] = np.nan
+    puestos[:, ~con_orden] = np.nan
+    return puestos
+
+
+def percentil_en_categoria(valores: np.ndarray, categorias: list, pares: np.ndarray, categorias_pares: list) -> np.ndarray:
+    """
+    Percentil (0–100) de cada valor dentro de los 'pares' de su misma
+    categoría: % de pares con valor menor o igual. NaN si falta el valor o
+    la categoría no tiene pares con dato.
+    """
+    resultado = np.full(valores.shape, np.nan)
+    categorias = np.asarray(categorias, dtype=object)
+    categorias_pares = np.asarray(categorias_pares, dtype=object)
+    for categoria in set(categorias.tolist()) - {None}:
+        filas = categorias == categoria
+        grupo = pares[categorias_pares == categoria]
+        for j in range(valores.shape[1]):
+            ordenados = np.sort(grupo[:, j][~np.isnan(grupo[:, j])])
+            if not len(ordenados):
+                continue
+            x = valores[filas, j]
+            pct = np.searchsorted(ordenados, x, side="right") / len(ordenados) * 100
+            resultado[filas, j] = np.where(np.isnan(x), np.nan, pct)
+    return resultado
+
+
+# ============================================================
+# TABLAS
+# ============================================================
+
+def _formatear(columna: np.ndarray, sufijo: str, decimales: int = 2) -> np.ndarray:
+    texto = np.char.add(np.char.mod(f"%.{decimales}f", np.nan_to_num(columna)), sufijo)
+    return np.where(np.isnan(columna), "-", texto)
+
+
+def tabla_comparacion(comparacion: dict, posiciones: np.ndarray | None = None) -> pd.DataFrame:
+    """
+    Tabla métricas × instrumentos para mostrar: textos, métricas con su
+    unidad y, si se pasan, los percentiles de categoría ("P85").
+    """
+    columnas = nombres_columnas(comparacion)
+    filas = {etiqueta: comparacion["textos"][etiqueta].to_numpy() for etiqueta in comparacion["textos"].columns}
+    for j, metrica in enumerate(comparacion["metricas"]):
+        filas[metrica["etiqueta"]] = _formatear(comparacion["valores"][:, j], metrica["sufijo"])
+        promedio = comparacion["promedio_categoria"][:, j]
+        if not np.isnan(promedio).all():
+            filas[f"{metrica['etiqueta']} · media categoría"] = _formatear(promedio, metrica["sufijo"])
+        if posiciones is not None and not np.isnan(posiciones[:, j]).all():
+            pct = posiciones[:, j]
+            filas[f"{metrica['etiqueta']} · percentil categoría"] = np.where(
+                np.isnan(pct), "-", np.char.add("P", np.char.mod("%d", np.nan_to_num(pct).round().astype(int))))
+    tabla = pd.DataFrame(filas, index=columnas).T
+    tabla.index.name = "Métrica"
+    return tabla.reset_index()
+
+
+def tabla_ranking(comparacion: dict) -> pd.DataFrame:
+    """Puesto de cada instrumento en cada métrica con orden (1 = mejor)."""
+    puestos = ranking(comparacion["valores"], comparacion["metricas"])
+    columnas = nombres_columnas(comparacion)
+    con_orden = [j for j, m in enumerate(comparacion["metricas"]) if m["sentido"] != 0]
+    tabla = pd.DataFrame(
+        {comparacion["metricas"][j]["etiqueta"]: puestos[:, j] for j in con_orden}, index=columnas
+    ).astype("Int64")
+    tabla["Puesto medio"] = pd.DataFrame(puestos[:, con_orden], index=columnas).mean(axis=1).round(1)
+    return tabla.sort_values("Puesto medio")
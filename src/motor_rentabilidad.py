@@ -0,0 +1,139 @@
+"""
+Motor vectorizado de métricas de cartera para los constructores automáticos.
+
+Trabaja con arrays alineados por activo (peso, YTM, duración, volatilidad,
+tramo) y un vector de movimiento de tipos, y calcula en una sola pasada de
+NumPy la rentabilidad esperada, YTM, duración, volatilidad (con
+correlaciones si se pasa la matriz de covarianzas) y break-even.
+
+Rentabilidad esperada anual de cada activo:
+    ytm + movimiento · duración / horizonte
+donde movimiento = tipo actual − tipo previsto (positivo si bajan los tipos).
+
+Lotes:
+  - pesos (N,)   → una cartera;  pesos (K, N) → K carteras candidatas.
+  - movimiento escalar, (N,) por activo o (S, N) para S escenarios de curva.
+La rentabilidad sale con forma (K, S) cuando hay lotes de carteras y de
+escenarios, de modo que un barrido de escenarios es un único producto matricial.
+"""
+
+import numpy as np
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+TRAMOS = ("very_short", "short", "intermediate", "long")
+INDICE_TRAMO = {t: i for i, t in enumerate(TRAMOS)}
+
+# Por debajo de esta duración el break-even no es significativo
+DURACION_MIN_BREAK_EVEN = 0.1
+BREAK_EVEN_SIN_DURACION = 9.9
+
+
+# ============================================================
+# PREPARACIÓN DE ARRAYS
+# ============================================================
+
+def codificar_tramos(tramos) -> np.ndarray:
+    """Códigos enteros de tramo (índice en TRAMOS; -1 si es desconocido)."""
+    return np.array([INDICE_TRAMO.get(t, -1) for t in tramos], dtype=int)
+
+
+def movimiento_por_activo(codigos_tramo, movimiento_tramos) -> np.ndarray:
+    """
+    Reparte un vector de movimiento por tramo (len(TRAMOS),) o (S, len(TRAMOS))
+    a cada activo según su código de tramo. Tramo desconocido → 0.
+    """
+    codigos = np.asarray(codigos_tramo, dtype=int)
+    movs = np.asarray(movimiento_tramos, dtype=float)
+    extendido = np.concatenate([movs, np.zeros(movs.shape[:-1] + (1,))], axis=-1)
+    return extendido[..., np.where(codigos < 0, len(TRAMOS), codigos)]
+
+
+def _como_array(valores) -> np.ndarray:
+    return np.nan_to_num(np.asarray(valores, dtype=float))
+
+
+def rentabilidad_activos(ytm, duracion, movimiento, horizonte: float) -> np.ndarray:
+    """Rentabilidad esperada anual (%) por activo; (N,) o (S, N) con escenarios."""
+    return _como_array(ytm) + _como_array(movimiento) * _como_array(duracion) / max(horizonte, 1e-9)
+
+
+# ============================================================
+# MÉTRICAS
+# ============================================================
+
+def evaluar_carteras(
+    pesos,
+    ytm,
+    duracion,
+    horizonte: float,
+    movimiento=0.0,
+    vol=None,
+    codigos_tramo=None,
+    covarianza=None,
+) -> dict:
+    """
+    Métricas de una o varias carteras.
+
+    Devuelve "rent", "ytm", "dur", "vol", "vol_media", "break_even" y, con
+    codigos_tramo, "pesos_tramo" (peso agregado por tramo en el orden de
+    TRAMOS). "vol_media" es la media ponderada de vol; "vol" es sqrt(w'Σw)
+    si se pasa la covarianza (N, N) y la media ponderada si no. Para una
+    única cartera y un único escenario los valores son floats.
+    """
+    w = _como_array(pesos)
+    una_cartera = w.ndim == 1
+    w = np.atleast_2d(w)
+
+    ytm = _como_array(ytm)
+    duracion = _como_array(duracion)
+    rent_activos = rentabilidad_activos(ytm, duracion, movimiento, horizonte)
+    un_escenario = rent_activos.ndim == 1
+
+    rent = w @ np.atleast_2d(rent_activos).T
+    if un_escenario:
+        rent = rent[:, 0]
+    total_ytm = w @ ytm
+    total_dur = w @ duracion
+    vol_media = w @ _como_array(vol) if vol is not None else np.zeros(len(w))
+    if covarianza is not None:
+        total_vol = np.sqrt(np.maximum(np.einsum("ki,ij,kj->k", w, _como_array(covarianza), w), 0.0))
+    else:
+        total_vol = vol_media
+    with np.errstate(divide="ignore", invalid="ignore"):
+        break_even = np.where(total_dur > DURACION_MIN_BREAK_EVEN, total_ytm / total_dur, BREAK_EVEN_SIN_DURACION)
+
+    resultado = {"rent": rent, "ytm": total_ytm, "dur": total_dur, "vol": total_vol,
+                 "vol_media": vol_media, "break_even": break_even}
+    if codigos_tramo is not None:
+        codigos = np.asarray(codigos_tramo, dtype=int)
+        pertenencia = codigos[:, None] == np.arange(len(TRAMOS))[None, :]
+        resultado["pesos_tramo"] = w @ pertenencia
+
+    if una_cartera:
+        resultado = {k: v[0] for k, v in resultado.items()}
+        if un_escenario:
+            resultado = {k: (float(v) if np.ndim(v) == 0 else v) for k, v in resultado.items()}
+    return resultado
+
+
+def metricas_dataframe(df, horizonte: float, col_tramo: str | None = None, covarianza=None) -> dict:
+    """
+    Métricas consolidadas de una cartera en DataFrame con columnas peso, ytm,
+    duracion, vol y (opcional) delta_tipos, el movimiento a la duración de cada
+    activo. La covarianza, si se pasa, va alineada con las filas del DataFrame.
+    """
+    movimiento = df["delta_tipos"].to_numpy() if "delta_tipos" in df.columns else 0.0
+    codigos = codificar_tramos(df[col_tramo]) if col_tramo else None
+    return evaluar_carteras(
+        df["peso"].to_numpy(),
+        df["ytm"].to_numpy(),
+        df["duracion"].to_numpy(),
+        horizonte,
+        movimiento=movimiento,
+        vol=df["vol"].to_numpy(),
+        codigos_tramo=codigos,
+        covarianza=covarianza,
+    )
@@ -6,11 +6,19 @@
 # ==========================================================
 
 import json
+import os
+import sys
 import time
 from datetime import datetime, UTC
 
 from pymongo import MongoClient
-from mstarpy.funds import Funds
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+from src import replay
+from src.replay import Funds  # mstarpy.Funds con soporte de grabación/reproducción
+from src.cache_datos import marcar_cambio
+from src.clasificacion_region import asegurar_indices, clasificar
+from src.percentiles_categoria import recalcular_percentiles
 
 
 # =========================
@@ -264,6 +272,7 @@ def process_fondo(fondo, collection, audit_collection):
             "categoria": allocation_map.get("categoryName"),
             "tipo_rf": tipo_rf,
             "tramo_rf": tramo_rf,
+            **clasificar(allocation_map.get("categoryName")),   # regiones, region, divisa
             "sensibilidad_tipos": sensibilidad_tipos,
             "rentabilidad": {"historica": returns},
             "riesgo": risk_blocks,
@@ -280,6 +289,7 @@ def process_fondo(fondo, collection, audit_collection):
             {"$set": doc},
             upsert=True
         )
+        marcar_cambio(collection.database, "fondos")   # invalida la caché de las páginas
 
         duration_exec = round(time.time() - start_time, 2)
 
@@ -323,6 +333,7 @@ def main():
 
     collection = get_mongo_collection()
     audit_collection = get_audit_collection()
+    asegurar_indices(collection.database, "fondos")
 
     with open("../../assets/json/fondos_open_R2.json", "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -331,7 +342,11 @@ def main():
 
     for fondo in fondos:
         process_fondo(fondo, collection, audit_collection)
-        time.sleep(2)
+        replay.pausa(2, 2)
+
+    # Percentiles por categoría con los datos ya refrescados
+    resumen = recalcular_percentiles(collection.database, "fondos")
+    print(f"📊 Percentiles: {resumen['categorias']} categorías, {resumen['actualizados']}/{resumen['documentos']} fondos actualizados")
 
 
 if __name__ == "__main__":
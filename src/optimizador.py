@@ -0,0 +1,395 @@
+"""
+Optimizador de carteras para los constructores automáticos.
+
+Sustituye la heurística "top M por tramo con pesos iguales" por un problema
+media-varianza sobre todo el universo filtrado:
+
+    max  rent·w − (aversion/2)·w'Σw
+    s.a. Σ_{i∈tramo} w_i = peso objetivo del tramo
+         0 ≤ w_i ≤ peso máximo por activo
+         vol·w ≤ vol_max                (volatilidad media ponderada)
+         dur_min ≤ duracion·w ≤ dur_max
+         nº de activos ≤ max_activos, y ≤ max_por_tramo en cada tramo
+
+Resolución (solo NumPy):
+  1. Problema continuo. Las restricciones de volatilidad y duración entran
+     con multiplicadores de Lagrange (ascenso dual por coordenadas, en
+     caliente desde los multiplicadores de la fase anterior). Para
+     multiplicadores fijos, con Σ diagonal la solución es cerrada salvo el
+     umbral de cada tramo (bisección vectorizada entre tramos); con Σ
+     completa se usa gradiente proyectado acelerado (FISTA) con la misma
+     proyección.
+  2. Cardinalidad: se conservan los activos de mayor peso (respetando
+     max_por_tramo y al menos uno por tramo) y se reoptimiza sobre ese soporte.
+
+Σ es por defecto diagonal (vol²) y la restricción de volatilidad se aplica
+a la media ponderada de vol (supone correlación perfecta, conservadora).
+Con una matriz de covarianzas (módulo covarianzas) la volatilidad es la real,
+sqrt(w'Σw) ≤ vol_max, tratada como una aversión al riesgo adicional. Para
+que siga siendo interactivo con ~1.000 candidatos, la fase relajada se hace
+primero con la diagonal de Σ sobre todo el universo y después con Σ completa
+solo sobre los mejores PRESELECCION_POR_TRAMO de cada tramo.
+
+El resultado incluye los tiempos de cada fase para vigilar cómo escala.
+"""
+
+import time
+
+import numpy as np
+
+from src.motor_rentabilidad import TRAMOS
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+AVERSION_RIESGO = 0.05
+VOL_MINIMA = 0.05          # misma cota que usaba la eficiencia rent/vol
+PESO_MINIMO = 1e-4         # por debajo, el activo se considera fuera de la cartera
+
+ITERACIONES_BISECCION = 30     # umbral de cada tramo
+ITERACIONES_DUALES = 20        # búsqueda del multiplicador de cada restricción
+ITERACIONES_INTERNAS = 25      # FISTA por subproblema (Σ completa, en caliente)
+CICLOS_DUALES = 4
+PRESELECCION_POR_TRAMO = 40    # candidatos por tramo que pasan a la fase con Σ completa
+TOLERANCIA = 1e-4              # violación relativa admitida
+HOLGURA_ACTIVA = 1e-3          # holgura relativa con la que una restricción se da por activa
+MULTIPLICADOR_MAX = 1e4
+
+
+# ============================================================
+# SUBPROBLEMA (multiplicadores fijos)
+# ============================================================
+
+def _limites_umbral(v: np.ndarray, escala: np.ndarray, grupos: np.ndarray,
+                    techo: np.ndarray, n_grupos: int) -> tuple[np.ndarray, np.ndarray]:
+    """Intervalo de búsqueda del umbral τ_g: con τ=bajo todo al techo, con τ=alto todo a cero."""
+    bajo = np.full(n_grupos, np.inf)
+    np.minimum.at(bajo, grupos, v - escala * techo)
+    alto = np.full(n_grupos, -np.inf)
+    np.maximum.at(alto, grupos, v)
+    return bajo, alto
+
+
+def _umbral_por_grupo(v, escala, grupos, objetivo, techo) -> np.ndarray:
+    """
+    w = clip((v − τ_g) / escala, 0, techo) con τ_g tal que cada grupo suma su
+    objetivo. Bisección vectorizada entre grupos (la suma es monótona en τ).
+    """
+    n_grupos = len(objetivo)
+    bajo, alto = _limites_umbral(v, escala, grupos, techo, n_grupos)
+    for _ in range(ITERACIONES_BISECCION):
+        tau = (bajo + alto) / 2
+        suma = np.bincount(grupos, np.clip((v - tau[grupos]) / escala, 0.0, techo), minlength=n_grupos)
+        exceso = suma > objetivo
+        bajo = np.where(exceso, tau, bajo)
+        alto = np.where(exceso, alto, tau)
+    return np.clip((v - ((bajo + alto) / 2)[grupos]) / escala, 0.0, techo)
+
+
+def _resolver_diagonal(rent, sigma, grupos, objetivo, techo, aversion, w0=None) -> np.ndarray:
+    """Con Σ diagonal el subproblema es separable: solución cerrada salvo el umbral de cada tramo."""
+    return _umbral_por_grupo(rent, aversion * sigma, grupos, objetivo, techo)
+
+
+def _mayor_autovalor(sigma: np.ndarray, iteraciones: int = 30) -> float:
+    """Cota del mayor autovalor por iteración de potencias (con margen del 5%)."""
+    v = np.ones(len(sigma)) / np.sqrt(len(sigma))
+    valor = 0.0
+    for _ in range(iteraciones):
+        siguiente = sigma @ v
+        valor = float(np.linalg.norm(siguiente))
+        if valor == 0:
+            return 0.0
+        v = siguiente / valor
+    return valor * 1.05
+
+
+def _resolver_fista(rent, sigma, grupos, objetivo, techo, aversion, w0, autovalor) -> np.ndarray:
+    """Σ completa: gradiente proyectado acelerado, con arranque en caliente desde w0."""
+    paso = 1.0 / max(aversion * autovalor, 1e-6)
+    unos = np.ones_like(rent)
+    w = _umbral_por_grupo(w0, unos, grupos, objetivo, techo)
+    y, t = w.copy(), 1.0
+    for _ in range(ITERACIONES_INTERNAS):
+        gradiente = aversion * (sigma @ y) - rent
+        w_nuevo = _umbral_por_grupo(y - paso * gradiente, unos, grupos, objetivo, techo)
+        t_nuevo = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_nuevo + ((t - 1) / t_nuevo) * (w_nuevo - w)
+        w, t = w_nuevo, t_nuevo
+    return w
+
+
+# ============================================================
+# PROBLEMA CONTINUO
+# ============================================================
+
+def _resolver_continuo(rent, sigma, grupos, objetivo, techo, restricciones, limites, aversion, w0,
+                       var_max: float | None = None, mult0=None):
+    """
+    Restricciones (g_j(w) ≤ 0) por dualidad: ascenso por coordenadas,
+    buscando (regula falsi sobre una horquilla) el multiplicador de cada una
+    que la deja activa con el resto fijo. Las lineales son fila·w ≤ límite;
+    con var_max se añade w'Σw ≤ var_max, cuyo multiplicador solo aumenta la
+    aversión al riesgo.
+    mult0 arranca en caliente con los multiplicadores de la fase anterior;
+    una restricción que ya cumple las condiciones de holgura complementaria
+    con el multiplicador actual no vuelve a resolverse.
+    Devuelve (w, nº de subproblemas resueltos, multiplicadores).
+    """
+    diagonal = sigma.ndim == 1
+    autovalor = None if diagonal else _mayor_autovalor(sigma)
+    n_lineales = len(limites)
+    n_restricciones = n_lineales + (1 if var_max else 0)
+    evaluaciones = 0
+
+    def resolver(m, w_inicial):
+        nonlocal evaluaciones
+        evaluaciones += 1
+        ajustada = rent - m[:n_lineales] @ restricciones if n_lineales else rent
+        aversion_efectiva = aversion + (2 * m[-1] / var_max if var_max else 0.0)
+        if diagonal:
+            return _resolver_diagonal(ajustada, sigma, grupos, objetivo, techo, aversion_efectiva)
+        return _resolver_fista(ajustada, sigma, grupos, objetivo, techo, aversion_efectiva, w_inicial, autovalor)
+
+    def exceso(j, w):
+        if j < n_lineales:
+            return restricciones[j] @ w - limites[j]
+        cuadratico = sigma * w if diagonal else sigma @ w
+        return w @ cuadratico / var_max - 1.0
+
+    mult = np.zeros(n_restricciones)
+    if mult0 is not None:
+        # Las lineales coinciden entre fases; la de varianza puede no existir en la anterior
+        mult[:min(len(mult0), n_lineales)] = mult0[:n_lineales]
+        if var_max and len(mult0) > n_lineales:
+            mult[-1] = mult0[-1]
+    w = resolver(mult, w0)
+    for _ in range(CICLOS_DUALES):
+        for j in range(n_restricciones):
+            f_actual = exceso(j, w)
+            if f_actual <= TOLERANCIA and (mult[j] == 0 or f_actual >= -HOLGURA_ACTIVA):
+                continue
+            # Horquilla [bajo, alto] con la restricción incumplida en bajo y cumplida en alto
+            prueba = mult.copy()
+            if f_actual > TOLERANCIA:
+                # Incumplida con el multiplicador actual: se sube desde él
+                bajo, f_bajo, alto, w_j = mult[j], f_actual, max(mult[j] * 4, 1.0), w
+                while True:
+                    prueba[j] = alto
+                    w_j = resolver(prueba, w_j)
+                    f_alto = exceso(j, w_j)
+                    if f_alto <= TOLERANCIA or alto >= MULTIPLICADOR_MAX:
+                        break
+                    bajo, f_bajo, alto = alto, f_alto, alto * 4
+                w_alto = w_j
+            else:
+                # Holgada con multiplicador positivo: ¿sobra la restricción?
+                prueba[j] = 0.0
+                w_j = resolver(prueba, w)
+                f_cero = exceso(j, w_j)
+                if f_cero <= TOLERANCIA:
+                    mult, w = prueba, w_j
+                    continue
+                bajo, f_bajo, alto, f_alto, w_alto = 0.0, f_cero, mult[j], f_actual, w
+
+            # Regula falsi (Illinois) hasta que la restricción quede activa
+            lado = 0
+            for _ in range(ITERACIONES_DUALES):
+                if f_alto >= -HOLGURA_ACTIVA or f_alto > TOLERANCIA:
+                    break
+                prueba[j] = alto - f_alto * (alto - bajo) / (f_alto - f_bajo)
+                w_medio = resolver(prueba, w_alto)
+                f_medio = exceso(j, w_medio)
+                if f_medio <= TOLERANCIA:
+                    alto, f_alto, w_alto = prueba[j], f_medio, w_medio
+                    if lado == 1:
+                        f_bajo /= 2
+                    lado = 1
+                else:
+                    bajo, f_bajo = prueba[j], f_medio
+                    if lado == -1:
+                        f_alto /= 2
+                    lado = -1
+            prueba[j] = alto
+            mult, w = prueba, w_alto
+        if n_restricciones < 2 or all(exceso(j, w) <= TOLERANCIA for j in range(n_restricciones)):
+            break
+    return w, evaluaciones, mult
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def optimizar_cartera(
+    rent,
+    vol,
+    duracion,
+    codigos_tramo,
+    pesos_tramo,
+    max_activos: int = 10,
+    max_por_tramo: int | None = None,
+    vol_max: float | None = None,
+    dur_min: float | None = None,
+    dur_max: float | None = None,
+    peso_max: float | None = None,
+    aversion: float = AVERSION_RIESGO,
+    covarianza=None,
+) -> dict:
+    """
+    Cartera óptima sobre N candidatos.
+
+    rent, vol, duracion, codigos_tramo: arrays (N,) alineados por activo
+        (rent = rentabilidad esperada anual, p. ej. de motor_rentabilidad).
+    pesos_tramo: dict tramo → peso objetivo (suman 1), o array en el orden de TRAMOS.
+
+    covarianza: matriz (N, N) anualizada en %² alineada con los candidatos.
+
+    Devuelve "pesos" (N,), "indices" (activos seleccionados, de mayor a menor
+    peso), las métricas "rent"/"vol"/"dur" (vol con correlaciones si hay covarianza), "violaciones" de las restricciones
+    blandas, "subproblemas" resueltos y "tiempos_ms" por fase.
+    """
+    inicio = time.perf_counter()
+    rent = np.nan_to_num(np.asarray(rent, dtype=float))
+    vol = np.maximum(np.nan_to_num(np.asarray(vol, dtype=float)), VOL_MINIMA)
+    duracion = np.nan_to_num(np.asarray(duracion, dtype=float))
+    codigos = np.asarray(codigos_tramo, dtype=int)
+    if isinstance(pesos_tramo, dict):
+        pesos_tramo = [pesos_tramo.get(t, 0.0) for t in TRAMOS]
+    pesos_tramo = np.asarray(pesos_tramo, dtype=float)
+    n = len(rent)
+
+    # Tramos con peso objetivo y candidatos; sus pesos se renormalizan a 1
+    activos_tramo = np.bincount(codigos[codigos >= 0], minlength=len(TRAMOS))
+    tramos_activos = np.flatnonzero((pesos_tramo > 0) & (activos_tramo > 0))
+    if max_activos < len(tramos_activos):
+        # No caben todos los tramos: se quedan los de mayor peso objetivo
+        tramos_activos = tramos_activos[np.argsort(-pesos_tramo[tramos_activos])][:max_activos]
+    if len(tramos_activos) == 0:
+        raise ValueError("Ningún candidato pertenece a un tramo con peso objetivo")
+
+    candidatos = np.flatnonzero(np.isin(codigos, tramos_activos))
+    grupo_de_tramo = {t: g for g, t in enumerate(tramos_activos)}
+    grupos = np.array([grupo_de_tramo[t] for t in codigos[candidatos]], dtype=int)
+    objetivo = pesos_tramo[tramos_activos] / pesos_tramo[tramos_activos].sum()
+
+    # Techo por activo: nunca inferior al necesario para cubrir el tramo con
+    # max_por_tramo activos (si no, el problema sería infactible)
+    por_tramo = max_por_tramo or max_activos
+    n_grupo = np.bincount(grupos, minlength=len(objetivo))
+    techo_minimo = objetivo / np.minimum(n_grupo, por_tramo)
+    techo = np.maximum(peso_max if peso_max else 1.0, techo_minimo)[grupos]
+
+    con_covarianza = covarianza is not None
+    sigma_total = np.asarray(covarianza, dtype=float) if con_covarianza else vol ** 2
+    sigma_diagonal = np.diag(sigma_total).copy() if con_covarianza else sigma_total
+
+    # Restricciones lineales normalizadas: fila·w ≤ 1 (la de volatilidad solo
+    # es lineal sin covarianzas; con ellas es cuadrática, var_max)
+    filas, limites = [], []
+    if vol_max and not con_covarianza:
+        filas.append(vol / vol_max)
+        limites.append(1.0)
+    if dur_max:
+        filas.append(duracion / dur_max)
+        limites.append(1.0)
+    if dur_min:
+        filas.append(-duracion / dur_min)
+        limites.append(-1.0)
+    restricciones = np.array(filas).reshape(len(filas), n)
+    limites = np.array(limites)
+    var_max = vol_max ** 2 if (vol_max and con_covarianza) else None
+
+    techo_por_indice = np.zeros(n)
+    techo_por_indice[candidatos] = techo
+
+    def resolver(posiciones, w0, completa=True, mult0=None):
+        """posiciones: índices dentro de 'candidatos'."""
+        indices = candidatos[posiciones]
+        if completa and con_covarianza:
+            sigma, limite_var = sigma_total[np.ix_(indices, indices)], var_max
+        else:
+            sigma, limite_var = sigma_diagonal[indices], None
+        return _resolver_continuo(
+            rent[indices], sigma, grupos[posiciones], objetivo, techo_por_indice[indices],
+            restricciones[:, indices], limites, aversion, w0, limite_var, mult0,
+        )
+
+    # --- 1. Problema continuo sobre todos los candidatos ---
+    todos = np.arange(len(candidatos))
+    w0 = objetivo[grupos] / n_grupo[grupos]
+    w_relajado, subproblemas, mult = resolver(todos, w0, completa=not con_covarianza)
+    posiciones = todos
+    if con_covarianza:
+        # Preselección: los de más peso relajado (y después más rentables) de cada tramo
+        orden = np.lexsort((-rent[candidatos], -w_relajado))
+        rango_en_grupo = np.empty(len(orden), dtype=int)
+        for g in range(len(objetivo)):
+            del_grupo = orden[grupos[orden] == g]
+            rango_en_grupo[del_grupo] = np.arange(len(del_grupo))
+        posiciones = np.flatnonzero(rango_en_grupo < PRESELECCION_POR_TRAMO)
+        w_pre, extra, mult = resolver(posiciones, w_relajado[posiciones], mult0=mult)
+        w_relajado = np.zeros(len(candidatos))
+        w_relajado[posiciones] = w_pre
+        subproblemas += extra
+    t_relajado = time.perf_counter()
+
+    # --- 2. Cardinalidad: mejor soporte y reoptimización ---
+    orden = posiciones[np.argsort(-w_relajado[posiciones], kind="stable")]
+    elegidos, usados = [], np.zeros(len(objetivo), dtype=int)
+    # Primero el mejor de cada tramo, luego el resto por peso
+    for g in range(len(objetivo)):
+        mejor = orden[grupos[orden] == g][0]
+        elegidos.append(mejor)
+        usados[g] += 1
+    for i in orden:
+        if len(elegidos) >= max_activos:
+            break
+        if i in elegidos or w_relajado[i] < PESO_MINIMO or usados[grupos[i]] >= por_tramo:
+            continue
+        elegidos.append(i)
+        usados[grupos[i]] += 1
+    elegidos = np.array(sorted(elegidos))
+
+    indices = candidatos[elegidos]
+    techo_por_indice[indices] = np.maximum(techo_por_indice[indices],
+                                           (objetivo / usados)[grupos[elegidos]])
+    w_final, extra, _ = resolver(elegidos, w_relajado[elegidos], mult0=mult)
+    subproblemas += extra
+    t_final = time.perf_counter()
+
+    pesos = np.zeros(n)
+    pesos[indices] = w_final
+    pesos[pesos < PESO_MINIMO] = 0.0
+    pesos /= pesos.sum()
+
+    if con_covarianza:
+        vol_cartera = float(np.sqrt(max(pesos[indices] @ sigma_total[np.ix_(indices, indices)] @ pesos[indices], 0.0)))
+    else:
+        vol_cartera = float(vol @ pesos)
+
+    violaciones = {}
+    if vol_max:
+        violaciones["vol"] = max(0.0, vol_cartera - vol_max)
+    if dur_max:
+        violaciones["dur_max"] = max(0.0, float(duracion @ pesos) - dur_max)
+    if dur_min:
+        violaciones["dur_min"] = max(0.0, dur_min - float(duracion @ pesos))
+
+    seleccion = np.flatnonzero(pesos)
+    return {
+        "pesos": pesos,
+        "indices": seleccion[np.argsort(-pesos[seleccion])],
+        "rent": float(rent @ pesos),
+        "vol": vol_cartera,
+        "dur": float(duracion @ pesos),
+        "violaciones": violaciones,
+        "subproblemas": subproblemas,
+        "n_candidatos": int(len(candidatos)),
+        "tiempos_ms": {
+            "relajado": (t_relajado - inicio) * 1000,
+            "cardinalidad": (t_final - t_relajado) * 1000,
+            "total": (t_final - inicio) * 1000,
+        },
+    }
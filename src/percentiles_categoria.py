@@ -0,0 +1,151 @@
+"""
+Índice de percentiles por categoría, precalculado en cada refresco.
+
+Nada situaba un fondo frente a su categoría Morningstar, y calcularlo al
+vuelo obliga a agrupar toda la colección en cada consulta. Aquí, al terminar
+cada ingesta (pipeline de fondos, importador de ETFs) o con la tarea
+"percentiles" del planificador:
+  - por categoría ('categoria' en fondos, 'tipoEtf' en ETFs) se guardan en
+    'percentiles_categoria' los arrays ordenados de cada métrica (YTM,
+    duración, volatilidad, Sharpe o rent/riesgo, rentabilidad 1A... las del
+    comparador, src.motor_comparacion);
+  - cada documento recibe sus percentiles en 'percentiles_categoria'
+    ({"ytm": 54.2, ...}); solo se reescriben los que cambian.
+Las páginas preguntan "percentil de X en la categoría C" con búsqueda
+binaria (bisect) sobre los arrays, que se leen una vez por proceso y versión
+de la colección de percentiles (src.cache_datos).
+
+P = % de la categoría con valor menor o igual (el propio fondo incluido).
+"""
+
+import threading
+from bisect import bisect_right
+from datetime import datetime, UTC
+
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+
+from src.cache_datos import marcar_cambio, version_coleccion
+from src.motor_comparacion import COMPARADORES, a_numero, matriz_documentos, percentil_en_categoria
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+COLECCION_PERCENTILES = "percentiles_categoria"
+
+CAMPO_PERCENTILES = "percentiles_categoria"
+
+TAMANO_LOTE = 500
+
+DECIMALES = 1
+
+_lock = threading.Lock()
+_indices = {}   # colección → (versión, {categoría: {métrica: lista ordenada}})
+
+
+# ============================================================
+# RECÁLCULO (ingesta / planificador)
+# ============================================================
+
+def recalcular_percentiles(db, coleccion: str = "fondos") -> dict:
+    """
+    Recalcula los arrays ordenados por categoría y los percentiles de cada
+    documento de la colección. Devuelve un resumen (categorías, documentos,
+    actualizados).
+    """
+    config = COMPARADORES[coleccion]
+    metricas = config["metricas"]
+    campos = [m["campo"] for m in metricas]
+    proyeccion = {"_id": 1, config["categoria"]: 1, CAMPO_PERCENTILES: 1, **{c: 1 for c in campos}}
+    docs = list(db[coleccion].find({config["categoria"]: {"$nin": [None, ""]}}, proyeccion))
+    if not docs:
+        return {"coleccion": coleccion, "categorias": 0, "documentos": 0, "actualizados": 0}
+
+    planos = matriz_documentos(docs, campos)
+    valores = np.column_stack([a_numero(planos[c]) for c in campos])
+    categorias = [d[config["categoria"]] for d in docs]
+    por_documento = percentil_en_categoria(valores, categorias, valores, categorias).round(DECIMALES)
+
+    # Arrays ordenados por categoría
+    ahora = datetime.now(UTC)
+    resumenes = []
+    categorias_arr = np.asarray(categorias, dtype=object)
+    for categoria in sorted(set(categorias)):
+        grupo = valores[categorias_arr == categoria]
+        ordenados = {m["clave"]: np.sort(grupo[:, j][~np.isnan(grupo[:, j])]).tolist() for j, m in enumerate(metricas)}
+        resumenes.append(ReplaceOne(
+            {"_id": f"{coleccion}|{categoria}"},
+            {"coleccion": coleccion, "categoria": categoria, "n": len(grupo), "metricas": ordenados, "updated_at": ahora},
+            upsert=True,
+        ))
+    db[COLECCION_PERCENTILES].bulk_write(resumenes, ordered=False)
+    db[COLECCION_PERCENTILES].delete_many({"coleccion": coleccion, "categoria": {"$nin": sorted(set(categorias))}})
+
+    # Percentiles de cada documento (solo los que cambian)
+    actualizados, operaciones = 0, []
+    for doc, fila in zip(docs, por_documento):
+        nuevos = {m["clave"]: float(p) for m, p in zip(metricas, fila) if not np.isnan(p)}
+        if nuevos == (doc.get(CAMPO_PERCENTILES) or {}):
+            continue
+        operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": {CAMPO_PERCENTILES: nuevos}}))
+        if len(operaciones) >= TAMANO_LOTE:
+            actualizados += db[coleccion].bulk_write(operaciones, ordered=False).modified_count
+            operaciones = []
+    if operaciones:
+        actualizados += db[coleccion].bulk_write(operaciones, ordered=False).modified_count
+
+    if actualizados:
+        marcar_cambio(db, coleccion)
+    marcar_cambio(db, COLECCION_PERCENTILES)
+    return {"coleccion": coleccion, "categorias": len(resumenes), "documentos": len(docs), "actualizados": actualizados}
+
+
+def recalcular_todo(db) -> list[dict]:
+    return [recalcular_percentiles(db, coleccion) for coleccion in COMPARADORES]
+
+
+# ============================================================
+# CONSULTA (páginas)
+# ============================================================
+
+def cargar_indice(db, coleccion: str = "fondos") -> dict:
+    """{categoría: {métrica: lista ordenada}} de la colección, en caché por versión."""
+    version = version_coleccion(db, COLECCION_PERCENTILES)
+    with _lock:
+        guardado = _indices.get(coleccion)
+        if guardado and guardado[0] == version:
+            return guardado[1]
+
+    indice = {d["categoria"]: d.get("metricas", {})
+              for d in db[COLECCION_PERCENTILES].find({"coleccion": coleccion}, {"categoria": 1, "metricas": 1})}
+    with _lock:
+        _indices[coleccion] = (version, indice)
+    return indice
+
+
+def percentiles(db, coleccion: str, categorias: list, valores: np.ndarray) -> np.ndarray:
+    """
+    Percentiles n×m para una matriz de valores (filas en el orden de
+    'categorias', columnas en el de las métricas del comparador); NaN si no
+    hay datos de la categoría o falta el valor.
+    """
+    indice = cargar_indice(db, coleccion)
+    claves = [m["clave"] for m in COMPARADORES[coleccion]["metricas"]]
+    resultado = np.full(valores.shape, np.nan)
+    for i, categoria in enumerate(categorias):
+        arrays = indice.get(categoria)
+        if not arrays:
+            continue
+        for j, clave in enumerate(claves):
+            ordenados = arrays.get(clave)
+            if ordenados and not np.isnan(valores[i, j]):
+                resultado[i, j] = bisect_right(ordenados, valores[i, j]) / len(ordenados) * 100
+    return resultado
+
+
+def texto_percentiles(doc: dict | None, coleccion: str = "fondos") -> str:
+    """Resumen "Yield (TIR) P54 · Volatilidad (3A) P12" de los percentiles guardados en un documento."""
+    guardados = (doc or {}).get(CAMPO_PERCENTILES) or {}
+    return " · ".join(f"{m['etiqueta']} P{guardados[m['clave']]:.0f}"
+                      for m in COMPARADORES[coleccion]["metricas"] if m["clave"] in guardados)
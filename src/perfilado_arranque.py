@@ -0,0 +1,253 @@
+"""
+Perfilado del arranque de las páginas: importación y primer render.
+
+Todas las páginas importan en cabecera streamlit, pandas, pymongo y a menudo
+plotly, y algunas arrastraban los scrapers (requests, bs4,
+previsiones_dinamicas) aunque solo mostraran lo guardado en Mongo. Este
+módulo mide, por página:
+  - importación: ejecuta las importaciones de nivel superior de la página
+    (extraídas con ast) en un proceso limpio con python -X importtime, con
+    el tiempo de reloj total y el acumulado de cada módulo importado
+    directamente. Avisa si se pasa de PRESUPUESTO_IMPORT_MS o si arrastra
+    alguno de IMPORTS_PESADOS (esos deben importarse en la rama que los usa);
+  - primer render (--render): ejecuta la página con streamlit.testing
+    (AppTest, necesita Mongo) y da el tiempo total y el de cada sección que
+    la página marque con marca().
+
+Uso:
+    python -m src.perfilado_arranque                  # todas las páginas
+    python -m src.perfilado_arranque Curvas Macro     # páginas cuyo nombre contiene el texto
+    python -m src.perfilado_arranque --render --top 5
+Sale con código 1 si alguna página se pasa de presupuesto (para CI).
+
+Las marcas de sección solo se registran con PERFILAR_ARRANQUE=1 en el
+entorno (lo activa --render); en producción marca() no hace nada.
+"""
+
+import argparse
+import ast
+import glob
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_PAGINAS = os.path.join(RAIZ, "pages")
+
+PRESUPUESTO_IMPORT_MS = 1500
+PRESUPUESTO_RENDER_MS = 3000
+
+# Módulos que ninguna página debe cargar al importarse
+IMPORTS_PESADOS = (
+    "bs4",
+    "lxml",
+    "requests",
+    "src.http_cliente",
+    "src.datos_macro",
+    "src.scraper_tipos_interes",
+    "src.scraper_curvas_tipos",
+)
+
+VARIABLE_ENTORNO = "PERFILAR_ARRANQUE"
+
+_MARCA_INICIO = "--perfilado-arranque--"
+_LINEA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+_lock = threading.Lock()
+_marcas = {}    # página → [(sección, perf_counter)]
+
+
+# ============================================================
+# MARCAS DE SECCIÓN (desde las páginas)
+# ============================================================
+
+def _activo() -> bool:
+    return os.environ.get(VARIABLE_ENTORNO) == "1"
+
+
+def inicio(pagina: str) -> None:
+    """Empieza la medición de un render (tras las importaciones de la página)."""
+    if not _activo():
+        return
+    with _lock:
+        _marcas[pagina] = [("inicio", time.perf_counter())]
+
+
+def marca(pagina: str, seccion: str) -> None:
+    """Cierra 'seccion': el tiempo desde la marca anterior se le atribuye a ella."""
+    if not _activo():
+        return
+    with _lock:
+        _marcas.setdefault(pagina, [("inicio", time.perf_counter())]).append((seccion, time.perf_counter()))
+
+
+def secciones(pagina: str) -> list[dict]:
+    """[{"seccion", "ms"}] del último render registrado de la página."""
+    with _lock:
+        marcas = list(_marcas.get(pagina, []))
+    return [{"seccion": nombre, "ms": (t - t_previo) * 1000}
+            for (_, t_previo), (nombre, t) in zip(marcas, marcas[1:])]
+
+
+# ============================================================
+# IMPORTACIÓN (-X importtime en un proceso limpio)
+# ============================================================
+
+def nombre_pagina(ruta: str) -> str:
+    """'pages/6_📈_Curvas_Tipos.py' → 'Curvas_Tipos' (el nombre que usan las marcas)."""
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    return base.split("_", 2)[-1]
+
+
+def listar_paginas(filtros: list[str] | None = None) -> list[str]:
+    rutas = sorted(glob.glob(os.path.join(DIRECTORIO_PAGINAS, "*.py")),
+                   key=lambda r: int(os.path.basename(r).split("_", 1)[0]))
+    if filtros:
+        rutas = [r for r in rutas if any(f.lower() in nombre_pagina(r).lower() for f in filtros)]
+    return rutas
+
+
+def cabecera_importaciones(ruta: str) -> str:
+    """Sentencias import de nivel superior de la página, en su orden."""
+    with open(ruta, encoding="utf-8") as f:
+        arbol = ast.parse(f.read(), filename=ruta)
+    return "\n".join(ast.unparse(nodo) for nodo in arbol.body if isinstance(nodo, (ast.Import, ast.ImportFrom)))
+
+
+def _parsear_importtime(stderr: str) -> list[dict]:
+    """Líneas de -X importtime posteriores a la marca de inicio: [{"modulo", "ms", "directo"}]."""
+    if _MARCA_INICIO in stderr:
+        stderr = stderr.split(_MARCA_INICIO, 1)[1]
+    modulos = []
+    for linea in stderr.splitlines():
+        m = _LINEA_IMPORTTIME.match(linea)
+        if m:
+            modulos.append({
+                "modulo": m.group(4),
+                "ms": int(m.group(2)) / 1000,
+                "directo": len(m.group(3)) == 1,
+            })
+    return modulos
+
+
+def medir_importaciones(ruta: str, timeout: int = 120) -> dict:
+    """
+    Importa la cabecera de la página en un intérprete nuevo. Devuelve
+    {"pagina", "ms", "ms_importtime", "modulos" (directos, de más a menos
+    lento), "pesados", "error"}.
+    """
+    codigo = "\n".join([
+        "import sys, time",
+        f"sys.path.insert(0, {RAIZ!r})",
+        f"sys.stderr.write({_MARCA_INICIO!r} + '\\n'); sys.stderr.flush()",
+        "_t0 = time.perf_counter()",
+        cabecera_importaciones(ruta),
+        "print((time.perf_counter() - _t0) * 1000)",
+    ])
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ, capture_output=True, text=True, timeout=timeout,
+    )
+    modulos = _parsear_importtime(proceso.stderr)
+    directos = sorted((m for m in modulos if m["directo"]), key=lambda m: m["ms"], reverse=True)
+    cargados = {m["modulo"] for m in modulos}
+    error = None
+    if proceso.returncode != 0:
+        error = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else f"código {proceso.returncode}"
+    return {
+        "pagina": nombre_pagina(ruta),
+        "ms": float(proceso.stdout.strip().splitlines()[-1]) if proceso.returncode == 0 else None,
+        "ms_importtime": sum(m["ms"] for m in directos),
+        "modulos": [(m["modulo"], m["ms"]) for m in directos],
+        "pesados": [p for p in IMPORTS_PESADOS if p in cargados],
+        "error": error,
+    }
+
+
+# ============================================================
+# PRIMER RENDER (streamlit.testing)
+# ============================================================
+
+def medir_render(ruta: str, timeout: int = 60) -> dict:
+    """
+    Ejecuta la página una vez con AppTest (en este proceso, tras importar
+    ya streamlit) y devuelve {"pagina", "ms", "secciones", "excepciones"}.
+    """
+    from streamlit.testing.v1 import AppTest
+    # Con python -m este módulo es __main__: las páginas registran sus
+    # marcas en src.perfilado_arranque, que es el que hay que leer.
+    from src import perfilado_arranque as registro
+
+    os.environ[VARIABLE_ENTORNO] = "1"
+    pagina = nombre_pagina(ruta)
+    t0 = time.perf_counter()
+    app = AppTest.from_file(ruta, default_timeout=timeout).run()
+    ms = (time.perf_counter() - t0) * 1000
+    return {
+        "pagina": pagina,
+        "ms": ms,
+        "secciones": registro.secciones(pagina),
+        "excepciones": [e.message for e in app.exception],
+    }
+
+
+# ============================================================
+# INFORME
+# ============================================================
+
+def _formatear_importacion(resultado: dict, top: int) -> tuple[list[str], bool]:
+    if resultado["error"]:
+        return [f"{resultado['pagina']:<32} ✗ {resultado['error']}"], True
+    lento = resultado["ms"] > PRESUPUESTO_IMPORT_MS
+    aviso = f"  ⚠ presupuesto {PRESUPUESTO_IMPORT_MS} ms" if lento else ""
+    lineas = [f"{resultado['pagina']:<32} import {resultado['ms']:8.0f} ms{aviso}"]
+    lineas.append("    " + " · ".join(f"{modulo} {ms:.0f}" for modulo, ms in resultado["modulos"][:top]))
+    if resultado["pesados"]:
+        lineas.append("    ⚠ importa al cargar: " + ", ".join(resultado["pesados"]))
+    return lineas, lento or bool(resultado["pesados"])
+
+
+def _formatear_render(resultado: dict) -> tuple[list[str], bool]:
+    excedido = resultado["ms"] > PRESUPUESTO_RENDER_MS
+    aviso = f"  ⚠ presupuesto {PRESUPUESTO_RENDER_MS} ms" if excedido else ""
+    lineas = [f"{'':<32} render {resultado['ms']:8.0f} ms{aviso}"]
+    if resultado["secciones"]:
+        lineas.append("    " + " · ".join(f"{s['seccion']} {s['ms']:.0f}" for s in resultado["secciones"]))
+    for mensaje in resultado["excepciones"]:
+        lineas.append(f"    ✗ {mensaje.splitlines()[0] if mensaje else 'excepción'}")
+    return lineas, excedido
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiempo de importación y primer render de las páginas")
+    parser.add_argument("paginas", nargs="*", help="texto contenido en el nombre de la página (todas si se omite)")
+    parser.add_argument("--render", action="store_true", help="medir también el primer render (requiere Mongo)")
+    parser.add_argument("--top", type=int, default=6, help="módulos más lentos a mostrar por página")
+    args = parser.parse_args(argv)
+
+    rutas = listar_paginas(args.paginas)
+    if not rutas:
+        print("Ninguna página coincide")
+        return 2
+
+    algun_exceso = False
+    for ruta in rutas:
+        lineas, excedido = _formatear_importacion(medir_importaciones(ruta), args.top)
+        if args.render:
+            lineas_render, excedido_render = _formatear_render(medir_render(ruta))
+            lineas += lineas_render
+            excedido = excedido or excedido_render
+        algun_exceso = algun_exceso or excedido
+        print("\n".join(lineas))
+    return 1 if algun_exceso else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
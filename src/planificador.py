@@ -0,0 +1,373 @@
+"""
+Planificador de actualizaciones en segundo plano.
+
+Proceso independiente de Streamlit que refresca periódicamente:
+  - tipos      → 'tipos_interes' (bancos centrales)
+  - curvas     → 'curvas_tipos' (+ filas por plazo en 'curvas_tipos_puntos')
+  - macro      → 'datos_macro'  (snapshot del mes, conservando las notas)
+  - nav        → 'nav_historico' (NAV diario del universo de renta fija)
+  - regiones   → etiquetas de región/divisa en 'fondos' y 'etfs' (solo pendientes)
+  - percentiles → percentiles por categoría en 'percentiles_categoria' y en cada fondo/ETF
+
+Cada tarea tiene una expresión tipo cron de 5 campos
+(minuto hora día-mes mes día-semana), un jitter aleatorio para no golpear
+las fuentes siempre en el mismo segundo y protección contra solapes:
+  - dentro del proceso, una tarea no arranca si su ejecución anterior sigue viva;
+  - entre procesos, un lease en Mongo ('planificador_tareas') impide que dos
+    planificadores ejecuten la misma tarea a la vez.
+
+Uso (desde la raíz del proyecto):
+    python -m src.planificador                 # demonio
+    python -m src.planificador --listar        # próximas ejecuciones
+    python -m src.planificador --una-vez curvas
+"""
+
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("planificador")
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+MONGO_CONFIG = {
+    "host": "localhost",
+    "port": 27017,
+    "username": "admin",
+    "password": "mike",
+    "auth_source": "admin",
+    "database": "db-inver",
+}
+
+COLECCION_TAREAS = "planificador_tareas"
+
+# Duración máxima de una ejecución antes de que otro proceso pueda reclamarla
+# (las tareas largas lo amplían con "lease_minutos")
+LEASE_MINUTOS = 30
+
+
+def _refrescar_tipos(db) -> str:
+    from src.scraper_tipos_interes import obtener_todos_los_bancos, guardar_en_mongodb
+    resultado = guardar_en_mongodb(db, obtener_todos_los_bancos())
+    return f"{resultado['num_bancos']} bancos ({resultado['consulta_id']})"
+
+
+def _refrescar_curvas(db) -> str:
+    from src.scraper_curvas_tipos import obtener_todas_las_curvas, guardar_curvas_en_mongodb
+    resultado = guardar_curvas_en_mongodb(db, obtener_todas_las_curvas())
+    if resultado.get("duplicado"):
+        return "sin cambios"
+    return f"{resultado['num_paises']} países, {resultado['puntos_escritos']} puntos nuevos"
+
+
+def _refrescar_macro(db) -> str:
+    from src.datos_macro import recopilar_datos, guardar_snapshot
+    datos = recopilar_datos()
+    disponibles = sum(1 for k, v in datos.items() if v is not None and not k.endswith("_prev"))
+    return f"mes {guardar_snapshot(db, datos)}, {disponibles} indicadores"
+
+
+def _refrescar_nav(db) -> str:
+    from src.covarianzas import actualizar_historicos
+    resumen = actualizar_historicos(db)
+    return (f"{resumen['actualizados']}/{resumen['isins']} ISIN, {resumen['puntos']} puntos, "
+            f"{resumen['errores']} errores")
+
+
+def _etiquetar_regiones(db) -> str:
+    from src.clasificacion_region import etiquetar_todo
+    return ", ".join(f"{r['coleccion']} {r['actualizados']}/{r['revisados']}" for r in etiquetar_todo(db))
+
+
+def _recalcular_percentiles(db) -> str:
+    from src.percentiles_categoria import recalcular_todo
+    return ", ".join(f"{r['coleccion']} {r['actualizados']}/{r['documentos']} ({r['categorias']} cat.)" for r in recalcular_todo(db))
+
+
+TAREAS = {
+    "tipos": {
+        "cron": "0 7,19 * * *",
+        "jitter_s": 300,
+        "funcion": _refrescar_tipos,
+    },
+    "curvas": {
+        "cron": "30 */2 * * 1-5",   # días laborables, cada 2 horas
+        "jitter_s": 240,
+        "funcion": _refrescar_curvas,
+    },
+    "macro": {
+        "cron": "0 8 * * *",
+        "jitter_s": 600,
+        "funcion": _refrescar_macro,
+    },
+    "nav": {
+        "cron": "0 23 * * 1-5",     # tras el cierre, días laborables
+        "jitter_s": 600,
+        "funcion": _refrescar_nav,
+        "lease_minutos": 240,       # recorre todo el universo con pausas entre ISIN
+    },
+    "regiones": {
+        "cron": "15 6 * * *",
+        "jitter_s": 300,
+        "funcion": _etiquetar_regiones,
+    },
+    "percentiles": {
+        "cron": "45 6 * * *",
+        "jitter_s": 300,
+        "funcion": _recalcular_percentiles,
+    },
+}
+
+
+# ============================================================
+# EXPRESIONES CRON
+# ============================================================
+_RANGOS_CRON = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _parsear_campo(campo: str, minimo: int, maximo: int) -> set[int]:
+    valores = set()
+    for parte in campo.split(","):
+        rango, _, paso = parte.partition("/")
+        paso = int(paso) if paso else 1
+        if rango == "*":
+            inicio, fin = minimo, maximo
+        elif "-" in rango:
+            inicio, fin = (int(x) for x in rango.split("-"))
+        else:
+            inicio = int(rango)
+            fin = maximo if paso > 1 else inicio
+        if inicio < minimo or fin > maximo or inicio > fin:
+            raise ValueError(f"Campo cron fuera de rango: {campo}")
+        valores.update(range(inicio, fin + 1, paso))
+    return valores
+
+
+def parsear_cron(expresion: str) -> dict:
+    """'m h dom mon dow' → conjuntos de valores permitidos (domingo = 0 o 7)."""
+    campos = expresion.split()
+    if len(campos) != 5:
+        raise ValueError(f"Expresión cron inválida (5 campos): {expresion}")
+    rangos = list(_RANGOS_CRON)
+    rangos[4] = (0, 7)
+    minutos, horas, dias, meses, semana = (
+        _parsear_campo(c, lo, hi) for c, (lo, hi) in zip(campos, rangos)
+    )
+    if 7 in semana:
+        semana = (semana - {7}) | {0}
+    return {
+        "minutos": minutos,
+        "horas": horas,
+        "dias": dias,
+        "meses": meses,
+        "semana": semana,
+        "dia_libre": campos[2] == "*",
+        "semana_libre": campos[4] == "*",
+    }
+
+
+def _dia_valido(cron: dict, t: datetime) -> bool:
+    dia_semana = (t.weekday() + 1) % 7   # cron: domingo = 0
+    coincide_dia = t.day in cron["dias"]
+    coincide_semana = dia_semana in cron["semana"]
+    # Semántica cron: si ambos campos están restringidos basta con uno
+    if cron["dia_libre"]:
+        return coincide_semana
+    if cron["semana_libre"]:
+        return coincide_dia
+    return coincide_dia or coincide_semana
+
+
+def siguiente_ejecucion(cron: dict, desde: datetime) -> datetime:
+    """Primer instante (minuto exacto) estrictamente posterior a 'desde'."""
+    t = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limite = t + timedelta(days=366 * 4)
+    while t < limite:
+        if t.month not in cron["meses"]:
+            t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            continue
+        if not _dia_valido(cron, t):
+            t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            continue
+        if t.hour not in cron["horas"]:
+            t = t.replace(minute=0) + timedelta(hours=1)
+            continue
+        if t.minute not in cron["minutos"]:
+            t += timedelta(minutes=1)
+            continue
+        return t
+    raise ValueError("La expresión cron no tiene ejecuciones en los próximos 4 años")
+
+
+# ============================================================
+# LEASE EN MONGO (protección entre procesos)
+# ============================================================
+PROPIETARIO = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _adquirir_lease(db, nombre: str, minutos: int = LEASE_MINUTOS) -> bool:
+    ahora = datetime.now(UTC)
+    try:
+        doc = db[COLECCION_TAREAS].find_one_and_update(
+            {"_id": nombre, "$or": [
+                {"expira": {"$lt": ahora}},
+                {"expira": None},
+                {"propietario": PROPIETARIO},
+            ]},
+            {"$set": {
+                "propietario": PROPIETARIO,
+                "expira": ahora + timedelta(minutes=minutos),
+                "ultimo_inicio": ahora,
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Existe y otro proceso tiene el lease vigente
+        return False
+    return doc is not None and doc.get("propietario") == PROPIETARIO
+
+
+def _liberar_lease(db, nombre: str, estado: str, detalle: str, duracion_s: float) -> None:
+    db[COLECCION_TAREAS].update_one(
+        {"_id": nombre, "propietario": PROPIETARIO},
+        {"$set": {
+            "expira": None,
+            "ultimo_fin": datetime.now(UTC),
+            "ultimo_estado": estado,
+            "ultimo_detalle": detalle,
+            "ultima_duracion_s": round(duracion_s, 2),
+        }},
+    )
+
+
+def ejecutar_tarea(db, nombre: str, tareas: dict = None) -> dict | None:
+    """
+    Ejecuta una tarea bajo el lease de Mongo y registra su resultado.
+    Devuelve None si otro proceso tiene el lease (la tarea ya está en marcha).
+    """
+    tareas = tareas or TAREAS
+    if not _adquirir_lease(db, nombre, tareas[nombre].get("lease_minutos", LEASE_MINUTOS)):
+        return None
+
+    inicio = datetime.now(UTC)
+    try:
+        detalle = tareas[nombre]["funcion"](db)
+        estado = "ok"
+    except Exception as e:
+        detalle = f"{type(e).__name__}: {e}"
+        estado = "error"
+        logger.exception(f"[{nombre}] error")
+    duracion_s = (datetime.now(UTC) - inicio).total_seconds()
+    _liberar_lease(db, nombre, estado, detalle, duracion_s)
+    return {"estado": estado, "detalle": detalle, "duracion_s": duracion_s}
+
+
+def estado_tareas(db) -> list[dict]:
+    """Estado de la última ejecución de cada tarea (para mostrar en las páginas)."""
+    return list(db[COLECCION_TAREAS].find({}, {"propietario": 0}))
+
+
+# ============================================================
+# EJECUCIÓN
+# ============================================================
+
+class Planificador:
+    """Bucle principal: calcula la próxima ejecución de cada tarea y la lanza."""
+
+    def __init__(self, db, tareas: dict = TAREAS):
+        self.db = db
+        self.tareas = tareas
+        self.crons = {nombre: parsear_cron(t["cron"]) for nombre, t in tareas.items()}
+        self.en_curso = {nombre: threading.Lock() for nombre in tareas}
+        self.parar = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=len(tareas), thread_name_prefix="tarea")
+
+    def proxima(self, nombre: str, desde: datetime) -> datetime:
+        base = siguiente_ejecucion(self.crons[nombre], desde)
+        return base + timedelta(seconds=random.uniform(0, self.tareas[nombre]["jitter_s"]))
+
+    def ejecutar(self, nombre: str) -> None:
+        """Ejecuta una tarea si no hay otra ejecución viva (en este u otro proceso)."""
+        cerrojo = self.en_curso[nombre]
+        if not cerrojo.acquire(blocking=False):
+            logger.warning(f"[{nombre}] sigue en curso, se omite esta ejecución")
+            return
+        try:
+            resultado = ejecutar_tarea(self.db, nombre, self.tareas)
+            if resultado is None:
+                logger.info(f"[{nombre}] otro proceso tiene el lease, se omite")
+            elif resultado["estado"] == "ok":
+                logger.info(f"[{nombre}] ok en {resultado['duracion_s']:.1f}s: {resultado['detalle']}")
+        finally:
+            cerrojo.release()
+
+    def bucle(self) -> None:
+        ahora = datetime.now()
+        agenda = {nombre: self.proxima(nombre, ahora) for nombre in self.tareas}
+        for nombre, cuando in agenda.items():
+            logger.info(f"[{nombre}] próxima ejecución {cuando:%Y-%m-%d %H:%M:%S}")
+
+        while not self.parar.is_set():
+            nombre, cuando = min(agenda.items(), key=lambda x: x[1])
+            espera = (cuando - datetime.now()).total_seconds()
+            if espera > 0:
+                # Esperas cortas para reaccionar rápido a SIGTERM
+                self.parar.wait(min(espera, 30))
+                continue
+            self.pool.submit(self.ejecutar, nombre)
+            agenda[nombre] = self.proxima(nombre, max(cuando, datetime.now()))
+            logger.info(f"[{nombre}] próxima ejecución {agenda[nombre]:%Y-%m-%d %H:%M:%S}")
+
+        self.pool.shutdown(wait=True)
+
+
+def conectar_db():
+    client = MongoClient(
+        host=MONGO_CONFIG["host"], port=MONGO_CONFIG["port"],
+        username=MONGO_CONFIG["username"], password=MONGO_CONFIG["password"],
+        authSource=MONGO_CONFIG["auth_source"],
+    )
+    return client[MONGO_CONFIG["database"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planificador de actualizaciones de datos")
+    parser.add_argument("--listar", action="store_true", help="Muestra las próximas ejecuciones y sale")
+    parser.add_argument("--una-vez", choices=list(TAREAS), help="Ejecuta una tarea inmediatamente y sale")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.listar:
+        ahora = datetime.now()
+        for nombre, tarea in TAREAS.items():
+            cron = parsear_cron(tarea["cron"])
+            siguiente = siguiente_ejecucion(cron, ahora)
+            print(f"{nombre:8} {tarea['cron']:18} → {siguiente:%Y-%m-%d %H:%M} (+ hasta {tarea['jitter_s']}s)")
+        return
+
+    planificador = Planificador(conectar_db())
+
+    if args.una_vez:
+        planificador.ejecutar(args.una_vez)
+        return
+
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(senal, lambda *_: planificador.parar.set())
+    planificador.bucle()
+
+
+if __name__ == "__main__":
+    main()
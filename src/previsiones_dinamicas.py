@@ -23,12 +23,18 @@ Calidad de datos:
     - "ok"        → datos obtenidos de la API correctamente
     - "degradado" → API falló, se usan valores estáticos de fallback
     - "estatico"  → país sin API dinámica (JP, CN), siempre estático
+
+src.http_cliente (requests) se importa dentro de las funciones que
+descargan: las páginas llegan aquí vía curva_tipos/servicio_curvas solo por
+constantes como DURACION_ANOS y no deben pagar la importación de la red.
 """
 
-import requests
+from collections import deque
 from datetime import datetime, UTC, date
 from typing import Optional
+import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
@@ -230,6 +236,7 @@ def _obtener_yields_fred(api_key: str) -> tuple[dict[str, float], str]:
     """
     if not api_key:
         return {}, "Sin clave FRED API — usando fallback"
+    from src import http_cliente
 
     yields = {}
     errores = []
@@ -244,7 +251,7 @@ def _obtener_yields_fred(api_key: str) -> tuple[dict[str, float], str]:
                 "limit": 5,          # últimas 5 observaciones para evitar huecos
                 "observation_start": "2020-01-01",
             }
-            resp = requests.get(FRED_BASE_URL, params=params, headers=HEADERS, timeout=TIMEOUT)
+            resp = http_cliente.obtener(FRED_BASE_URL, params=params, headers=HEADERS, timeout=TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
 
@@ -276,6 +283,7 @@ def _obtener_yields_ecb() -> tuple[dict[str, float], str]:
     Obtiene los yields más recientes de la curva AAA zona euro desde el BCE.
     Retorna (dict plazo→yield, mensaje_estado).
     """
+    from src import http_cliente
     yields = {}
     errores = []
 
@@ -287,7 +295,7 @@ def _obtener_yields_ecb() -> tuple[dict[str, float], str]:
                 "lastNObservations": 5,   # últimas 5 por si hay huecos
                 "detail": "dataonly",
             }
-            resp = requests.get(url, params=params, headers=HEADERS, timeout=TIMEOUT)
+            resp = http_cliente.obtener(url, params=params, headers=HEADERS, timeout=TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
 
@@ -339,48 +347,186 @@ MOF_JP_COLUMNAS = {
     "40Y": None,
 }
 
+# Histórico completo del CSV guardado en local (backtesting y lecturas de cola)
+MOF_JP_HISTORICO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets", "cache", "mof", "jgbcme.csv",
+)
+MOF_JP_META = MOF_JP_HISTORICO + ".meta.json"
+MOF_JP_COLA_BYTES = 16 * 1024   # bytes pedidos con Range (varias semanas de filas)
+MOF_JP_COLA_LINEAS = 64         # filas que se conservan al leer en streaming
+
+
+def _partes_mof(linea: str) -> list[str]:
+    return [p.strip().strip('"').strip("'") for p in linea.lstrip("\ufeff").split(",")]
+
+
+def _es_cabecera_mof(linea: str) -> bool:
+    return "1Y" in linea or "Date" in linea.strip()
+
+
+def _fecha_mof(linea: str) -> date | None:
+    """Fecha de una fila de datos ("2026/2/19") o None si no es una fila de datos."""
+    partes = _partes_mof(linea)
+    if len(partes) < 2 or not partes[0] or not partes[1]:
+        return None
+    try:
+        float(partes[1])
+        return datetime.strptime(partes[0], "%Y/%m/%d").date()
+    except ValueError:
+        return None
+
+
+def _cabecera_historico_mof() -> list[str] | None:
+    """Cabeceras leídas de las primeras líneas del histórico local."""
+    try:
+        with open(MOF_JP_HISTORICO, "r", encoding="utf-8", errors="replace") as f:
+            for _, linea in zip(range(20), f):
+                if _es_cabecera_mof(linea):
+                    return _partes_mof(linea)
+    except OSError:
+        pass
+    return None
+
+
+def _cola_historico_mof(nbytes: int = MOF_JP_COLA_BYTES) -> list[str]:
+    """Últimas líneas completas del histórico local."""
+    with open(MOF_JP_HISTORICO, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        inicio = max(0, f.tell() - nbytes)
+        f.seek(inicio)
+        lineas = f.read().decode("utf-8", errors="replace").splitlines()
+    return lineas[1:] if inicio > 0 else lineas
+
+
+def _guardar_meta_mof(resp) -> None:
+    meta = {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "fecha": datetime.now(UTC).isoformat(),
+    }
+    with open(MOF_JP_META, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def _leer_meta_mof() -> dict | None:
+    try:
+        with open(MOF_JP_META, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _descargar_mof_completo(resp) -> list[str]:
+    """
+    Recorre en streaming una respuesta 200 completa: la vuelca al histórico
+    local y conserva solo una cola acotada de líneas en memoria.
+    """
+    os.makedirs(os.path.dirname(MOF_JP_HISTORICO), exist_ok=True)
+    cola = deque(maxlen=MOF_JP_COLA_LINEAS)
+    temporal = MOF_JP_HISTORICO + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        for bruta in resp.iter_lines():
+            linea = bruta.decode("utf-8", errors="replace")
+            f.write(linea + "\n")
+            cola.append(linea)
+    os.replace(temporal, MOF_JP_HISTORICO)
+    return list(cola)
+
+
+def _anexar_cola_mof(lineas_remotas: list[str]) -> list[str] | None:
+    """
+    Añade al histórico local las filas de una respuesta 206 posteriores a su
+    última fecha. Devuelve None si la cola remota no solapa con el histórico
+    (hueco de datos) y hace falta una descarga completa.
+    """
+    cola_local = _cola_historico_mof()
+    fechas_locales = [f for f in map(_fecha_mof, cola_local) if f]
+    if not fechas_locales:
+        return None
+    ultima_local = fechas_locales[-1]
+
+    filas_remotas = [(f, l) for l in lineas_remotas if (f := _fecha_mof(l))]
+    if not filas_remotas or filas_remotas[0][0] > ultima_local:
+        return None
+
+    nuevas = [l for f, l in filas_remotas if f > ultima_local]
+    if nuevas:
+        with open(MOF_JP_HISTORICO, "a", encoding="utf-8") as f:
+            f.write("".join(l + "\n" for l in nuevas))
+    return cola_local + nuevas
+
+
+def _actualizar_historico_mof() -> tuple[list[str] | None, list[str]]:
+    """
+    Sincroniza el histórico local del CSV del MoF transfiriendo lo mínimo:
+      - 304 (petición condicional) → no hay cambios, se lee la cola local.
+      - 206 (Range de sufijo)      → se anexan solo las filas nuevas.
+      - 200 (sin histórico o servidor sin Range) → descarga en streaming.
+    Retorna (cabeceras, últimas líneas).
+    """
+    from src import http_cliente
+    sesion = http_cliente.obtener_sesion(MOF_JP_URL)
+    hay_historico = _cabecera_historico_mof() is not None
+
+    cabeceras_http = dict(HEADERS, Accept="text/csv,*/*")
+    if hay_historico:
+        cabeceras_http.update(http_cliente.cabeceras_condicionales(_leer_meta_mof()))
+        cabeceras_http["Range"] = f"bytes=-{MOF_JP_COLA_BYTES}"
+        # Los rangos se aplican sobre el cuerpo sin comprimir
+        cabeceras_http["Accept-Encoding"] = "identity"
+
+    with sesion.get(MOF_JP_URL, headers=cabeceras_http, timeout=TIMEOUT, stream=True) as resp:
+        if resp.status_code == 304:
+            return _cabecera_historico_mof(), _cola_historico_mof()
+
+        resp.raise_for_status()
+        if resp.status_code == 206:
+            lineas = resp.content.decode("utf-8", errors="replace").splitlines()[1:]
+            cola = _anexar_cola_mof(lineas)
+            if cola is not None:
+                _guardar_meta_mof(resp)
+                return _cabecera_historico_mof(), cola
+        else:
+            cola = _descargar_mof_completo(resp)
+            _guardar_meta_mof(resp)
+            return _cabecera_historico_mof(), cola
+
+    # Hueco entre el histórico local y la cola remota → descarga completa
+    with sesion.get(MOF_JP_URL, headers=dict(HEADERS, Accept="text/csv,*/*"),
+                    timeout=TIMEOUT, stream=True) as resp:
+        resp.raise_for_status()
+        cola = _descargar_mof_completo(resp)
+        _guardar_meta_mof(resp)
+    return _cabecera_historico_mof(), cola
+
+
 def _obtener_yields_mof_jp() -> tuple[dict[str, float], str]:
     """
-    Descarga el CSV oficial del Ministerio de Finanzas de Japón con
-    los yields de referencia de JGBs (Japanese Government Bonds).
+    Obtiene los yields de referencia de JGBs (Japanese Government Bonds)
+    del CSV oficial del Ministerio de Finanzas de Japón.
 
     El CSV tiene formato:
         Date,1Y,2Y,5Y,10Y,20Y,30Y,40Y
         2026/02/19,0.72,1.28,1.68,2.14,...
 
+    Solo se leen las últimas filas (ver _actualizar_historico_mof); el
+    histórico completo queda en MOF_JP_HISTORICO.
+
     Retorna (dict plazo→yield, estado).
     Nota: MoF no publica 3M ni 6M. Se estiman por interpolación.
     """
     try:
-        resp = requests.get(MOF_JP_URL, headers=HEADERS, timeout=TIMEOUT)
-        resp.raise_for_status()
-
-        # El CSV puede tener cabeceras con BOM o espacios — limpiar
-        lineas = resp.text.strip().splitlines()
-
-        # Encontrar la fila de cabeceras (buscar la que contiene "1Y" o "Date")
-        idx_header = None
-        for i, linea in enumerate(lineas):
-            if "1Y" in linea or "Date" in linea.strip():
-                idx_header = i
-                break
-
-        if idx_header is None:
+        cabeceras, cola = _actualizar_historico_mof()
+        if not cabeceras:
             return {}, "sin_datos"
 
-        cabeceras = [c.strip().strip('"').strip("'") for c in lineas[idx_header].split(",")]
-
         # Tomar la última fila con datos (la más reciente)
         datos_fila = None
-        for linea in reversed(lineas[idx_header + 1:]):
-            partes = [p.strip().strip('"') for p in linea.split(",")]
-            if len(partes) >= 2 and partes[0] and partes[1]:
-                try:
-                    float(partes[1])  # verificar que hay un número
-                    datos_fila = partes
-                    break
-                except ValueError:
-                    continue
+        for linea in reversed(cola):
+            if _fecha_mof(linea):
+                datos_fila = _partes_mof(linea)
+                break
 
         if not datos_fila:
             return {}, "sin_datos"
@@ -443,8 +589,9 @@ def _obtener_yields_chinabond() -> tuple[dict[str, float], str]:
 
     Nota: no publica 2Y directamente; se estima por interpolación 1Y–5Y.
     """
+    from src import http_cliente
     try:
-        resp = requests.get(CHINABOND_URL, headers=HEADERS, timeout=TIMEOUT)
+        resp = http_cliente.obtener(CHINABOND_URL, headers=HEADERS, timeout=TIMEOUT)
         resp.raise_for_status()
 
         from bs4 import BeautifulSoup
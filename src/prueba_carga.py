@@ -0,0 +1,157 @@
+"""
+Prueba de carga y perfilado de la obtención de datos externos.
+
+Ejecuta las rutas reales de obtención + parseo (curvas, tipos de bancos
+centrales, datos macro y enriquecimiento de ETFs) contra las fixtures
+grabadas, con latencia y fallos inyectados, y muestra tiempos por fuente.
+
+Grabar fixtures (con red, una sola vez):
+    python -m src.prueba_carga --modo record --iteraciones 1
+
+Reproducir sin red:
+    python -m src.prueba_carga --iteraciones 20 --latencia-ms 80 --fallos 0.05
+    python -m src.prueba_carga --fuentes curvas macro --perfil
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import time
+
+from src import replay
+
+
+# ============================================================
+# FUENTES
+# ============================================================
+
+def _isins_etf(n: int) -> list[str]:
+    """Primeros ISIN de ETFs de renta fija / monetarios del fichero de carga inicial."""
+    ruta = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "assets", "json", "etf_open_R1.json")
+    with open(ruta, "r", encoding="utf-8") as f:
+        etfs = json.load(f)
+    isins = []
+    for etf in etfs:
+        isin = etf.get("isin")
+        if isin and isin != "N/A" and isin not in isins and etf.get("tipoEtf") in ("Mercado Monetario", "Renta Fija"):
+            isins.append(isin)
+        if len(isins) >= n:
+            break
+    return isins
+
+
+def _fuente_curvas(_isins):
+    from src.scraper_curvas_tipos import obtener_todas_las_curvas
+    return obtener_todas_las_curvas()
+
+
+def _fuente_tipos(_isins):
+    from src.scraper_tipos_interes import obtener_todos_los_bancos
+    return obtener_todos_los_bancos()
+
+
+def _fuente_macro(_isins):
+    from src.datos_macro import recopilar_datos
+    return recopilar_datos()
+
+
+def _fuente_justetf(isins):
+    from src.enriquecer_etfs_justetf import scrape_justetf_details
+    return [scrape_justetf_details(isin) for isin in isins]
+
+
+def _fuente_bonos(isins):
+    from src.enriquecer_etfs_bonos import obtener_datos_bonos
+    resultados = []
+    for isin in isins:
+        try:
+            resultados.append(obtener_datos_bonos(isin))
+        except Exception as e:
+            resultados.append({"error": str(e)})
+    return resultados
+
+
+FUENTES = {
+    "curvas": _fuente_curvas,
+    "tipos": _fuente_tipos,
+    "macro": _fuente_macro,
+    "justetf": _fuente_justetf,
+    "bonos": _fuente_bonos,
+}
+
+
+# ============================================================
+# EJECUCIÓN
+# ============================================================
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+def ejecutar(fuentes: list[str], iteraciones: int, isins: list[str]) -> dict[str, dict]:
+    resultados = {}
+    for nombre in fuentes:
+        tiempos, errores = [], 0
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            try:
+                FUENTES[nombre](isins)
+            except Exception as e:
+                errores += 1
+                print(f"[WARN] {nombre}: {e}")
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        resultados[nombre] = {
+            "n": iteraciones,
+            "errores": errores,
+            "p50_ms": _percentil(tiempos, 0.50),
+            "p95_ms": _percentil(tiempos, 0.95),
+            "max_ms": max(tiempos),
+        }
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=replay.MODOS, default="replay")
+    parser.add_argument("--directorio", default=None, help="Directorio de fixtures")
+    parser.add_argument("--fuentes", nargs="+", choices=list(FUENTES), default=list(FUENTES))
+    parser.add_argument("--iteraciones", type=int, default=10)
+    parser.add_argument("--isins", type=int, default=5, help="Nº de ETFs para justetf/bonos")
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--fallos", type=float, default=0, help="Probabilidad de fallo inyectado")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--perfil", action="store_true", help="Perfilar con cProfile")
+    args = parser.parse_args()
+
+    config = replay.configurar(
+        modo=args.modo,
+        directorio=args.directorio,
+        latencia_ms=args.latencia_ms,
+        tasa_fallos=args.fallos,
+        semilla=args.semilla,
+    )
+    print(f"Modo: {config['modo']} | Fixtures: {config['directorio']}")
+
+    isins = _isins_etf(args.isins)
+    perfil = cProfile.Profile() if args.perfil else None
+    if perfil:
+        perfil.enable()
+    resultados = ejecutar(args.fuentes, args.iteraciones, isins)
+    if perfil:
+        perfil.disable()
+
+    print(f"\n{'Fuente':10} {'N':>4} {'Errores':>8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'Máx (ms)':>10}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:10} {r['n']:4d} {r['errores']:8d} {r['p50_ms']:10.1f} {r['p95_ms']:10.1f} {r['max_ms']:10.1f}")
+
+    if perfil:
+        print()
+        pstats.Stats(perfil).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Grabación y reproducción de las fuentes de datos externas.
+
+Permite ejecutar los scrapers, las APIs (FRED, ECB, MoF, ChinaBond, World
+Bank...) y mstarpy sin red, por los mismos caminos de código:
+
+  - live   → comportamiento normal (por defecto).
+  - record → se llama a la fuente real y se guarda la respuesta en crudo.
+  - replay → se sirve la respuesta grabada, con latencia y fallos inyectados
+             opcionales, sin tocar la red.
+
+Configuración por variables de entorno (o con configurar()):
+  INVER_REPLAY_MODO          live | record | replay
+  INVER_REPLAY_DIR           directorio de fixtures (assets/fixtures/replay/v1)
+  INVER_REPLAY_LATENCIA_MS   latencia añadida por petición en replay
+  INVER_REPLAY_FALLOS        probabilidad (0–1) de fallo inyectado en replay
+  INVER_REPLAY_SEMILLA       semilla para que los fallos sean reproducibles
+
+Las respuestas HTTP se reproducen a nivel de transporte (AdaptadorReplay,
+montado en las sesiones de http_cliente); mstarpy se cubre con Funds(),
+que devuelve un proxy de grabación/reproducción de mstarpy.Funds.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+MODOS = ("live", "record", "replay")
+
+DIRECTORIO_DEFECTO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "assets", "fixtures", "replay", "v1",
+)
+
+# Parámetros de URL que nunca forman parte de la clave ni se graban
+PARAMETROS_SECRETOS = {"api_key", "apikey", "key", "token", "access_token"}
+
+# Cabeceras de petición que se ignoran al grabar y reproducir (la respuesta
+# grabada es siempre la representación completa)
+CABECERAS_CONDICIONALES = ("Range", "If-None-Match", "If-Modified-Since", "If-Range")
+
+# Cabeceras de respuesta que se conservan en la fixture
+CABECERAS_GRABADAS = ("Content-Type", "ETag", "Last-Modified", "Location")
+
+_lock = threading.Lock()
+_config = {
+    "modo": os.getenv("INVER_REPLAY_MODO", "live").lower(),
+    "directorio": os.getenv("INVER_REPLAY_DIR", DIRECTORIO_DEFECTO),
+    "latencia_ms": float(os.getenv("INVER_REPLAY_LATENCIA_MS", "0") or 0),
+    "tasa_fallos": float(os.getenv("INVER_REPLAY_FALLOS", "0") or 0),
+}
+_azar = random.Random(os.getenv("INVER_REPLAY_SEMILLA"))
+
+
+def configurar(
+    modo: str | None = None,
+    directorio: str | None = None,
+    latencia_ms: float | None = None,
+    tasa_fallos: float | None = None,
+    semilla: int | None = None,
+) -> dict:
+    """Cambia la configuración en caliente (scripts de carga y perfilado)."""
+    with _lock:
+        if modo is not None:
+            if modo not in MODOS:
+                raise ValueError(f"Modo de replay desconocido: {modo}")
+            _config["modo"] = modo
+        if directorio is not None:
+            _config["directorio"] = directorio
+        if latencia_ms is not None:
+            _config["latencia_ms"] = float(latencia_ms)
+        if tasa_fallos is not None:
+            _config["tasa_fallos"] = float(tasa_fallos)
+        if semilla is not None:
+            _azar.seed(semilla)
+        return dict(_config)
+
+
+def modo() -> str:
+    return _config["modo"]
+
+
+def pausa(minimo: float, maximo: float) -> None:
+    """Espera de cortesía entre peticiones; se omite al reproducir fixtures."""
+    if modo() != "replay":
+        time.sleep(random.uniform(minimo, maximo))
+
+
+def _inyectar_latencia_y_fallos(descripcion: str) -> None:
+    if _config["latencia_ms"] > 0:
+        time.sleep(_config["latencia_ms"] / 1000)
+    if _config["tasa_fallos"] > 0:
+        with _lock:
+            tirada = _azar.random()
+            tipo = _azar.random()
+        if tirada < _config["tasa_fallos"]:
+            if tipo < 0.5:
+                raise requests.Timeout(f"Timeout inyectado: {descripcion}")
+            raise requests.ConnectionError(f"Fallo de conexión inyectado: {descripcion}")
+
+
+# ============================================================
+# FIXTURES HTTP
+# ============================================================
+
+def _url_sin_secretos(url: str) -> str:
+    partes = urlsplit(url)
+    params = sorted(
+        (k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if k.lower() not in PARAMETROS_SECRETOS
+    )
+    return urlunsplit((partes.scheme, partes.netloc, partes.path, urlencode(params), ""))
+
+
+def _rutas_fixture_http(request: requests.PreparedRequest) -> tuple[str, str, str]:
+    url = _url_sin_secretos(request.url)
+    clave = hashlib.sha1(f"{request.method} {url}".encode("utf-8")).hexdigest()[:20]
+    base = os.path.join(_config["directorio"], "http", urlsplit(url).netloc, clave)
+    return url, base + ".json", base + ".body"
+
+
+def _grabar_http(request: requests.PreparedRequest, resp: requests.Response) -> None:
+    url, ruta_meta, ruta_cuerpo = _rutas_fixture_http(request)
+    meta = {
+        "method": request.method,
+        "url": url,
+        "status": resp.status_code,
+        "reason": resp.reason,
+        "encoding": resp.encoding,
+        "headers": {h: resp.headers[h] for h in CABECERAS_GRABADAS if h in resp.headers},
+    }
+    os.makedirs(os.path.dirname(ruta_meta), exist_ok=True)
+    with open(ruta_cuerpo, "wb") as f:
+        f.write(resp.content)
+    with open(ruta_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+
+def _respuesta_grabada(request: requests.PreparedRequest, adaptador: HTTPAdapter) -> requests.Response:
+    url, ruta_meta, ruta_cuerpo = _rutas_fixture_http(request)
+    try:
+        with open(ruta_meta, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(ruta_cuerpo, "rb") as f:
+            cuerpo = f.read()
+    except OSError:
+        raise requests.ConnectionError(f"Sin fixture para {request.method} {url}", request=request)
+
+    resp = requests.Response()
+    resp.status_code = meta["status"]
+    resp.reason = meta.get("reason")
+    resp.headers = CaseInsensitiveDict(meta.get("headers", {}))
+    resp.encoding = meta.get("encoding")
+    resp._content = cuerpo
+    resp._content_consumed = True
+    resp.url = request.url
+    resp.request = request
+    resp.connection = adaptador
+    resp.elapsed = timedelta(milliseconds=_config["latencia_ms"])
+    return resp
+
+
+class AdaptadorReplay(HTTPAdapter):
+    """HTTPAdapter que, según el modo, graba o reproduce las respuestas."""
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        modo_actual = modo()
+        if modo_actual == "live":
+            return super().send(request, stream=stream, timeout=timeout,
+                                verify=verify, cert=cert, proxies=proxies)
+
+        for cabecera in CABECERAS_CONDICIONALES:
+            request.headers.pop(cabecera, None)
+
+        if modo_actual == "replay":
+            _inyectar_latencia_y_fallos(_url_sin_secretos(request.url))
+            return _respuesta_grabada(request, self)
+
+        resp = super().send(request, stream=False, timeout=timeout,
+                            verify=verify, cert=cert, proxies=proxies)
+        _grabar_http(request, resp)
+        return resp
+
+
+# ============================================================
+# MSTARPY
+# ============================================================
+
+def _ruta_fixture_mstar(term: str, metodo: str, args: tuple, kwargs: dict) -> str:
+    firma = json.dumps([args, kwargs], sort_keys=True, default=str)
+    sufijo = hashlib.sha1(firma.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(_config["directorio"], "mstar", str(term), f"{metodo}-{sufijo}.json")
+
+
+class FundsReplay:
+    """
+    Proxy de mstarpy.Funds: en 'record' delega en el objeto real y guarda
+    cada resultado; en 'replay' devuelve lo grabado sin instanciar mstarpy.
+    """
+
+    def __init__(self, term, *args, **kwargs):
+        self._term = term
+        self._real = None
+        if modo() != "replay":
+            from mstarpy import Funds as FundsMstar
+            self._real = FundsMstar(term, *args, **kwargs)
+
+    def _reproducir(self, ruta: str):
+        _inyectar_latencia_y_fallos(ruta)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                grabado = json.load(f)
+        except OSError:
+            raise requests.ConnectionError(f"Sin fixture mstarpy: {ruta}")
+        if "error" in grabado:
+            raise RuntimeError(grabado["error"])
+        return grabado["resultado"]
+
+    def _grabar(self, ruta: str, contenido: dict) -> None:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(contenido, f, ensure_ascii=False, default=str)
+
+    def __getattr__(self, nombre):
+        if nombre.startswith("_"):
+            raise AttributeError(nombre)
+
+        if modo() == "replay":
+            ruta_atributo = _ruta_fixture_mstar(self._term, nombre, (), {"__atributo__": True})
+            if os.path.exists(ruta_atributo):
+                return self._reproducir(ruta_atributo)
+            return lambda *args, **kwargs: self._reproducir(
+                _ruta_fixture_mstar(self._term, nombre, args, kwargs)
+            )
+
+        valor = getattr(self._real, nombre)
+        if not callable(valor):
+            if modo() == "record":
+                ruta = _ruta_fixture_mstar(self._term, nombre, (), {"__atributo__": True})
+                self._grabar(ruta, {"resultado": valor})
+            return valor
+
+        if modo() == "live":
+            return valor
+
+        def llamada_grabada(*args, **kwargs):
+            ruta = _ruta_fixture_mstar(self._term, nombre, args, kwargs)
+            try:
+                resultado = valor(*args, **kwargs)
+            except Exception as e:
+                self._grabar(ruta, {"error": f"{type(e).__name__}: {e}"})
+                raise
+            self._grabar(ruta, {"resultado": resultado})
+            return resultado
+
+        return llamada_grabada
+
+
+def Funds(term, *args, **kwargs):
+    """Sustituto de mstarpy.Funds que respeta el modo de grabación/reproducción."""
+    if modo() == "live":
+        from mstarpy import Funds as FundsMstar
+        return FundsMstar(term, *args, **kwargs)
+    return FundsReplay(term, *args, **kwargs)
@@ -0,0 +1,90 @@
+"""
+Listado paginado de carteras guardadas con resumen calculado en Mongo.
+
+Gestion_Carteras cargaba en cada rerun todas las carteras de fondos y de
+ETFs con sus arrays de activos completos (find().sort(...)) para mostrar
+solo ID, fecha, perfil y número de activos. Aquí el listado es una
+agregación que:
+  - ordena por fecha_creacion (índice descendente, con _id de desempate)
+    y corta la página con $skip/$limit antes de proyectar, así que solo se
+    leen las carteras de la página;
+  - resume cada cartera en el servidor: número de activos ($size), suma de
+    pesos ($sum), perfil/región/horizonte (directos o en 'metas', como en
+    las carteras antiguas) y las métricas guardadas al crearla.
+Los activos completos solo se leen con cargar_cartera al abrir una cartera
+para editarla.
+"""
+
+from pymongo import DESCENDING
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+CARTERAS = {
+    "Fondos": {"coleccion": "carteras_fondos", "activos": "fondos"},
+    "ETFs": {"coleccion": "carteras_etf", "activos": "etfs"},
+}
+
+_indices_creados = set()
+
+
+# ============================================================
+# ÍNDICES
+# ============================================================
+
+def asegurar_indices(db, tipo: str) -> None:
+    """Índice del orden del listado, fecha de creación y _id (una vez por proceso)."""
+    if tipo in _indices_creados:
+        return
+    db[CARTERAS[tipo]["coleccion"]].create_index([("fecha_creacion", DESCENDING), ("_id", DESCENDING)])
+    _indices_creados.add(tipo)
+
+
+# ============================================================
+# LISTADO
+# ============================================================
+
+def _pipeline_resumen(campo_activos: str, saltar: int, limite: int) -> list[dict]:
+    activos = {"$ifNull": [f"${campo_activos}", []]}
+    return [
+        {"$sort": {"fecha_creacion": DESCENDING, "_id": DESCENDING}},
+        {"$skip": saltar},
+        {"$limit": limite},
+        {"$project": {
+            "cartera_id": 1,
+            "fecha_creacion": 1,
+            "origen": 1,
+            "perfil": {"$ifNull": ["$perfil", "$metas.perfil"]},
+            "region": {"$ifNull": ["$region", "$metas.region"]},
+            "horizonte": {"$ifNull": ["$horizonte", "$metas.horizonte"]},
+            "metricas": 1,
+            "n_activos": {"$size": activos},
+            "peso_total": {"$sum": f"${campo_activos}.peso"},
+        }},
+    ]
+
+
+def obtener_pagina_carteras(db, tipo: str, pagina: int, filas_por_pagina: int) -> dict:
+    """
+    Una página del listado de carteras ('tipo' = "Fondos" o "ETFs"), de más
+    reciente a más antigua: {"filas", "total", "paginas", "pagina"}. Si la
+    página pedida ya no existe (p. ej. tras borrar) se devuelve la última.
+    """
+    config = CARTERAS[tipo]
+    asegurar_indices(db, tipo)
+    coleccion = db[config["coleccion"]]
+
+    total = coleccion.count_documents({})
+    paginas = max(1, -(-total // filas_por_pagina))
+    pagina = min(max(pagina, 1), paginas)
+
+    filas = list(coleccion.aggregate(
+        _pipeline_resumen(config["activos"], (pagina - 1) * filas_por_pagina, filas_por_pagina)
+    ))
+    return {"filas": filas, "total": total, "paginas": paginas, "pagina": pagina}
+
+
+def cargar_cartera(db, tipo: str, cartera_oid) -> dict | None:
+    """Documento completo de una cartera (con sus activos), para editarla."""
+    return db[CARTERAS[tipo]["coleccion"]].find_one({"_id": cartera_oid})
@@ -5,13 +5,16 @@ Fuentes:
  - Previsiones: consensus de analistas (Morningstar, CBO, ING, Oxford Economics, etc.)
 """
 
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, UTC
-import re
+import hashlib
+import json
 import os
 
-from src import previsiones_dinamicas
+from pymongo import UpdateOne
+
+from src import http_cliente, previsiones_dinamicas
+from src.extraccion_html import extraer_porcentaje, filas_tablas, normalizar_plazo
+from src.servicio_curvas import invalidar_cache_curvas
 
 # Módulo de previsiones dinámicas (FRED + ECB + MoF JP + ChinaBond)
 try:
@@ -103,6 +106,7 @@ PAISES = {
 # PLAZOS QUE NOS INTERESAN
 # ============================================================
 # Mapeo de nombres que aparecen en la web → nuestro identificador
+# (el reconocimiento lo hace extraccion_html.RE_PLAZO con un único patrón)
 PLAZOS_OBJETIVO = {
     "3 months":  "3M",
     "6 months":  "6M",
@@ -138,40 +142,32 @@ HEADERS = {
 # ============================================================
 
 def _normalizar_plazo(texto: str) -> str | None:
-    """Normaliza el texto de un plazo encontrado en la web."""
-    t = texto.strip().lower()
-    for clave, codigo in PLAZOS_OBJETIVO.items():
-        if clave in t:
-            return codigo
-    # Patrones alternativos
-    if re.search(r"\b3\s*m", t):
-        return "3M"
-    if re.search(r"\b6\s*m", t):
-        return "6M"
-    if re.search(r"\b1\s*y", t):
-        return "1Y"
-    if re.search(r"\b2\s*y", t):
-        return "2Y"
-    if re.search(r"\b5\s*y", t):
-        return "5Y"
-    if re.search(r"\b10\s*y", t):
-        return "10Y"
-    if re.search(r"\b30\s*y", t):
-        return "30Y"
-    return None
+    """Normaliza el texto de un plazo encontrado en la web ("10 years" → "10Y")."""
+    return normalizar_plazo(texto)
 
 
 def _extraer_rendimiento(texto: str) -> float | None:
-    """Extrae un valor porcentual de un texto."""
-    # Buscar patrones como "4.500%", "2.15 %", "-0.10%"
-    match = re.search(r"(-?\d+[\.,]\d+)\s*%", texto)
-    if match:
-        return float(match.group(1).replace(",", "."))
-    # Sólo número
-    match = re.search(r"(-?\d+[\.,]\d+)", texto)
-    if match:
-        return float(match.group(1).replace(",", "."))
-    return None
+    """Extrae un valor porcentual de un texto ("4.500%", "2.15 %", "-0.10")."""
+    return extraer_porcentaje(texto)
+
+
+def _parsear_curva(contenido: bytes | str) -> dict[str, float]:
+    """Extrae plazo → rendimiento de las filas de las tablas de la página."""
+    rendimientos = {}
+    for celdas in filas_tablas(contenido):
+        if len(celdas) < 2:
+            continue
+
+        # La primera celda suele ser el plazo, la segunda el yield
+        plazo = _normalizar_plazo(celdas[0])
+        if plazo:
+            # Buscar el rendimiento en las celdas restantes
+            for texto in celdas[1:]:
+                valor = _extraer_rendimiento(texto)
+                if valor is not None:
+                    rendimientos[plazo] = valor
+                    break
+    return rendimientos
 
 
 def _scrape_yield_curve(url: str) -> dict[str, float]:
@@ -179,38 +175,13 @@ def _scrape_yield_curve(url: str) -> dict[str, float]:
     Scrapea worldgovernmentbonds.com para obtener la curva de tipos.
     Retorna dict con plazo -> rendimiento.
     """
-    rendimientos = {}
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = http_cliente.obtener(url, headers=HEADERS, timeout=15)
         resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        # Buscar tablas con datos de rendimiento
-        tables = soup.find_all("table")
-
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                cells = row.find_all("td")
-                if len(cells) < 2:
-                    continue
-
-                # La primera celda suele ser el plazo, la segunda el yield
-                plazo_text = cells[0].get_text(strip=True)
-                plazo = _normalizar_plazo(plazo_text)
-
-                if plazo:
-                    # Buscar el rendimiento en las celdas restantes
-                    for cell in cells[1:]:
-                        valor = _extraer_rendimiento(cell.get_text(strip=True))
-                        if valor is not None:
-                            rendimientos[plazo] = valor
-                            break
-
+        return _parsear_curva(resp.content)
     except Exception as e:
         print(f"[WARN] Error scraping {url}: {e}")
-
-    return rendimientos
+        return {}
 
 
 def obtener_curva_pais(codigo: str, _previsiones_cache: dict = None) -> dict:
@@ -318,15 +289,120 @@ def obtener_todas_las_curvas() -> list[dict]:
 # ============================================================
 # GUARDAR EN MONGODB
 # ============================================================
+# Esquema de almacenamiento:
+#   - 'curvas_tipos'        → cabecera de snapshot (con 'paises' completo).
+#                             Solo se inserta un documento nuevo cuando el
+#                             contenido cambia; si no, se actualiza la fecha
+#                             de verificación del último.
+#   - 'curvas_tipos_puntos' → una fila estrecha por país/plazo/fecha (día).
+#                             Solo se escribe cuando el punto cambia respecto
+#                             a la última fila guardada (persistencia delta).
+# ============================================================
+
+COLECCION_PUNTOS = "curvas_tipos_puntos"
+
+_indices_creados = False
+
+
+def _asegurar_indices(db) -> None:
+    """Crea (una vez por proceso) los índices de las colecciones de curvas."""
+    global _indices_creados
+    if _indices_creados:
+        return
+    db[COLECCION_PUNTOS].create_index(
+        [("codigo", 1), ("plazo", 1), ("fecha", -1)], unique=True
+    )
+    db["curvas_tipos"].create_index([("fecha_consulta", -1)])
+    _indices_creados = True
+
+
+def _huella(contenido) -> str:
+    """Hash estable de un contenido serializable (para detectar cambios)."""
+    texto = json.dumps(contenido, sort_keys=True, default=str)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def _huella_punto(pais: dict, plazo: dict) -> str:
+    return _huella({
+        "rendimiento_actual": plazo.get("rendimiento_actual"),
+        "origen": plazo.get("origen"),
+        "previsiones": plazo.get("previsiones", {}),
+        "calidad": pais.get("calidad_previsiones"),
+    })
+
+
+def _huella_curvas(datos: list[dict]) -> str:
+    """Huella del contenido de un snapshot completo (sin fechas de consulta)."""
+    return _huella(sorted(
+        [d["codigo"], [[p["plazo"], _huella_punto(d, p)] for p in d.get("plazos", [])]]
+        for d in datos
+    ))
+
+
+def _guardar_puntos(db, datos: list[dict], ahora: datetime, consulta_id: str) -> int:
+    """
+    Escribe las filas estrechas país/plazo/fecha que han cambiado.
+    Retorna el número de filas escritas.
+    """
+    collection = db[COLECCION_PUNTOS]
+    claves = [{"codigo": pais["codigo"], "plazo": plazo["plazo"]}
+              for pais in datos for plazo in pais.get("plazos", [])]
+    if not claves:
+        return 0
+
+    # Última fila guardada de cada país/plazo que se va a escribir (una sola
+    # consulta; con el índice codigo/plazo/fecha se lee una entrada por clave
+    # y no crece con el histórico)
+    ultimas = {
+        (r["_id"]["codigo"], r["_id"]["plazo"]): r["huella"]
+        for r in collection.aggregate([
+            {"$match": {"$or": claves}},
+            {"$sort": {"codigo": 1, "plazo": 1, "fecha": -1}},
+            {"$group": {
+                "_id": {"codigo": "$codigo", "plazo": "$plazo"},
+                "huella": {"$first": "$huella"},
+            }},
+        ])
+    }
+
+    fecha = ahora.strftime("%Y-%m-%d")
+    operaciones = []
+    for pais in datos:
+        for plazo in pais.get("plazos", []):
+            huella = _huella_punto(pais, plazo)
+            if ultimas.get((pais["codigo"], plazo["plazo"])) == huella:
+                continue
+            operaciones.append(UpdateOne(
+                {"codigo": pais["codigo"], "plazo": plazo["plazo"], "fecha": fecha},
+                {"$set": {
+                    "rendimiento_actual": plazo["rendimiento_actual"],
+                    "origen": plazo.get("origen"),
+                    "previsiones": plazo.get("previsiones", {}),
+                    "calidad": pais.get("calidad_previsiones"),
+                    "huella": huella,
+                    "fecha_consulta": ahora,
+                    "consulta_id": consulta_id,
+                }},
+                upsert=True,
+            ))
+
+    if operaciones:
+        collection.bulk_write(operaciones, ordered=False)
+    return len(operaciones)
+
 
 def guardar_curvas_en_mongodb(db, datos: list[dict]) -> dict:
     """
-    Guarda los datos de curvas de tipos en la colección
-    'curvas_tipos' de MongoDB.
+    Guarda los datos de curvas de tipos en MongoDB con persistencia delta.
+
+    Si el contenido es idéntico al último snapshot no se inserta ningún
+    documento nuevo: solo se marca la verificación en el existente.
     Incluye resumen de calidad de previsiones por país.
     """
+    _asegurar_indices(db)
     collection = db["curvas_tipos"]
     ahora = datetime.now(UTC)
+    consulta_id = f"CT-{ahora.strftime('%Y%m%d-%H%M%S')}"
 
     resumen_calidad = {
         d["codigo"]: {
@@ -337,9 +413,34 @@ def guardar_curvas_en_mongodb(db, datos: list[dict]) -> dict:
         for d in datos
     }
 
+    huella = _huella_curvas(datos)
+    puntos_escritos = _guardar_puntos(db, datos, ahora, consulta_id)
+
+    ultimo = collection.find_one(
+        {}, {"_id": 1, "huella": 1, "consulta_id": 1}, sort=[("_id", -1)]
+    )
+    if ultimo and ultimo.get("huella") == huella:
+        collection.update_one(
+            {"_id": ultimo["_id"]},
+            {"$set": {"fecha_ultima_verificacion": ahora},
+             "$inc": {"num_verificaciones": 1}},
+        )
+        return {
+            "inserted_id": str(ultimo["_id"]),
+            "consulta_id": ultimo.get("consulta_id", consulta_id),
+            "num_paises": len(datos),
+            "fecha": ahora,
+            "resumen_calidad": resumen_calidad,
+            "duplicado": True,
+            "puntos_escritos": puntos_escritos,
+        }
+
     documento = {
         "fecha_consulta": ahora,
-        "consulta_id": f"CT-{ahora.strftime('%Y%m%d-%H%M%S')}",
+        "fecha_ultima_verificacion": ahora,
+        "num_verificaciones": 1,
+        "consulta_id": consulta_id,
+        "huella": huella,
         "paises": datos,
         "num_paises": len(datos),
         "resumen_calidad": resumen_calidad,
@@ -349,6 +450,7 @@ def guardar_curvas_en_mongodb(db, datos: list[dict]) -> dict:
     }
 
     result = collection.insert_one(documento)
+    invalidar_cache_curvas()
 
     return {
         "inserted_id": str(result.inserted_id),
@@ -356,6 +458,8 @@ def guardar_curvas_en_mongodb(db, datos: list[dict]) -> dict:
         "num_paises": len(datos),
         "fecha": ahora,
         "resumen_calidad": resumen_calidad,
+        "duplicado": False,
+        "puntos_escritos": puntos_escritos,
     }
 
 
@@ -366,6 +470,18 @@ def obtener_ultimo_registro_curvas(db) -> dict | None:
     return doc
 
 
+def obtener_serie_plazo(db, codigo: str, plazo: str, desde: str | None = None) -> list[dict]:
+    """
+    Devuelve la serie histórica (filas delta) de un país/plazo ordenada por fecha.
+    Cada fila es válida hasta la fecha de la siguiente.
+    """
+    filtro = {"codigo": codigo, "plazo": plazo}
+    if desde:
+        filtro["fecha"] = {"$gte": desde}
+    proyeccion = {"_id": 0, "fecha": 1, "rendimiento_actual": 1, "previsiones": 1, "calidad": 1}
+    return list(db[COLECCION_PUNTOS].find(filtro, proyeccion).sort("fecha", 1))
+
+
 if __name__ == "__main__":
     print("Obteniendo curvas de tipos...")
     datos = obtener_todas_las_curvas()
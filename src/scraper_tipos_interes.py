@@ -5,11 +5,12 @@ Fuentes:
  - Previsiones: consensus de analistas (fuentes públicas: Goldman Sachs, ING, JP Morgan, etc.)
 """
 
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, UTC
 import re
 
+from src import http_cliente
+from src.extraccion_html import extraer_porcentaje, filas_tablas, texto_documento
+
 
 # ============================================================
 # CONFIGURACIÓN DE BANCOS CENTRALES
@@ -104,47 +105,40 @@ HEADERS = {
 # FUNCIONES DE SCRAPING
 # ============================================================
 
+# "current ... 4.50 %" acotado a 200 caracteres sin otro porcentaje en medio
+RE_TIPO_EN_TEXTO = re.compile(
+    r"(?:current|actual|present)[^%]{0,200}?(\d+[\.,]\d+)\s*%",
+    re.IGNORECASE,
+)
+
+
+def _parsear_tipo_global_rates(contenido: bytes | str) -> float | None:
+    """Primer porcentaje de las tablas de global-rates.com (o del texto como fallback)."""
+    # Buscar tablas con datos de tipos
+    filas = filas_tablas(contenido, clase="tabledata1") or filas_tablas(contenido)
+    for celdas in filas:
+        for texto in celdas:
+            # Buscar patrones como "4.500 %" o "2.150%"
+            valor = extraer_porcentaje(texto, solo_con_simbolo=True)
+            if valor is not None:
+                return valor
+
+    # Buscar "current ... rate" seguido de un porcentaje como fallback
+    match = RE_TIPO_EN_TEXTO.search(texto_documento(contenido))
+    if match:
+        return float(match.group(1).replace(",", "."))
+    return None
+
+
 def _extraer_tipo_global_rates(url: str) -> float | None:
     """
     Scrapea global-rates.com para obtener el tipo de interés actual.
     Busca el valor en la primera tabla de la página.
     """
     try:
-        resp = requests.get(url, headers=HEADERS, timeout=15)
+        resp = http_cliente.obtener(url, headers=HEADERS, timeout=15)
         resp.raise_for_status()
-
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        # Buscar tablas con datos de tipos
-        tables = soup.find_all("table", class_="tabledata1")
-        if not tables:
-            tables = soup.find_all("table")
-
-        for table in tables:
-            rows = table.find_all("tr")
-            for row in rows:
-                cells = row.find_all("td")
-                for cell in cells:
-                    text = cell.get_text(strip=True)
-                    # Buscar patrones como "4.500 %" o "2.150%"
-                    match = re.search(r"(\d+[\.,]\d+)\s*%", text)
-                    if match:
-                        valor = match.group(1).replace(",", ".")
-                        return float(valor)
-
-        # Buscar en todo el texto de la página como fallback
-        page_text = soup.get_text()
-        # Buscar "current ... rate" seguido de un porcentaje
-        match = re.search(
-            r"(?:current|actual|present).*?(\d+[\.,]\d+)\s*%",
-            page_text,
-            re.IGNORECASE
-        )
-        if match:
-            return float(match.group(1).replace(",", "."))
-
-        return None
-
+        return _parsear_tipo_global_rates(resp.content)
     except Exception as e:
         print(f"[WARN] Error scraping {url}: {e}")
         return None
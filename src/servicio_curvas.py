@@ -0,0 +1,172 @@
+"""
+Servicio compartido de curvas de tipos para los constructores automáticos.
+
+Carga el último snapshot de 'curvas_tipos' una sola vez por TTL y precalcula
+las curvas de cada región y la curva GLOBAL (media de todos los países).
+Las curvas continuas (CurvaTipos) se construyen bajo demanda y se guardan
+junto al snapshot, así que se interpolan una sola vez por snapshot.
+
+Invalidación:
+  - Al insertar un snapshot nuevo desde este proceso (guardar_curvas_en_mongodb
+    llama a invalidar_cache_curvas).
+  - Al expirar el TTL se comprueba solo el _id del último documento; si no ha
+    cambiado se reutilizan las curvas precalculadas sin volver a descargarlas.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from src.curva_tipos import CurvaTipos, anno_objetivo, construir_curva, movimiento_esperado
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+TTL_SEGUNDOS = 300
+
+_lock = threading.Lock()
+_cache = {
+    "id": None,          # _id del snapshot cargado
+    "verificado": 0.0,   # instante (monotonic) de la última verificación
+    "curvas": {},        # código región → curva
+    "continuas": {},     # (región, año previsión, método) → CurvaTipos
+}
+
+
+# ============================================================
+# PRECÁLCULO
+# ============================================================
+
+def _calcular_curva_global(paises: list[dict]) -> dict | None:
+    """Promedia, plazo a plazo, el rendimiento actual y las previsiones de todos los países."""
+    if not paises:
+        return None
+
+    plazos_data = {}
+    for p in paises:
+        for pl in p.get("plazos", []):
+            datos = plazos_data.setdefault(pl["plazo"], {"actuals": [], "prevs": {}})
+            datos["actuals"].append(pl["rendimiento_actual"])
+            for yr, val in pl.get("previsiones", {}).items():
+                datos["prevs"].setdefault(yr, []).append(val)
+
+    global_curve = {"codigo": "GLOBAL", "nombre": "Global", "emoji": "🌐", "plazos": []}
+    for pl_cod, datos in plazos_data.items():
+        global_curve["plazos"].append({
+            "plazo": pl_cod,
+            "rendimiento_actual": sum(datos["actuals"]) / len(datos["actuals"]),
+            "previsiones": {yr: sum(vals) / len(vals) for yr, vals in datos["prevs"].items()},
+        })
+    return global_curve
+
+
+def _precalcular_curvas(doc: dict) -> dict[str, dict]:
+    paises = doc.get("paises", [])
+    curvas = {p["codigo"]: p for p in paises}
+    curva_global = _calcular_curva_global(paises)
+    if curva_global:
+        curvas["GLOBAL"] = curva_global
+    return curvas
+
+
+# ============================================================
+# API PÚBLICA
+# ============================================================
+
+def invalidar_cache_curvas() -> None:
+    """Fuerza la recarga de curvas en la próxima consulta."""
+    with _lock:
+        _cache["id"] = None
+        _cache["verificado"] = 0.0
+        _cache["curvas"] = {}
+        _cache["continuas"] = {}
+
+
+def obtener_curvas(db) -> dict[str, dict]:
+    """
+    Devuelve todas las curvas precalculadas del último snapshot
+    (códigos de país + "GLOBAL"), respetando el TTL de la caché.
+    """
+    ahora = time.monotonic()
+    with _lock:
+        if _cache["id"] is not None and ahora - _cache["verificado"] < TTL_SEGUNDOS:
+            return _cache["curvas"]
+
+    collection = db["curvas_tipos"]
+    cabecera = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if not cabecera:
+        return {}
+
+    with _lock:
+        if cabecera["_id"] == _cache["id"]:
+            _cache["verificado"] = ahora
+            return _cache["curvas"]
+
+    doc = collection.find_one({"_id": cabecera["_id"]}, {"paises": 1})
+    curvas = _precalcular_curvas(doc or {})
+
+    with _lock:
+        _cache["id"] = cabecera["_id"]
+        _cache["verificado"] = ahora
+        _cache["curvas"] = curvas
+        _cache["continuas"] = {}
+    return curvas
+
+
+def obtener_curva(db, pais_code: str = "EUR") -> dict | None:
+    """Curva del último snapshot para una región ("EUR", "US", "JP", "CN" o "GLOBAL")."""
+    return obtener_curvas(db).get(pais_code)
+
+
+def obtener_curva_continua(
+    db, pais_code: str = "EUR", anno: str | None = None, metodo: str = "pchip"
+) -> CurvaTipos | None:
+    """
+    Curva continua de una región: actual (anno=None) o prevista para 'anno'.
+    Se construye una vez por snapshot y método.
+    """
+    curvas = obtener_curvas(db)
+    clave = (pais_code, anno, metodo)
+    with _lock:
+        if _cache["curvas"] is curvas and clave in _cache["continuas"]:
+            return _cache["continuas"][clave]
+
+    objeto = construir_curva(curvas.get(pais_code), anno, metodo)
+
+    with _lock:
+        if _cache["curvas"] is curvas:
+            _cache["continuas"][clave] = objeto
+    return objeto
+
+
+def obtener_movimiento_tipos(db, pais_code: str, duraciones, horizonte: int, metodo: str = "pchip") -> np.ndarray:
+    """
+    Movimiento esperado de tipos (actual − previsto) a la duración de cada
+    activo, en una sola evaluación vectorizada. Ceros si no hay curva.
+    """
+    actual = obtener_curva_continua(db, pais_code, None, metodo)
+    proyectada = obtener_curva_continua(db, pais_code, anno_objetivo(horizonte), metodo)
+    return movimiento_esperado(actual, proyectada, duraciones)
+
+
+# ============================================================
+# HISTORIAL (página de curvas)
+# ============================================================
+
+def obtener_historial_curvas(db, limite: int = 10) -> list[dict]:
+    """
+    Devuelve el resumen de los últimos snapshots (sin el detalle por país),
+    pensado para la tabla de historial.
+    """
+    collection = db["curvas_tipos"]
+    proyeccion = {
+        "consulta_id": 1,
+        "fecha_consulta": 1,
+        "fecha_ultima_verificacion": 1,
+        "num_verificaciones": 1,
+        "num_paises": 1,
+        "tiene_datos_degradados": 1,
+    }
+    return list(collection.find({}, proyeccion).sort("_id", -1).limit(limite))
@@ -0,0 +1,385 @@
+"""
+Simulación Monte Carlo de la curva de tipos y de la rentabilidad de una cartera.
+
+Los constructores proyectan un único camino determinista
+(ytm + movimiento · duración / horizonte). Aquí se simulan miles de caminos
+correlacionados de la curva y se revalorizan los fondos de la cartera en
+cada uno, para mostrar la distribución de resultados y el VaR.
+
+Modelo (factores PCA con dinámica Vasicek):
+  - Historia: filas delta de 'curvas_tipos_puntos' (válidas hasta la
+    siguiente), muestreadas semanalmente en una ventana de VENTANA_SEMANAS.
+    GLOBAL promedia los cambios de todos los países, como la curva GLOBAL
+    del servicio promedia los niveles.
+  - PCA de los cambios semanales → hasta MAX_FACTORES factores (nivel,
+    pendiente, curvatura) con sus cargas por plazo.
+  - Cada factor sigue un Vasicek  dX = κ(θ − X)dt + σ dW  con κ y σ
+    calibrados por AR(1) sobre el nivel acumulado del factor (con corrección
+    de sesgo y contraste de raíz unitaria; ver _calibrar_vasicek). θ se fija para
+    que el camino medio llegue, al final del horizonte, a la curva prevista
+    del snapshot: la media de la simulación coincide así con la proyección
+    determinista de los constructores y la dispersión sale de la historia.
+  - Con menos de MIN_SEMANAS de historia se usa una estructura por defecto
+    (volatilidades típicas por plazo y correlación decreciente con la
+    distancia entre plazos).
+
+Revalorización, vectorizada sobre caminos × pasos × fondos:
+    R_i(t) = ytm_i · t − D_i · Δy_i(t) + ½ · C_i · Δy_i(t)² / 100
+con Δy_i el cambio de tipos (puntos %) a la duración de cada fondo
+(interpolación lineal entre plazos) y C_i ≈ D_i² si no se da la convexidad.
+Para simulaciones grandes se puede repartir por bloques en un pool de procesos.
+"""
+
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.curva_tipos import CurvaTipos, anno_objetivo, puntos_curva
+from src.previsiones_dinamicas import DURACION_ANOS
+from src.servicio_curvas import obtener_curva
+
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+COLECCION_PUNTOS = "curvas_tipos_puntos"
+
+VENTANA_SEMANAS = 260
+MIN_SEMANAS = 26
+SEMANAS_ANO = 52
+
+MAX_FACTORES = 3
+VARIANZA_OBJETIVO = 0.99
+
+# Reversión a la media (1/años) si la historia no permite estimarla
+KAPPA_DEFECTO = 0.3
+# Con cinco años de historia no se distingue una reversión más rápida que
+# KAPPA_MAX de un paseo aleatorio; KAPPA_MIN es el paseo aleatorio
+KAPPA_MIN, KAPPA_MAX = 0.02, 0.3
+# Valor crítico de Dickey-Fuller (1%, con constante): si el estadístico t de
+# b − 1 no baja de aquí, el nivel del factor se trata como paseo aleatorio
+VALOR_CRITICO_DF = -3.43
+
+# Estructura por defecto: volatilidad anual (puntos %) por plazo y
+# correlación exp(-DECAIMIENTO · |ln t_i − ln t_j|)
+VOL_DEFECTO = {0.25: 0.70, 0.5: 0.75, 1.0: 0.80, 2.0: 0.90, 5.0: 0.90, 10.0: 0.85, 30.0: 0.80}
+DECAIMIENTO_CORRELACION = 0.35
+
+N_CAMINOS = 5000
+PASOS_ANO = 12
+PERCENTILES = (5, 25, 50, 75, 95)
+NIVEL_VAR = 0.95
+
+# Por encima de estos caminos, y si se piden procesos, se reparte en bloques
+MIN_CAMINOS_POOL = 20000
+
+_lock = threading.Lock()
+_modelos = {}   # (código, última fecha, semanas, día) → modelo calibrado
+
+
+# ============================================================
+# HISTORIA
+# ============================================================
+
+def _leer_historia(db, codigo: str, desde: str) -> dict[str, dict[float, list]]:
+    """{país: {plazo en años: [(fecha, rendimiento)]}} desde 'desde' (más la fila vigente)."""
+    filtro = {"plazo": {"$in": list(DURACION_ANOS)}}
+    if codigo != "GLOBAL":
+        filtro["codigo"] = codigo
+    filas = db[COLECCION_PUNTOS].find(filtro, {"_id": 0, "codigo": 1, "plazo": 1, "fecha": 1, "rendimiento_actual": 1})
+
+    series = {}
+    for f in filas:
+        if f.get("rendimiento_actual") is None:
+            continue
+        serie = series.setdefault(f["codigo"], {}).setdefault(DURACION_ANOS[f["plazo"]], [])
+        serie.append((f["fecha"], float(f["rendimiento_actual"])))
+
+    # Solo interesa la ventana, pero se conserva la última fila anterior (vigente al inicio)
+    for plazos in series.values():
+        for plazo, serie in plazos.items():
+            serie.sort()
+            anteriores = [i for i, (fecha, _) in enumerate(serie) if fecha < desde]
+            if anteriores:
+                plazos[plazo] = serie[anteriores[-1]:]
+    return series
+
+
+def _ultima_fecha(db, codigo: str) -> str | None:
+    """Fecha de la fila más reciente del código (clave de la caché de modelos)."""
+    filtro = {"plazo": {"$in": list(DURACION_ANOS)}}
+    if codigo != "GLOBAL":
+        filtro["codigo"] = codigo
+    ultima = db[COLECCION_PUNTOS].find_one(filtro, {"_id": 0, "fecha": 1}, sort=[("fecha", -1)])
+    return ultima["fecha"] if ultima else None
+
+
+def _cambios_semanales(series: dict, semanas: int, hoy: date) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cambios semanales de rendimiento (semanas, plazos) al cierre de cada
+    semana. Con varios países se promedian los cambios (no los niveles, para
+    que la entrada de un país nuevo no cree saltos). Solo se devuelven las
+    semanas con dato en todos los plazos. Devuelve (plazos, cambios).
+    """
+    plazos = np.array(sorted({p for por_plazo in series.values() for p in por_plazo}))
+    if len(plazos) == 0:
+        return plazos, np.empty((0, 0))
+
+    cierres = [(hoy - timedelta(weeks=k)).isoformat() for k in range(semanas, -1, -1)]
+    paneles = []
+    for por_plazo in series.values():
+        panel = np.full((len(cierres), len(plazos)), np.nan)
+        for j, plazo in enumerate(plazos):
+            serie = por_plazo.get(plazo)
+            if not serie:
+                continue
+            fechas = [fecha for fecha, _ in serie]
+            valores = np.array([valor for _, valor in serie])
+            idx = np.searchsorted(fechas, cierres, side="right") - 1
+            panel[idx >= 0, j] = valores[idx[idx >= 0]]
+        paneles.append(np.diff(panel, axis=0))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # semanas sin ningún país
+        cambios = np.nanmean(np.array(paneles), axis=0)
+    return plazos, cambios[~np.isnan(cambios).any(axis=1)]
+
+
+# ============================================================
+# CALIBRACIÓN
+# ============================================================
+
+def _covarianza_defecto(plazos: np.ndarray) -> np.ndarray:
+    """Covarianza anual (puntos %²) de cambios de tipos sin historia suficiente."""
+    referencia = np.array(sorted(VOL_DEFECTO))
+    vols = np.interp(plazos, referencia, [VOL_DEFECTO[t] for t in referencia])
+    distancia = np.abs(np.log(plazos)[:, None] - np.log(plazos)[None, :])
+    return np.outer(vols, vols) * np.exp(-DECAIMIENTO_CORRELACION * distancia)
+
+
+def _factores(covarianza: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(varianzas, cargas) de los factores principales que explican VARIANZA_OBJETIVO."""
+    valores, vectores = np.linalg.eigh(covarianza)
+    orden = np.argsort(valores)[::-1]
+    valores, vectores = np.maximum(valores[orden], 0.0), vectores[:, orden]
+    acumulada = np.cumsum(valores) / max(valores.sum(), 1e-12)
+    k = min(MAX_FACTORES, int(np.searchsorted(acumulada, VARIANZA_OBJETIVO)) + 1)
+    # Signo fijo: carga media positiva (el primer factor sube toda la curva)
+    signos = np.where(vectores[:, :k].sum(axis=0) < 0, -1.0, 1.0)
+    return valores[:k], vectores[:, :k] * signos
+
+
+def _calibrar_vasicek(nivel: np.ndarray, varianza_anual: float) -> tuple[float, float]:
+    """
+    κ y σ de un factor a partir de su nivel acumulado semanal (AR(1) exacto).
+    La pendiente MCO de un AR(1) está sesgada hacia abajo (sobre un paseo
+    aleatorio de 260 semanas da b ≈ 0.98, κ ≈ 1): se corrige con la
+    aproximación de Kendall, b + (1 + 3b)/n, y si el contraste de
+    Dickey-Fuller no rechaza b = 1 el factor es un paseo aleatorio
+    (κ = KAPPA_MIN, σ² = varianza anual de los cambios); si lo rechaza, σ
+    sale de los residuos con la fórmula exacta y κ no pasa de KAPPA_MAX.
+    """
+    dt = 1 / SEMANAS_ANO
+    x0, x1 = nivel[:-1], nivel[1:]
+    n = len(x0)
+    if n < MIN_SEMANAS or np.var(x0) <= 1e-12:
+        return KAPPA_DEFECTO, float(np.sqrt(varianza_anual))
+
+    centrado = x0 - x0.mean()
+    b = float(centrado @ (x1 - x1.mean()) / (centrado @ centrado))
+    residuos = x1 - x1.mean() - b * centrado
+    error_b = np.sqrt(residuos @ residuos / (n - 2) / (centrado @ centrado))
+    b_corregido = b + (1 + 3 * b) / n
+    if (b - 1) / error_b >= VALOR_CRITICO_DF or not 0 < b_corregido < 1:
+        return KAPPA_MIN, float(np.sqrt(varianza_anual))
+
+    kappa = float(np.clip(-np.log(b_corregido) / dt, KAPPA_MIN, KAPPA_MAX))
+    b = np.exp(-kappa * dt)
+    a = np.mean(x1 - b * x0)
+    residuos = x1 - a - b * x0
+    sigma = float(np.sqrt(np.var(residuos) * 2 * kappa / (1 - b ** 2)))
+    return kappa, sigma
+
+
+def calibrar_modelo(db, codigo: str = "EUR", semanas: int = VENTANA_SEMANAS, hoy: date | None = None) -> dict:
+    """
+    Modelo de factores de la curva de 'codigo', en caché por última fecha de
+    datos y día (se comprueba con una sola lectura indexada, _ultima_fecha):
+        {"plazos", "cargas" (P, k), "kappa" (k,), "sigma" (k,),
+         "varianza_explicada", "semanas", "origen": "historico" | "defecto"}
+    """
+    hoy = hoy or date.today()
+    clave = (codigo, _ultima_fecha(db, codigo), semanas, hoy)
+    with _lock:
+        if clave in _modelos:
+            return _modelos[clave]
+
+    desde = (hoy - timedelta(weeks=semanas)).isoformat()
+    series = _leer_historia(db, codigo, desde)
+    plazos, cambios = _cambios_semanales(series, semanas, hoy)
+
+    if len(cambios) >= MIN_SEMANAS and len(plazos) >= 2:
+        covarianza = np.cov(cambios, rowvar=False) * SEMANAS_ANO
+        varianzas, cargas = _factores(covarianza)
+        niveles = np.cumsum(cambios @ cargas, axis=0)
+        parametros = [_calibrar_vasicek(niveles[:, j], varianzas[j]) for j in range(len(varianzas))]
+        origen = "historico"
+    else:
+        plazos = np.array(sorted(DURACION_ANOS.values()))
+        covarianza = _covarianza_defecto(plazos)
+        varianzas, cargas = _factores(covarianza)
+        parametros = [(KAPPA_DEFECTO, float(np.sqrt(v))) for v in varianzas]
+        origen = "defecto"
+
+    modelo = {
+        "codigo": codigo,
+        "plazos": plazos,
+        "cargas": cargas,
+        "kappa": np.array([p[0] for p in parametros]),
+        "sigma": np.array([p[1] for p in parametros]),
+        "varianza_explicada": float(varianzas.sum() / max(np.trace(covarianza), 1e-12)),
+        "semanas": int(len(cambios)),
+        "origen": origen,
+    }
+    with _lock:
+        # Solo se conserva el modelo más reciente de cada código y ventana
+        for anterior in [c for c in _modelos if c[0] == codigo and c[2] == semanas]:
+            del _modelos[anterior]
+        _modelos[clave] = modelo
+    return modelo
+
+
+# ============================================================
+# SIMULACIÓN
+# ============================================================
+
+def _pesos_interpolacion(plazos: np.ndarray, duraciones: np.ndarray) -> np.ndarray:
+    """Matriz (N, P) de interpolación lineal entre plazos (plana en los extremos)."""
+    d = np.clip(np.nan_to_num(duraciones), plazos[0], plazos[-1])
+    derecha = np.clip(np.searchsorted(plazos, d), 1, len(plazos) - 1)
+    izquierda = derecha - 1
+    fraccion = (d - plazos[izquierda]) / (plazos[derecha] - plazos[izquierda])
+    pesos = np.zeros((len(d), len(plazos)))
+    filas = np.arange(len(d))
+    pesos[filas, izquierda] = 1 - fraccion
+    pesos[filas, derecha] += fraccion
+    return pesos
+
+
+def _deriva_esperada(modelo: dict, curva: dict | None, horizonte: float) -> np.ndarray:
+    """Cambio previsto por plazo (puntos %) al final del horizonte según el snapshot."""
+    plazos = modelo["plazos"]
+    if not curva:
+        return np.zeros(len(plazos))
+    x_act, y_act = puntos_curva(curva)
+    x_prev, y_prev = puntos_curva(curva, anno_objetivo(int(round(horizonte))))
+    if len(x_act) == 0 or len(x_prev) == 0:
+        return np.zeros(len(plazos))
+    return CurvaTipos(x_prev, y_prev).rendimiento(plazos) - CurvaTipos(x_act, y_act).rendimiento(plazos)
+
+
+def _simular_bloque(modelo: dict, deriva: np.ndarray, horizonte: float, n_caminos: int,
+                    pasos_ano: int, semilla, interpolacion: np.ndarray, pesos: np.ndarray,
+                    ytm: np.ndarray, duracion: np.ndarray, convexidad: np.ndarray) -> np.ndarray:
+    """Rentabilidad acumulada (%) de la cartera en cada camino y paso: (n_caminos, T)."""
+    rng = np.random.default_rng(semilla)
+    n_pasos = max(1, int(np.ceil(horizonte * pasos_ano)))
+    dt = horizonte / n_pasos
+    tiempos = dt * np.arange(1, n_pasos + 1)
+    cargas, kappa, sigma = modelo["cargas"], modelo["kappa"], modelo["sigma"]
+
+    # θ tal que E[X_H] = proyección de la deriva sobre los factores; el resto
+    # de la deriva (lo que no explican los factores) se reparte linealmente
+    objetivo = cargas.T @ deriva
+    theta = objetivo / (1 - np.exp(-kappa * horizonte))
+    residuo = deriva - cargas @ objetivo
+
+    decaimiento = np.exp(-kappa * dt)
+    escala = sigma * np.sqrt((1 - decaimiento ** 2) / (2 * kappa))
+    x = np.zeros((n_caminos, len(kappa)))
+    niveles = np.empty((n_caminos, n_pasos, len(kappa)))
+    for t in range(n_pasos):
+        x = theta + (x - theta) * decaimiento + escala * rng.standard_normal(x.shape)
+        niveles[:, t] = x
+
+    delta_curva = niveles @ cargas.T + residuo * np.minimum(tiempos / horizonte, 1.0)[:, None]   # (S, T, P)
+    delta_activos = delta_curva @ interpolacion.T                                                # (S, T, N)
+    rent_activos = (ytm * tiempos[:, None]
+                    - duracion * delta_activos
+                    + 0.5 * convexidad * delta_activos ** 2 / 100)
+    return rent_activos @ pesos
+
+
+def simular_cartera(
+    db,
+    region: str,
+    pesos,
+    ytm,
+    duracion,
+    horizonte: float,
+    n_caminos: int = N_CAMINOS,
+    convexidad=None,
+    nivel_var: float = NIVEL_VAR,
+    semilla: int | None = None,
+    procesos: int | None = None,
+    pasos_ano: int = PASOS_ANO,
+) -> dict:
+    """
+    Distribución de resultados de una cartera a 'horizonte' años.
+
+    Devuelve:
+      - "rent_anual": (S,) rentabilidad anualizada (%) por camino
+      - "rent_total": (S,) rentabilidad acumulada (%) al horizonte
+      - "media", "percentiles" {p: valor} (anualizadas)
+      - "var", "cvar": pérdida acumulada (%, positiva = pérdida) al nivel_var
+      - "prob_perdida": probabilidad de rentabilidad acumulada negativa
+      - "abanico": {"tiempos": (T,), p: (T,)} percentiles de la acumulada en el tiempo
+      - "modelo": resumen de la calibración, "tiempo_ms"
+    """
+    inicio = time.perf_counter()
+    pesos = np.nan_to_num(np.asarray(pesos, dtype=float))
+    ytm = np.nan_to_num(np.asarray(ytm, dtype=float))
+    duracion = np.maximum(np.nan_to_num(np.asarray(duracion, dtype=float)), 0.0)
+    convexidad = duracion ** 2 if convexidad is None else np.nan_to_num(np.asarray(convexidad, dtype=float))
+    horizonte = max(float(horizonte), 1 / pasos_ano)
+
+    modelo = calibrar_modelo(db, region)
+    deriva = _deriva_esperada(modelo, obtener_curva(db, region), horizonte)
+    interpolacion = _pesos_interpolacion(modelo["plazos"], duracion)
+    argumentos = (modelo, deriva, horizonte)
+    datos_cartera = (interpolacion, pesos, ytm, duracion, convexidad)
+
+    if procesos and procesos > 1 and n_caminos >= MIN_CAMINOS_POOL:
+        semillas = np.random.SeedSequence(semilla).spawn(procesos)
+        bloques = np.array_split(np.arange(n_caminos), procesos)
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [pool.submit(_simular_bloque, *argumentos, len(b), pasos_ano, s, *datos_cartera)
+                       for b, s in zip(bloques, semillas)]
+            acumulada = np.concatenate([f.result() for f in futuros])
+    else:
+        acumulada = _simular_bloque(*argumentos, n_caminos, pasos_ano, semilla, *datos_cartera)
+
+    rent_total = acumulada[:, -1]
+    rent_anual = rent_total / horizonte
+    umbral = np.percentile(rent_total, 100 * (1 - nivel_var))
+    tiempos = horizonte / acumulada.shape[1] * np.arange(1, acumulada.shape[1] + 1)
+
+    return {
+        "rent_anual": rent_anual,
+        "rent_total": rent_total,
+        "media": float(rent_anual.mean()),
+        "percentiles": {p: float(v) for p, v in zip(PERCENTILES, np.percentile(rent_anual, PERCENTILES))},
+        "var": float(max(-umbral, 0.0)),
+        "cvar": float(max(-rent_total[rent_total <= umbral].mean(), 0.0)),
+        "nivel_var": nivel_var,
+        "prob_perdida": float((rent_total < 0).mean()),
+        "abanico": {"tiempos": tiempos,
+                    **{p: v for p, v in zip(PERCENTILES, np.percentile(acumulada, PERCENTILES, axis=0))}},
+        "modelo": {k: modelo[k] for k in ("origen", "semanas", "varianza_explicada")} | {"factores": len(modelo["kappa"])},
+        "n_caminos": n_caminos,
+        "tiempo_ms": (time.perf_counter() - inicio) * 1000,
+    }
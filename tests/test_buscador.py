@@ -0,0 +1,28 @@
+"""Buscador de trigramas: filtros de listado con palabras cortas."""
+
+from src.buscador import IndiceBusqueda
+
+
+NOMBRES = {
+    "IE00B3VTMJ91": "iShares Treasury Bd 1-3yr USD Dist",
+    "IE00BDFK1573": "iShares USD Treasury Bond 0-1yr UCITS ETF",
+    "LU1459801434": "UBS BloombergBrcls US10 TrsBd",
+    "IE00B4WXJJ64": "iShares Core Euro Government Bond UCITS ETF",
+}
+
+
+def _indice():
+    return IndiceBusqueda([{"isin": isin, "nombre": nombre} for isin, nombre in NOMBRES.items()])
+
+
+def test_palabra_final_de_un_caracter_filtra_como_prefijo():
+    indice = _indice()
+    assert "IE00B3VTMJ91" in indice.coincidencias("treasury 1")
+    assert indice.coincidencias("treasury 1-3") == ["IE00B3VTMJ91"]
+    assert indice.coincidencias("ishares 0-1") == ["IE00BDFK1573"]
+
+
+def test_buscar_y_coincidencias_coinciden_en_el_primero():
+    indice = _indice()
+    for consulta in ("treasury 1-3", "ishares 0-1"):
+        assert indice.buscar(consulta, k=1)[0]["isin"] == indice.coincidencias(consulta)[0]
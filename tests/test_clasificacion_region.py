@@ -0,0 +1,36 @@
+"""Reglas de región y divisa sobre nombres reales de ETFs (assets/json/etf_open_*)."""
+
+import json
+import os
+
+from src.clasificacion_region import clasificar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _nombres_fixture() -> set[str]:
+    nombres = set()
+    for fichero in ("etf_open_R2.json", "etf_open_R3.json"):
+        with open(os.path.join(RAIZ, "assets", "json", fichero), encoding="utf-8") as f:
+            nombres.update(d["nombreEtf"] for d in json.load(f))
+    return nombres
+
+
+def test_codigos_pegados_a_guiones_bajos_digitos_y_camel_case():
+    nombres = _nombres_fixture()
+    for nombre in ("iShares Treasury Bd 1-3yr_USD Dist",
+                   "UBS BloombergBrcls US1-3Yr TrsBd_Dist",
+                   "UBS(Lux)FS Blmbg USLqCrp1-5YrUSDAdis"):
+        assert nombre in nombres
+        assert "US" in clasificar(nombre)["regiones"], nombre
+
+
+def test_fixture_us_incluye_todos_los_nombres_con_codigo_usd():
+    for nombre in _nombres_fixture():
+        if "USD" in nombre:
+            assert "US" in clasificar(nombre)["regiones"], nombre
+
+
+def test_sin_falsos_positivos_por_subcadena():
+    assert clasificar("JP Morgan Bonus Fund")["regiones"] == []
+    assert clasificar("Bond_CHF Hedged")["divisa"] == "CHF"
@@ -0,0 +1,56 @@
+"""Caché local de respuestas HTTP: qué se guarda y cómo se poda."""
+
+import os
+import time
+
+import requests
+
+from src import http_cliente
+
+
+class _Sesion:
+    def __init__(self, cabeceras):
+        self.cabeceras = cabeceras
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = b"{}"
+        resp.headers.update(self.cabeceras)
+        return resp
+
+
+def _entradas(directorio) -> list[str]:
+    return sorted(f for _, _, ficheros in os.walk(directorio) for f in ficheros)
+
+
+def test_solo_se_guardan_respuestas_con_validador(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cliente, "DIRECTORIO_CACHE", str(tmp_path))
+    monkeypatch.setattr(http_cliente.replay, "modo", lambda: "live")
+
+    monkeypatch.setattr(http_cliente, "obtener_sesion", lambda url: _Sesion({}))
+    http_cliente.obtener("https://ejemplo.test/sin-validador")
+    assert _entradas(tmp_path) == []
+
+    monkeypatch.setattr(http_cliente, "obtener_sesion", lambda url: _Sesion({"ETag": '"v1"'}))
+    http_cliente.obtener("https://ejemplo.test/con-etag")
+    assert len(_entradas(tmp_path)) == 2
+
+
+def test_poda_por_tamano_conserva_las_mas_recientes(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cliente, "DIRECTORIO_CACHE", str(tmp_path))
+    monkeypatch.setattr(http_cliente, "MAX_BYTES_CACHE", 250)
+    monkeypatch.setattr(http_cliente, "_ultima_poda", {"instante": None})
+    for i in range(5):
+        ruta_meta, ruta_cuerpo = http_cliente._rutas_cache(f"{i:02d}clave")
+        os.makedirs(os.path.dirname(ruta_meta), exist_ok=True)
+        with open(ruta_cuerpo, "wb") as f:
+            f.write(b"x" * 100)
+        with open(ruta_meta, "w") as f:
+            f.write("{}")
+        antiguedad = time.time() - 100 * i
+        os.utime(ruta_cuerpo, (antiguedad, antiguedad))
+
+    http_cliente._podar_cache()
+
+    assert _entradas(tmp_path) == ["00clave.body", "00clave.json", "01clave.body", "01clave.json"]
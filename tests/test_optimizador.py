@@ -0,0 +1,33 @@
+"""Escalado del optimizador con Σ completa (constructores automáticos)."""
+
+import numpy as np
+
+from src.motor_rentabilidad import TRAMOS
+from src.optimizador import optimizar_cartera
+
+
+def _universo(n: int, semilla: int = 0):
+    rng = np.random.default_rng(semilla)
+    vol = rng.uniform(0.5, 8, n)
+    duracion = rng.uniform(0.2, 10, n)
+    rent = 1 + 0.3 * duracion + rng.normal(0, 0.5, n)
+    codigos = rng.integers(0, len(TRAMOS), n)
+    factores = rng.normal(size=(n, 3))
+    correlacion = factores @ factores.T * 0.2 + np.eye(n)
+    d = np.sqrt(np.diag(correlacion))
+    covarianza = correlacion / np.outer(d, d) * np.outer(vol, vol)
+    return rent, vol, duracion, codigos, covarianza
+
+
+def test_covarianza_completa_mil_candidatos_bajo_un_segundo():
+    rent, vol, duracion, codigos, covarianza = _universo(1000)
+    pesos = {t: 1 / len(TRAMOS) for t in TRAMOS}
+    optimizar_cartera(rent, vol, duracion, codigos, pesos, vol_max=2.5, dur_max=4, covarianza=covarianza)
+
+    resultado = optimizar_cartera(rent, vol, duracion, codigos, pesos, max_activos=10,
+                                  vol_max=2.5, dur_max=4, covarianza=covarianza)
+
+    assert resultado["tiempos_ms"]["total"] < 1000
+    assert resultado["violaciones"]["vol"] < 1e-2
+    assert resultado["violaciones"]["dur_max"] < 1e-2
+    assert len(resultado["indices"]) <= 10
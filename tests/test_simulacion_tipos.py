@@ -0,0 +1,64 @@
+"""Calibración de la simulación de tipos sobre historia sintética."""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.previsiones_dinamicas import DURACION_ANOS
+from src import simulacion_tipos
+from src.simulacion_tipos import COLECCION_PUNTOS, simular_cartera
+
+
+class _Coleccion:
+    def __init__(self, filas):
+        self.filas = filas
+        self.lecturas = 0
+
+    def _filtrar(self, filtro):
+        return [f for f in self.filas if f["plazo"] in filtro["plazo"]["$in"]
+                and f["codigo"] == filtro.get("codigo", f["codigo"])]
+
+    def find(self, filtro, proyeccion=None):
+        self.lecturas += 1
+        return self._filtrar(filtro)
+
+    def find_one(self, filtro, proyeccion=None, sort=None):
+        filas = self._filtrar(filtro)
+        return max(filas, key=lambda f: f["fecha"]) if filas else None
+
+
+class _BaseDatos(dict):
+    def __missing__(self, nombre):
+        return _Coleccion([])
+
+
+def _paseo_aleatorio(semanas: int, sd_semanal: float, semilla: int = 0) -> _BaseDatos:
+    """Curva de 'EUR' que se desplaza en paralelo como un paseo aleatorio."""
+    rng = np.random.default_rng(semilla)
+    nivel = 2 + np.concatenate([[0], np.cumsum(rng.normal(0, sd_semanal, semanas))])
+    hoy = date.today()
+    filas = [{"codigo": "EUR", "plazo": plazo, "fecha": (hoy - timedelta(weeks=semanas - k)).isoformat(),
+              "rendimiento_actual": nivel[k] + 0.1 * anos}
+             for k in range(semanas + 1) for plazo, anos in DURACION_ANOS.items()]
+    return _BaseDatos({COLECCION_PUNTOS: _Coleccion(filas)})
+
+
+def test_paseo_aleatorio_conserva_la_dispersion_al_horizonte():
+    simulacion_tipos._modelos.clear()
+    sd_semanal, horizonte, duracion = 0.08, 3, 5.0
+    db = _paseo_aleatorio(260, sd_semanal)
+
+    resultado = simular_cartera(db, "EUR", [1.0], [0.0], [duracion], horizonte,
+                                n_caminos=20000, convexidad=[0.0], semilla=1)
+
+    esperada = duracion * sd_semanal * np.sqrt(52 * horizonte)
+    assert abs(resultado["rent_total"].std() / esperada - 1) < 0.2
+    assert resultado["var"] > 0
+
+
+def test_modelo_en_cache_sin_releer_la_historia():
+    simulacion_tipos._modelos.clear()
+    db = _paseo_aleatorio(60, 0.05, semilla=2)
+    for _ in range(2):
+        simular_cartera(db, "EUR", [1.0], [3.0], [4.0], 1, n_caminos=100, semilla=0)
+    assert db[COLECCION_PUNTOS].lecturas == 1